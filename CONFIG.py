@@ -9,4 +9,16 @@ Created on Fri Mar  3 10:41:34 2017
 DATA_PATH = 'data'
 LINK_DATA_PATH = 'data/link'
 NORMALIZE_DATA_PATH = 'data/normalize'
-RESOURCE_PATH = 'resource'
\ No newline at end of file
+RESOURCE_PATH = 'resource'
+SNAPSHOT_PATH = 'data/snapshot'
+GEOCODER = 'offline' # Address geocoding backend: 'offline' (local reference files) or 'ban' (api-adresse.data.gouv.fr)
+BAN_EXTRACT_FILE = None # Optional local BAN address file indexed by the offline geocoder
+ADDRESS_CACHE_SIZE = 100000 # Max number of libpostal parses kept in memory by the shared address parser
+ADDRESS_CACHE_FILE = None # Optional on-disk cache of libpostal parses, e.g. 'data/address_cache/libpostal' (read-only in worker processes)
+ADDRESS_PARSER_WORKERS = 1 # Worker processes used to parse a column's addresses in batch (each loads its own libpostal model)
+SERVICE_HOST = '127.0.0.1' # Interface on which the local inference service listens (see preprocess_service.py)
+SERVICE_PORT = 8765
+SERVICE_WORKERS = 2 # Worker processes running the requests of the inference service
+SERVICE_QUEUE_SIZE = 8 # Requests waiting for a worker beyond which the service answers 503
+SERVICE_MAX_REQUEST_BYTES = 16 * 1024 * 1024 # Largest request body accepted by the service (413 beyond)
+SERVICE_TIMEOUT = 300 # Seconds after which a request still running is answered with 504
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# Address parsing service shared by preprocess_fields_v3 and gridder: libpostal parses are cached in memory (bounded
+# LRU) and optionally on disk (written by the main process only), keyed by normalized input, and batches of addresses
+# can be parsed in a worker pool.
+
+import atexit, dbm, logging, multiprocessing, os, shelve, unicodedata
+from collections import Counter, OrderedDict
+from functools import lru_cache
+
+from CONFIG import ADDRESS_CACHE_SIZE, ADDRESS_CACHE_FILE
+
+def address_key(value):
+	''' Normalizes an address for cache lookups (libpostal's output does not depend on case, Unicode composition nor
+		runs of whitespace). '''
+	return ' '.join(unicodedata.normalize('NFC', value).lower().split())
+
+def libpostal_parse(value):
+	''' Returns the list of (value, label) pairs produced by libpostal for an address. '''
+	from postal.parser import parse_address
+	return list([(v, label) for (v, label) in parse_address(value)])
+
+class AddressParser(object):
+	''' Parses addresses, caching the results by normalized input in a bounded LRU, and in an on-disk shelve (which
+		persists across runs) if a cache file is given.
+
+		The stats counter holds the number of lookups served from a cache ('hits', 'disk_hits' being the subset served
+		from disk), the number of actual parses ('misses') and the number of entries evicted from memory. '''
+	def __init__(self, maxSize = ADDRESS_CACHE_SIZE, cacheFile = ADDRESS_CACHE_FILE, parser = libpostal_parse):
+		self.maxSize = maxSize
+		self.cacheFile = cacheFile
+		self.parser = parser
+		self.cache = OrderedDict()
+		self.disk = None
+		self.owner = None # Process allowed to write to the on-disk cache (not the processes forked after it was opened)
+		self.stats = Counter()
+	def open_disk_cache(self):
+		''' Opens the on-disk cache, read-only in worker processes (e.g. of column-parallel value matching) since the
+			dbm backing the shelve may not support concurrent writers. '''
+		if self.disk is None and self.cacheFile:
+			writer = not multiprocessing.current_process().daemon
+			try:
+				if writer and os.path.dirname(self.cacheFile): os.makedirs(os.path.dirname(self.cacheFile), exist_ok = True)
+				self.disk = shelve.open(self.cacheFile, flag = 'c' if writer else 'r')
+			except dbm.error as e:
+				logging.warning('Could not open address cache %s: %s', self.cacheFile, e)
+				self.cacheFile = None
+				return None
+			self.owner = os.getpid() if writer else None
+			logging.info('Opened address cache %s (%d entries%s)', self.cacheFile, len(self.disk), '' if writer else ', read-only')
+		return self.disk
+	def lookup(self, key):
+		''' Returns the cached parse of a normalized address, or None. '''
+		if key in self.cache:
+			self.cache.move_to_end(key)
+			self.stats['hits'] += 1
+			return self.cache[key]
+		disk = self.open_disk_cache()
+		if disk is not None and key in disk:
+			parsed = disk[key]
+			self.stats['hits'] += 1
+			self.stats['disk_hits'] += 1
+			self.remember(key, parsed)
+			return parsed
+		return None
+	def remember(self, key, parsed):
+		self.cache[key] = parsed
+		if len(self.cache) > self.maxSize:
+			self.cache.popitem(last = False)
+			self.stats['evictions'] += 1
+	def store(self, key, parsed):
+		self.stats['misses'] += 1
+		self.remember(key, parsed)
+		if self.disk is not None and self.owner == os.getpid(): self.disk[key] = parsed
+	def parse(self, value):
+		''' Returns the list of (value, label) pairs for an address. '''
+		key = address_key(value)
+		parsed = self.lookup(key)
+		if parsed is None:
+			parsed = self.parser(key)
+			self.store(key, parsed)
+		return parsed
+	def parse_many(self, values, workers = 1, chunkSize = 64):
+		''' Batch counterpart of parse: each distinct address is looked up once, and the ones which are not cached are
+			parsed in a pool of worker processes if workers > 1 (each worker then loads its own libpostal model). '''
+		keys = list([address_key(v) for v in values])
+		results = dict()
+		missing = list()
+		for key in dict.fromkeys(keys):
+			parsed = self.lookup(key)
+			if parsed is None: missing.append(key)
+			else: results[key] = parsed
+		self.stats['hits'] += len(keys) - len(results) - len(missing)
+		if len(missing) > 0:
+			# Processes of a pool (e.g. column-parallel value matching) cannot have children of their own
+			if workers > 1 and len(missing) > chunkSize and not multiprocessing.current_process().daemon:
+				with multiprocessing.Pool(workers) as pool: parses = pool.map(self.parser, missing, chunkSize)
+			else:
+				parses = list(map(self.parser, missing))
+			for (key, parsed) in zip(missing, parses):
+				self.store(key, parsed)
+				results[key] = parsed
+		return list([results[key] for key in keys])
+	def hit_rate(self):
+		lookups = self.stats['hits'] + self.stats['misses']
+		return self.stats['hits'] / lookups if lookups > 0 else 0.
+	def log_stats(self):
+		logging.info('Address parser stats: %d hits (%d from disk), %d misses (hit rate %.1f%%), %d evictions',
+			self.stats['hits'], self.stats['disk_hits'], self.stats['misses'], 100. * self.hit_rate(), self.stats['evictions'])
+	def close(self):
+		if self.disk is not None:
+			self.disk.close()
+			(self.disk, self.owner) = (None, None)
+
+@lru_cache(maxsize = None)
+def address_parser():
+	''' Returns the address parser shared by all callers in this process. '''
+	parser = AddressParser()
+	atexit.register(parser.close)
+	return parser
@@ -3,12 +3,17 @@ import unicodedata, unidecode
 from collections import defaultdict, Counter
 
 from fuzzywuzzy import fuzz
-from postal.parser import parse_address
-import enchant
 
-DICTS = [ enchant.Dict("en_US") ]
+from address_parsing import address_parser
+
 RESOURCE_PATH = 'resource'
 
+# Dictionaries, word lists and the address parser are loaded on first use rather than at import time
+@functools.lru_cache(maxsize = None)
+def dictionaries():
+	import enchant
+	return [ enchant.Dict("en_US") ]
+
 SOURCE = 1
 REFERENCE = 2
 
@@ -46,8 +51,8 @@ def enrich_item_with_variants(item):
 		item['variants'].add(variant)
 		item['acros'].add(acro)
 
-	# Addresses (French or foreign)
-	addr = parse_address(label)
+	# Addresses (French or foreign), parsed through the shared cache so that reference labels are only parsed once
+	addr = address_parser().parse(label)
 	features = dict((f, v) for (v, f) in addr)
 	if len(REQUIRED_ADDR_FEATURES | features.keys()) > 0:
 		item['address_as_label'] = label
@@ -222,7 +227,8 @@ def fileToList(fileName, path = RESOURCE_PATH):
 	with open(filePath, mode = 'r') as f: 
 		return [justCase(line) for line in f]
 
-FRENCH_WORDS = set(fileToList('liste_mots_fr.col'))
+@functools.lru_cache(maxsize = None)
+def frenchWords(): return set(fileToList('liste_mots_fr.col'))
 
 STOP_WORDS_FR = set([
 	# Prepositions (excepted "avec" and "sans" which are semantically meaningful)
@@ -321,16 +327,17 @@ def lowerOrNot(token, keepAcronyms = False, keepInitialized = False):
 	return token.lower()
 
 # A map from alt variant to main variant 
-SYNMAP = fileToVariantMap('data/synonyms')
+@functools.lru_cache(maxsize = None)
+def synonymMap(): return fileToVariantMap('data/synonyms')
 
 def normalize(t): 
 	s = caseToken(t)
-	for variant, main in SYNMAP.items():
+	for variant, main in synonymMap().items():
 		s = s.replace(variant, main)
 	return s
 
 def filterProperNouns(it):
-	return filter(lambda t: len(t) > 2 and t not in FRENCH_WORDS  and (DONT_DISCRIMINATE or t not in NON_DISCRIMINATING_TOKENS) and not any([d.check(t) for d in DICTS]), it)
+	return filter(lambda t: len(t) > 2 and t not in frenchWords()  and (DONT_DISCRIMINATE or t not in NON_DISCRIMINATING_TOKENS) and not any([d.check(t) for d in dictionaries()]), it)
 
 def score_chars(src, ref):
 	# Returns a score in [0, 100]
@@ -2,26 +2,35 @@
 # coding=utf-8
 
 # Standard modules
-import csv, itertools, re, unicodedata, logging, optparse, time, sys, math, os
+import csv, itertools, re, unicodedata, logging, optparse, time, sys, math, os, multiprocessing, random, tempfile, shutil
+import hashlib, pickle, zlib, contextlib, datetime
+from statistics import NormalDist
 from functools import partial, reduce, lru_cache
 from collections import defaultdict, Counter, Iterable
 from operator import itemgetter, add
-from fuzzywuzzy import fuzz
-import pandas as pd
-import numpy as np
+from array import array
+from bisect import bisect_left, bisect_right
 
 # Parsing/normalization packages
-import urllib, json # For BAN address API on data.gouv.fr
-from dateparser import DateDataParser
-import phonenumbers
+import json
+# Heavier dependencies (pandas, numpy, fuzzywuzzy, dateparser, phonenumbers) are imported by the functions that use
+# them, and lexicons are loaded on first use (see lazy_resource), so that importing this module stays cheap.
 
-from CONFIG import RESOURCE_PATH
+from CONFIG import RESOURCE_PATH, SNAPSHOT_PATH, GEOCODER, BAN_EXTRACT_FILE, ADDRESS_PARSER_WORKERS
+import address_parsing
 
 lastTime = 0
 timingInfo = Counter()
 countInfo = Counter()
+dedupInfo = Counter()
+dateFormatInfo = Counter()
 MICROS_PER_SEC = 1000000
 
+def lazy_resource(loader):
+	''' Decorator for a function that loads a resource (lexicon, parser, etc.), so that the resource is only loaded
+		on the first call and then shared by all subsequent calls. '''
+	return lru_cache(maxsize = None)(loader)
+
 def snapshot_timing(end):
 	global lastTime
 	if lastTime > 0 and lastTime + MICROS_PER_SEC > end: return
@@ -33,9 +42,9 @@ def snapshot_timing(end):
 
 def timed(original_func):
 	def wrapper(*args, **kwargs):
-		start = time.clock()
+		start = time.perf_counter()
 		result = original_func(*args, **kwargs)
-		end = time.clock()
+		end = time.perf_counter()
 		key = original_func.__name__ if len(args) < 1 else args[0].__class__.__name__ + '.' + original_func.__name__
 		t = int((end - start) * MICROS_PER_SEC)
 		timingInfo[key] += t
@@ -44,6 +53,145 @@ def timed(original_func):
 		return result
 	return wrapper
 
+# Pipeline stages timed by PerformanceMetrics, in execution order
+PIPELINE_STAGES = ['load', 'header_match', 'value_match', 'roll_up', 'normalize', 'write']
+
+class LatencyHistogram(object):
+	''' Log-scale histogram of latencies (in microseconds), from which percentiles are estimated within
+		2^(1/BUCKETS_PER_OCTAVE) (i.e. 19%) of their exact value. Histograms are merged by adding their counts. '''
+	BUCKETS_PER_OCTAVE = 4
+	def __init__(self):
+		self.counts = Counter()
+		self.n = 0
+	def add(self, micros, count = 1):
+		self.counts[int(self.BUCKETS_PER_OCTAVE * math.log2(micros)) if micros >= 1 else 0] += count
+		self.n += count
+	def merge(self, other):
+		self.counts.update(other.counts)
+		self.n += other.n
+	def percentile(self, p):
+		''' Returns the upper bound of the bucket holding the p-th percentile. '''
+		if self.n < 1: return 0.
+		rank = p * self.n / 100.
+		seen = 0
+		for b in sorted(self.counts.keys()):
+			seen += self.counts[b]
+			if seen >= rank: return 2 ** ((b + 1) / self.BUCKETS_PER_OCTAVE)
+		return 2 ** ((max(self.counts.keys()) + 1) / self.BUCKETS_PER_OCTAVE)
+
+class MatcherMetrics(object):
+	''' Performance metrics of a value matcher on a column: a call is either a match on a single cell, or a vectorized
+		match on all the values of the column. '''
+	def __init__(self):
+		self.calls = 0
+		self.values = 0
+		self.seconds = 0.
+		self.hits = 0
+		self.latencies = LatencyHistogram()
+	def record(self, values, seconds, hits):
+		self.calls += 1
+		self.values += values
+		self.seconds += seconds
+		self.hits += hits
+		self.latencies.add(seconds * MICROS_PER_SEC)
+	def merge(self, other):
+		self.calls += other.calls
+		self.values += other.values
+		self.seconds += other.seconds
+		self.hits += other.hits
+		self.latencies.merge(other.latencies)
+
+# Stats counters of the caches reported in the performance metrics (each holding at least 'hits' and 'misses'), or
+# functions returning them, by name
+CACHE_STATS = dict()
+
+def register_cache_stats(name, stats):
+	CACHE_STATS[name] = stats
+
+def cache_stats(stats): return Counter(stats() if callable(stats) else stats)
+
+def lru_cache_stats(f):
+	''' Returns a function giving the stats of a function memoized with lru_cache. '''
+	def stats():
+		info = f.cache_info()
+		return Counter(hits = info.hits, misses = info.misses)
+	return stats
+
+class PerformanceMetrics(object):
+	''' Collects per-stage timings, and call counts, latency percentiles and hit counts per (value matcher, column),
+		when enabled (the module-level instance is disabled by default, in which case recording costs a single
+		attribute check per matcher and column), along with the lookups made in registered caches meanwhile. '''
+	def __init__(self, enabled = False):
+		self.enabled = enabled
+		self.stages = defaultdict(float) # Seconds spent in each pipeline stage
+		self.matchers = defaultdict(MatcherMetrics) # MatcherMetrics per (matcher key, column)
+		self.caches = defaultdict(Counter) # Cache stats accrued since these metrics were created, by cache name
+		self.cacheBase = { name: cache_stats(stats) for (name, stats) in CACHE_STATS.items() }
+	def stage(self, name):
+		''' Returns a context manager which times a pipeline stage. '''
+		return self.stage_timer(name) if self.enabled else contextlib.nullcontext()
+	@contextlib.contextmanager
+	def stage_timer(self, name):
+		start = time.perf_counter()
+		try: yield
+		finally: self.stages[name] += time.perf_counter() - start
+	def matcher(self, key, fieldName):
+		return self.matchers[(key, fieldName)]
+	def collect_caches(self):
+		''' Adds the lookups made in the registered caches since the last call to the cache stats. '''
+		for (name, stats) in CACHE_STATS.items():
+			current = cache_stats(stats)
+			self.caches[name].update(current - self.cacheBase.get(name, Counter()))
+			self.cacheBase[name] = current
+	def merge(self, other):
+		for (name, seconds) in other.stages.items(): self.stages[name] += seconds
+		for (k, mm) in other.matchers.items(): self.matchers[k].merge(mm)
+		for (name, stats) in other.caches.items(): self.caches[name].update(stats)
+	def report(self):
+		''' Returns the metrics as a JSON-serializable dictionary, along with the cumulated timings of the timed methods. '''
+		self.collect_caches()
+		stages = sorted(self.stages.keys(), key = lambda s: (PIPELINE_STAGES.index(s) if s in PIPELINE_STAGES else len(PIPELINE_STAGES), s))
+		return {
+			'stages': [{ 'stage': s, 'total_ms': round(self.stages[s] * 1000, 3) } for s in stages],
+			'matchers': [{ 'matcher': key, 'column': fieldName, 'calls': mm.calls, 'values': mm.values,
+				'total_ms': round(mm.seconds * 1000, 3), 'p50_us': round(mm.latencies.percentile(50), 1),
+				'p95_us': round(mm.latencies.percentile(95), 1), 'p99_us': round(mm.latencies.percentile(99), 1), 'hits': mm.hits }
+				for ((key, fieldName), mm) in sorted(self.matchers.items(), key = lambda kv: -kv[1].seconds)],
+			'methods': [{ 'method': k, 'calls': countInfo[k], 'total_ms': round(v / 1000., 3) } for (k, v) in timingInfo.most_common()],
+			'caches': [dict([('cache', name), ('hits', stats['hits']), ('misses', stats['misses'])] + sorted(stats.items())
+				+ [('hit_rate', round(stats['hits'] / max(1, stats['hits'] + stats['misses']), 4))]) for (name, stats) in sorted(self.caches.items()) if any(stats.values())] }
+	def save(self, fileName):
+		with open(fileName, 'w') as f: json.dump(self.report(), f, indent = 1)
+		logging.info('Saved performance metrics to %s', fileName)
+
+perfMetrics = PerformanceMetrics()
+
+def enable_metrics(enabled = True):
+	''' Resets the module-level performance metrics, and enables (or disables) their collection. '''
+	global perfMetrics
+	perfMetrics = PerformanceMetrics(enabled)
+	return perfMetrics
+
+def metrics_params(params):
+	''' Enables the collection of performance metrics (reset for this call) and returns them if the params ask for
+		them, otherwise returns None. '''
+	if not params or not params.get('metrics', False): return None
+	return enable_metrics()
+
+lastMetricsReport = None
+
+def release_metrics(metrics):
+	''' Stops collecting the performance metrics returned by metrics_params (if any) and returns their report, which
+		is kept for last_metrics_report. '''
+	global lastMetricsReport
+	if metrics is not None: enable_metrics(False)
+	lastMetricsReport = metrics.report() if metrics is not None else None
+	return lastMetricsReport
+
+def last_metrics_report():
+	''' Returns the performance metrics report of the last API call (None unless it was given the metrics param). '''
+	return lastMetricsReport
+
 def chngrams(string="", n=3, top=None, threshold=0, exclude=[], **kwargs):
 	""" Returns a dictionary of (character n-gram, count)-items.
 		N-grams in the exclude list are not counted.
@@ -64,37 +212,80 @@ def chngrams(string="", n=3, top=None, threshold=0, exclude=[], **kwargs):
 		count = dict(heapq.nsmallest(top, count.items(), key=lambda kv: (-kv[1], kv[0])))
 	return kwargs.get("dict", dict)(count)
 
+SHORT_WORD_LENGTH = 4 # Words up to this length only get single-character deletions in the index
+INDEX_PARTITIONS = 256 # Number of partitions (by high-order hash bits) into which index entries are sorted
+
+def deletion_depth(w): return 1 if len(w) <= SHORT_WORD_LENGTH else 2
+
+def deletion_key_hash(key): return zlib.crc32(key.encode('utf-8'))
+
 class ApproximateLookup:
+	''' Lookup of the words within an edit distance of 2 from a query, using a symmetric deletion index.
+
+		The index is a sorted array of (32-bit) hashes of the deletion keys of each word, along with a parallel array
+		of word ids: the posting list of a key is the run of ids sharing its hash. Words of up to SHORT_WORD_LENGTH
+		characters are only indexed with single-character deletions, so that distance-2 hits which would require
+		deleting two characters from such a word are not found (hash collisions, on the other hand, only yield
+		candidates that are then discarded by the distance check). '''
 	def __init__(self, maxHits = 10):
 		self.words = set()
-		self.index = {}
+		self.wordList = list()
+		self.hashes = array('I')
+		self.ids = array('I')
 		self.maxHits = maxHits
 	def add(self, item):
 		self.words.add(item)
 	def remove(self, item):
 		self.words.discard(item)
-	def indexkeys(self, w):
+	def indexkeys(self, w, depth = 2):
 		L = len(w)
 		res = set([w])
 		for i in range(L):
-			for j in range(i,L):
+			res.add(w[:i]+w[i+1:])
+			if depth < 2: continue
+			for j in range(i+1,L):
 				res.add(w[:i]+w[i+1:j]+w[j+1:])
 		return res
 	def makeindex(self):
-		self.index.clear()
-		for w in self.words:
-			for key in self.indexkeys(w):
-				if key in self.index: self.index[key].add(w)
-				else: self.index[key] = set([w])
-	def search(self, query):
-		res = {0:[], 1:[], 2:[]}
+		self.wordList = sorted(self.words)
+		partitions = [array('Q') for k in range(INDEX_PARTITIONS)]
+		shift = 32 - (INDEX_PARTITIONS - 1).bit_length()
+		for (i, w) in enumerate(self.wordList):
+			for key in self.indexkeys(w, deletion_depth(w)):
+				h = deletion_key_hash(key)
+				partitions[h >> shift].append(h << 32 | i)
+		self.hashes = array('I')
+		self.ids = array('I')
+		for k in range(INDEX_PARTITIONS):
+			for e in sorted(partitions[k]):
+				self.hashes.append(e >> 32)
+				self.ids.append(e & 0xFFFFFFFF)
+			partitions[k] = None
+		logging.debug('Deletion index memory usage: %s', self.memory_usage())
+	def candidates(self, query):
+		''' Returns the words sharing a deletion key (or its hash) with the query. '''
 		candidate = set()
 		for key in self.indexkeys(query):
-			if key in self.index: candidate.update(self.index[key])
-		for word in candidate:
-			dist = edit_dist(word, query)
+			h = deletion_key_hash(key)
+			lo = bisect_left(self.hashes, h)
+			candidate.update(self.ids[lo:bisect_right(self.hashes, h, lo)])
+		return [self.wordList[i] for i in sorted(candidate)]
+	def search(self, query):
+		res = {0:[], 1:[], 2:[]}
+		words = self.candidates(query)
+		for (word, dist) in zip(words, edit_distances(query, words, maxDist = 2)):
 			if dist < 3 and len(res) < self.maxHits: res[dist].append(word)
 		return res
+	def memory_usage(self):
+		''' Returns a dictionary { component: size in bytes } for the word list and the index arrays (the size of the
+			words themselves is counted once, although they are shared with the words set). '''
+		usage = {
+			'words': sys.getsizeof(self.words) + sys.getsizeof(self.wordList) + sum(map(sys.getsizeof, self.wordList)),
+			'hashes': sys.getsizeof(self.hashes),
+			'ids': sys.getsizeof(self.ids) }
+		usage['total'] = sum(usage.values())
+		usage['entries'] = len(self.hashes)
+		return usage
 
 # Fast Levenshtein distance implementation
 
@@ -114,6 +305,48 @@ def edit_dist(s,t):
 
 	return matrix[(i,j)]
 
+# Batch verification of edit distances (bit-parallel algorithm of Myers, in the global distance variant of Hyyrö)
+
+def edit_distances(query, candidates, maxDist = 2):
+	''' Returns the Levenshtein distance between a query and each candidate string, or maxDist + 1 for candidates
+		beyond maxDist.
+
+		The query's columns of the DP matrix are encoded as bit vectors (one bit per query character), so that each
+		character of a candidate is processed in a constant number of integer operations. The computation for a
+		candidate stops as soon as the distance can no longer get back within maxDist. '''
+	m = len(query)
+	peq = dict()
+	for (i, ch) in enumerate(query): peq[ch] = peq.get(ch, 0) | (1 << i)
+	mask = (1 << m) - 1
+	last = 1 << (m - 1) if m > 0 else 0
+	dists = list()
+	for t in candidates:
+		n = len(t)
+		if abs(n - m) > maxDist:
+			dists.append(maxDist + 1)
+			continue
+		if m < 1:
+			dists.append(n)
+			continue
+		pv = mask
+		mv = 0
+		score = m
+		for (j, ch) in enumerate(t, 1):
+			eq = peq.get(ch, 0)
+			xv = eq | mv
+			xh = (((eq & pv) + pv) ^ pv) | eq
+			ph = mv | (~(xh | pv) & mask)
+			mh = pv & xh
+			if ph & last: score += 1
+			elif mh & last: score -= 1
+			if score - (n - j) > maxDist: break
+			ph = ((ph << 1) | 1) & mask
+			mh = (mh << 1) & mask
+			pv = mh | (~(xv | ph) & mask)
+			mv = ph & xv
+		dists.append(score if score <= maxDist else maxDist + 1)
+	return dists
+
 # Misc utilities
 
 def flatten_list(l): return '' if l is None else l if isinstance(l, str) else '; '.join([flatten_list(v) for v in uniq(l)])
@@ -194,9 +427,23 @@ def pre_split(v):
 	s = replace_by_space(s, '[\{\}\[\](),\.\"\';:!?&\^\/\*-]')
 	return re.sub('([^\d\'])-([^\d])', '\1 \2', s)
 
+# Max number of distinct (value, parameters) entries kept by each memoized normalization function
+NORMALIZATION_CACHE_SIZE = 1 << 17
+
+@lru_cache(maxsize = NORMALIZATION_CACHE_SIZE)
 def split_and_case(phrase, keepAcronyms = False):
 	return case_token(pre_split(phrase), keepAcronyms)
 
+@lru_cache(maxsize = NORMALIZATION_CACHE_SIZE)
+def valid_tokens(phrase, keepAcronyms = False, stopWords = None):
+	''' Returns the tuple of normalized tokens of a phrase which are valid (see is_valid_token) and not in stopWords
+		(a tuple, if not None). Results are memoized, since the same cell values get normalized by many matchers. '''
+	tokens = map(lambda t: case_token(t, keepAcronyms), str.split(pre_split(phrase)))
+	return tuple([token for token in tokens if is_valid_token(token) and (stopWords is None or token not in stopWords)])
+
+register_cache_stats('split_and_case', lru_cache_stats(split_and_case))
+register_cache_stats('valid_tokens', lru_cache_stats(valid_tokens))
+
 def fold_for_changes(s, normalizeCase = False):
 	''' Override this if we want to skip minor changes (case, hyphenation, etc.) '''
 	return split_and_case(s) if normalizeCase else s
@@ -206,10 +453,13 @@ def normalize_and_validate_tokens(phrase,
 	''' Returns a list of normalized, valid tokens for the input phrase (an empty list
 		if no valid tokens were found) '''
 	if phrase:
-		tokens = map(lambda t: case_token(t, keepAcronyms), str.split(pre_split(phrase)))
-		validTokens = []
-		for token in tokens:
-			if tokenValidator(token) and (stopWords is None or token not in stopWords): validTokens.append(token)
+		if tokenValidator is is_valid_token:
+			validTokens = list(valid_tokens(phrase, keepAcronyms, None if stopWords is None else tuple(stopWords)))
+		else:
+			tokens = map(lambda t: case_token(t, keepAcronyms), str.split(pre_split(phrase)))
+			validTokens = []
+			for token in tokens:
+				if tokenValidator(token) and (stopWords is None or token not in stopWords): validTokens.append(token)
 		if phraseValidator(validTokens): return validTokens
 	return []
 
@@ -253,7 +503,8 @@ def file_row_iter(fileName, sep, path = RESOURCE_PATH):
 def file_column_to_list(fileName, c, sep = '\t', includeInvalid = True):
 	return [r[c] for r in file_row_iter(fileName, sep) if len(r) > c and (includeInvalid or is_valid_value(r[c]))]
 
-FRENCH_LEXICON = file_column_to_list('most_common_tokens_fr', 0, '|')
+@lazy_resource
+def french_lexicon(): return file_column_to_list('most_common_tokens_fr', 0, '|')
 
 def file_to_list(fileName, path = RESOURCE_PATH):
 	filePath = fileName if path is None else os.path.join(path, fileName)
@@ -458,6 +709,8 @@ class TypeMatcher(object):
 	def __init__(self, t):
 		self.t = t
 		self.diversion = set()
+		# Column scanner shared with other matchers (e.g. a RegexSet), prepared for each column by match_field_values
+		self.scanner = None
 	def diversity(self):
 		''' Specifies the min number of distinct reference values to qualify a column-wide match
 			(it is essential to carefully override this constraint when the labels in question represent
@@ -466,6 +719,17 @@ class TypeMatcher(object):
 		return 1
 	def __str__(self):
 		return '{}<{}>'.format(self.__class__.__name__, self.t)
+	def signature(self):
+		''' Returns a string telling this matcher apart from other matchers of the same class and type (e.g. its pattern
+			or lexicon), from which matcher_keys derives a key that does not depend on its position. '''
+		return ''
+	def vectorized(self):
+		''' Returns True if this matcher implements match_column, which then replaces calls to match on each cell
+			of a column when the column's values are available as a pandas Series. '''
+		return False
+	def match_column(self, column):
+		''' Vectorized counterpart of match, run on a ColumnValues instance. '''
+		raise NotImplementedError('{} has no vectorized implementation'.format(self))
 	def register_full_match(self, c, t, ms, hit = None):
 		outputFieldPrefix = None if self.t == t else self.t 
 		c.register_full_match(t, outputFieldPrefix, ms, hit)
@@ -474,17 +738,59 @@ class TypeMatcher(object):
 		outputFieldPrefix = None if self.t == t else self.t 
 		c.register_partial_match(t, outputFieldPrefix, ms, hit, span)
 		self.update_diversity(hit)
+	def register_full_matches(self, cells, t, ms, hits):
+		''' Bulk counterpart of register_full_match, which writes all matches at once when the cells share the same
+			MatchStore (as the cells of a Field do). '''
+		if len(cells) < 1: return
+		store = cells[0].store
+		if ms <= 0 or any(c.store is not store for c in cells):
+			for (c, hit) in zip(cells, hits): self.register_full_match(c, t, ms, hit)
+			return
+		t0 = cells[0].normalized_type(t, None if self.t == t else self.t)
+		logging.debug('FULL MATCHES of type <%s> for %d %s values', t, len(cells), cells[0].f)
+		store.add_many([c.row for c in cells], t, t0, FULL_MATCH, ms, hits, [0] * len(cells), [len(c.value) for c in cells])
+		for hit in hits: self.update_diversity(hit)
+	def register_partial_matches(self, cells, t, ms, hits, spans):
+		''' Bulk counterpart of register_partial_match (see register_full_matches). '''
+		if len(cells) < 1: return
+		store = cells[0].store
+		if ms <= 0 or any(c.store is not store for c in cells):
+			for (c, hit, span) in zip(cells, hits, spans): self.register_partial_match(c, t, ms, hit, span)
+			return
+		for (hit, span) in zip(hits, spans): checkSpan(hit, span)
+		t0 = cells[0].normalized_type(t, None if self.t == t else self.t)
+		logging.debug('PARTIAL MATCHES of type <%s> for %d %s values', t, len(cells), cells[0].f)
+		store.add_many([c.row for c in cells], t, t0, PARTIAL_MATCH, ms, hits, [span[0] for span in spans], [span[1] for span in spans])
+		for hit in hits: self.update_diversity(hit)
+	def register_group_matches(self, c, m, tgs, validators):
+		''' Registers the groups of a match anchored at the start of the cell value.
+
+			Parameters:
+			tgs a dictionary { type: group }
+			validators a dictionary { type: validator function } '''
+		for (t, g) in tgs.items():
+			try:
+				grp = m.group(g)
+				if t not in validators or validators[t](grp):
+					if len(grp) == len(c.value):
+						self.register_full_match(c, t, 100, grp)
+					else:
+						self.register_partial_match(c, t, 100, grp, (0, len(grp)))
+			except IndexError:
+				logging.error('No group %d matched in %s for input "%s"', g, self, c)
 	def update_diversity(self, hit):
 		self.diversion |= set(hit if isinstance(hit, list) else [hit])
 	def check_diversity(self, cells):
+		''' Returns True if this matcher's type was posited on the cells. '''
 		div = len(self.diversion)
-		if div <= 0: return
+		if div <= 0: return False
 		self.diversion.clear()
 		if div < self.diversity():
 			logging.info('Not enough diversity matches of type {} produced by {} ({})'.format(self.t, self, div))
-		else:
-			logging.info('Positing value type {} by {}'.format(self.t, self))
-			for c in cells: c.posit_type(self.t)
+			return False
+		logging.info('Positing value type {} by {}'.format(self.t, self))
+		for c in cells: c.posit_type(self.t)
+		return True
 
 MATCH_MODE_EXACT = 0
 MATCH_MODE_CLOSE = 1
@@ -501,11 +807,29 @@ class RegexMatcher(TypeMatcher):
 		self.validator = validator
 		self.neg = neg
 		self.wordBoundary = wordBoundary
+		self.r = re.compile(self.p, self.flags)
 		logging.info('SET UP regex matcher for <%s> (length %d)', self.t, len(self.p))
+	def signature(self): return '{}|{}|{}|{}|{}'.format(self.p, self.flags, self.g, self.partial, self.neg)
+	def match_value(self, v):
+		return self.r.match(v) if self.scanner is None else self.scanner.match(self, v)
+	def vectorized(self): return is_regex_set_eligible(self)
+	@timed
+	def match_column(self, column):
+		(fulls, partials) = (list(), list())
+		for (c, m) in extracted_matches(self, column):
+			if self.neg:
+				c.negate_type(self.t)
+				continue
+			grp = m.group(self.g)
+			if grp is None or (self.validator is not None and not self.validator(grp)): continue
+			(fulls if len(grp) == len(c.value) else partials).append((c, grp))
+		self.register_full_matches([c for (c, grp) in fulls], self.t, 100, [grp for (c, grp) in fulls])
+		self.register_partial_matches([c for (c, grp) in partials], self.t, 100, [grp for (c, grp) in partials],
+			[(0, len(grp)) for (c, grp) in partials])
 	@timed
 	def match(self, c):
 		if self.partial:
-			ms = re.findall(self.p, c.value, self.flags)
+			ms = self.r.findall(c.value)
 			if ms:
 				if self.neg:
 					c.negate_type(self.t)
@@ -521,7 +845,7 @@ class RegexMatcher(TypeMatcher):
 						else:
 							logging.warning('%s could not find regex multi-match "%s" in original "%s"', self, m, c.value)
 		else:
-			m = re.match(self.p, c.value, self.flags)
+			m = self.match_value(c.value)
 			if m:
 				if self.neg:
 					c.negate_type(self.t)
@@ -547,6 +871,7 @@ class VocabMatcher(RegexMatcher):
 		super(VocabMatcher, self).__init__(t, build_vocab_regex(vocab, partial),
 			g = 0, ignoreCase = ignoreCase, partial = partial, validator = validator, neg = neg)
 		self.matcher = matcher
+	def vectorized(self): return False
 	@timed
 	def match(self, c):
 		if self.matcher is not None:
@@ -571,6 +896,51 @@ def tokenization_based_score(matchedSrcTokens, srcTokens, matchedRefPhrase, refP
 def stop_words_as_normalized_list(stopWords): 
 	return [] if stopWords is None else list([case_token(s, False) for s in stopWords])
 
+class TokenTrie(object):
+	''' Trie over interned token ids, in which each lexicon phrase (as a token list) leads to a node holding a value.
+
+		Scanning a token list only follows the windows which are prefixes of some phrase, so that each start position
+		costs one dictionary lookup per token until the window leaves the trie (at most the longest phrase length, and
+		a single lookup for tokens which occur in no phrase), instead of one joined string per window length. '''
+	def __init__(self):
+		self.tokenIds = dict()
+		self.children = dict() # Child node by (node, token id), the root being node 0
+		self.values = dict() # Value by terminal node
+		self.nodes = 1
+	def insert(self, tokens):
+		''' Returns the node of a token list, adding the missing nodes along its path. '''
+		node = 0
+		for t in tokens:
+			tid = self.tokenIds.setdefault(t, len(self.tokenIds))
+			child = self.children.get((node, tid))
+			if child is None:
+				child = self.nodes
+				self.nodes += 1
+				self.children[(node, tid)] = child
+			node = child
+		return node
+	def add(self, tokens, value):
+		self.values[self.insert(tokens)] = value
+	def scan(self, tokens):
+		''' Returns the (start, end, value) triples for all windows of the token list which are phrases of the trie, the
+			longest first and then by start position. '''
+		ids = list([self.tokenIds.get(t, -1) for t in tokens])
+		matches = list()
+		for k1 in range(len(ids)):
+			node = 0
+			for k in range(k1, len(ids)):
+				node = self.children.get((node, ids[k]))
+				if node is None: break
+				if node in self.values: matches.append((k1, k + 1, self.values[node]))
+		matches.sort(key = lambda m: (m[0] - m[1], m[0]))
+		return matches
+
+def token_index_trie(tokenIdx):
+	''' Returns a TokenTrie mapping the phrases of a token index (keyed by space-joined tokens) to themselves. '''
+	trie = TokenTrie()
+	for phrase in tokenIdx.keys(): trie.add(phrase.split(' '), phrase)
+	return trie
+
 DTC = 6 # Dangerous Token Count (becomes prohibitive to tokenize many source strings above this!)
 class TokenizedMatcher(TypeMatcher):
 	def __init__(self, t, lexicon, maxTokens = 0, scorer = tokenization_based_score, distinctCount = 0, stopWords = None):
@@ -581,45 +951,109 @@ class TokenizedMatcher(TypeMatcher):
 		self.tokenIdx = dict()
 		self.distinctCount = distinctCount
 		self.stopWords = stop_words_as_normalized_list(stopWords)
-		for np in self.phrasesMap.keys():
-			tokens = list([t for t in np.split(' ') if t not in self.stopWords])
+		for phrase in self.phrasesMap.keys():
+			tokens = list([t for t in phrase.split(' ') if t not in self.stopWords])
 			if len(tokens) < 1: continue
 			if maxTokens < 1 and len(tokens) > currentMax:
 				currentMax = len(tokens)
 				if currentMax > DTC:
 					logging.warning('Full tokenization of lexicon: encountered token of length {}, above DTC!'.format(currentMax))
 			matchedRefPhrase = ' '.join(tokens[:currentMax])
-			if matchedRefPhrase not in self.tokenIdx or len(self.tokenIdx[matchedRefPhrase]) < len(np):
-				self.tokenIdx[matchedRefPhrase] = np
+			if matchedRefPhrase not in self.tokenIdx or len(self.tokenIdx[matchedRefPhrase]) < len(phrase):
+				self.tokenIdx[matchedRefPhrase] = phrase
 		self.maxTokens = currentMax
+		self.trie = None
 		logging.info('SET UP %d-token matcher (%s-defined length) for <%s> with lexicon of size %d, total variants %d',
 			self.maxTokens, 'user' if maxTokens > 0 else 'data', self.t, len(self.phrasesMap), len(self.tokenIdx))
+	def signature(self): return lexicon_digest(self.phrasesMap.keys())
 	def diversity(self):
 		return self.distinctCount if self.distinctCount > 0 else math.log(len(self.phrasesMap), 1.5)
+	def scan(self, v):
+		''' Returns the normalized tokens of a value and the (start, end, reference phrase) triples of its windows found in
+			the lexicon, from the matcher's LexiconSet if it belongs to one. '''
+		if self.scanner is not None: return self.scanner.scan(self, v)
+		if self.trie is None: self.trie = token_index_trie(self.tokenIdx)
+		tokens = normalize_and_validate_tokens(v, stopWords = self.stopWords)
+		return (tokens, self.trie.scan(tokens))
 	@timed
 	def match(self, c):
-		tokens = normalize_and_validate_tokens(c.value, tokenValidator = lambda t: is_valid_token(t) and t not in self.stopWords)
-		if tokens is not None:
-			for k2 in range(self.maxTokens, 0, -1):
-				for k1 in range(0, len(tokens) + 1 - k2):
-					matchSrcTokens = tokens[k1:k1 + k2]
-					matchRefPhrase = ' '.join(matchSrcTokens)
-					if matchRefPhrase in self.tokenIdx:
-						nm = self.tokenIdx[matchRefPhrase]
-						score = self.scorer(matchSrcTokens, tokens, matchRefPhrase, nm)
-						if nm not in self.phrasesMap:
-							raise RuntimeError('Normalized phrase {} not found in phrases map'.format(nm))
-							continue
-						hit = self.phrasesMap[nm]
-						v = split_and_case(c.value)
-						# The next line joins on '' and not on ' ' because non-pure space chars might have been transformed
-						# during tokenization (hyphens, punctuation, etc.)
-						subStr = ''.join(matchSrcTokens)
-						span = check_non_consecutive_subsequence(v, subStr)
-						if span is None:
-							logging.warning('%s could not find tokens "%s" in original "%s"', self, matchRefPhrase, v)
-							span = (0, len(c.value))
-						self.register_partial_match(c, self.t, score, hit, span)
+		(tokens, matches) = self.scan(c.value)
+		v = None
+		spans = dict()
+		for (k1, k2, matchRefPhrase) in matches:
+			matchSrcTokens = tokens[k1:k2]
+			nm = self.tokenIdx[matchRefPhrase]
+			score = self.scorer(matchSrcTokens, tokens, matchRefPhrase, nm)
+			hit = self.phrasesMap[nm]
+			# The next line joins on '' and not on ' ' because non-pure space chars might have been transformed
+			# during tokenization (hyphens, punctuation, etc.)
+			subStr = ''.join(matchSrcTokens)
+			if subStr not in spans:
+				if v is None: v = split_and_case(c.value)
+				spans[subStr] = check_non_consecutive_subsequence(v, subStr)
+				if spans[subStr] is None:
+					logging.warning('%s could not find tokens "%s" in original "%s"', self, matchRefPhrase, v)
+					spans[subStr] = (0, len(c.value))
+			self.register_partial_match(c, self.t, score, hit, spans[subStr])
+
+class LexiconSet(object):
+	''' Combines the token indexes of several tokenized matchers (TokenizedMatcher and VariantExpander instances), so
+		that each cell value is tokenized once and scanned once for all of them.
+
+		Matchers are grouped by stop-word list, each group sharing a TokenTrie whose phrases are tagged with their
+		owning matchers: a value's tokens are filtered by each group's stop words, and the windows found in the group's
+		trie are dispatched to their owners. As in RegexSet, scan results are computed for all distinct values of a
+		column by prepare(), then looked up by each matcher in turn, which keeps its own scorer and matching logic. '''
+	def __init__(self, matchers):
+		self.matchers = list(matchers)
+		self.tries = dict() # TokenTrie by stop-word list, whose values are lists of (matcher index, phrase) pairs
+		for (i, vm) in enumerate(self.matchers):
+			trie = self.tries.setdefault(tuple(sorted(set(vm.stopWords))), TokenTrie())
+			for phrase in vm.tokenIdx.keys(): trie.values.setdefault(trie.insert(phrase.split(' ')), []).append((i, phrase))
+			vm.scanner = self
+		self.index = { id(vm): i for (i, vm) in enumerate(self.matchers) }
+		self.hits = dict()
+		logging.info('SET UP lexicon set with %d matchers (%d stop-word groups, %d trie nodes)', len(self.matchers),
+			len(self.tries), sum(trie.nodes for trie in self.tries.values()))
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['hits'] = dict()
+		# The index is keyed by matcher identity, which does not survive pickling
+		del state['index']
+		return state
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.index = { id(vm): i for (i, vm) in enumerate(self.matchers) }
+	def compute(self, v):
+		''' Returns a dictionary mapping matcher index to the pair of the value's tokens (as filtered for that matcher)
+			and the windows found in that matcher's lexicon, for the matchers with at least one window. '''
+		tokens = list(valid_tokens(v)) if v else []
+		found = dict()
+		for (stopWords, trie) in self.tries.items():
+			ts = list([t for t in tokens if t not in stopWords]) if len(stopWords) > 0 else tokens
+			if not is_valid_phrase(ts): continue
+			for (k1, k2, owners) in trie.scan(ts):
+				for (i, phrase) in owners: found.setdefault(i, (ts, list()))[1].append((k1, k2, phrase))
+		return found
+	@timed
+	def prepare(self, cells):
+		self.hits = { c.value: self.compute(c.value) for c in cells }
+	def release(self):
+		self.hits = dict()
+	def scan(self, vm, v):
+		''' Returns the tokens of a value and its windows found in a matcher's lexicon (see TokenizedMatcher.scan). '''
+		found = self.hits[v] if v in self.hits else self.compute(v)
+		return found.get(self.index[id(vm)], ([], []))
+
+def lexicon_set_members(vms):
+	''' Generates the tokenized matchers among value matchers, including those to which a VocabMatcher dispatches. '''
+	for vm in vms:
+		if isinstance(vm, (TokenizedMatcher, VariantExpander)): yield vm
+		if isinstance(getattr(vm, 'matcher', None), (TokenizedMatcher, VariantExpander)): yield vm.matcher
+
+def compile_lexicon_set(vms):
+	members = list({ id(vm): vm for vm in lexicon_set_members(vms) }.values())
+	return LexiconSet(members) if len(members) > 1 else None
 
 # Label-based matcher-normalizer class and its underlying FSS structure
 
@@ -654,13 +1088,34 @@ class LabelMatcher(TypeMatcher):
 		# dictionary from normalized string to list of original strings
 		labelsMap = validated_lexical_map(lexicon, tokenize = self.tokenize, stopWords = self.stopWords, synMap = synMap) 
 		self.labelsMap = labelsMap
+		self.labelsIndex = None # pandas Index of the normalized labels, built on first use by match_column
 		if mm == MATCH_MODE_EXACT:
 			logging.info('SET UP exact label matcher for <%s>: lexicon of size %d', self.t, len(labelsMap))
 		elif mm == MATCH_MODE_CLOSE:
 			self.fss = build_fast_sim_struct(labelsMap.keys())
 			logging.info('SET UP close label matcher for <%s>: lexicon of size %d', self.t, len(labelsMap))
+	def signature(self): return '{}|{}'.format(self.mm, lexicon_digest(self.labelsMap.keys()))
 	def diversity(self):
 		return math.log(len(self.labelsMap), 1.8)
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['labelsIndex'] = None
+		return state
+	def vectorized(self): return self.mm == MATCH_MODE_EXACT
+	@timed
+	def match_column(self, column):
+		''' Joins the normalized values of the column (shared with other label matchers using the same normalization)
+			with the normalized lexicon. '''
+		vs = column.derive(('normalized', self.tokenize, tuple(self.stopWords)),
+			lambda values: values.map(partial(normalize_or_not, stopWords = self.stopWords, tokenize = self.tokenize)))
+		if self.synMap is not None:
+			syn = vs.isin(self.synMap.keys())
+			if syn.any(): vs = vs.where(~syn, vs[syn].map(self.synMap.__getitem__))
+		if self.labelsIndex is None:
+			import pandas as pd
+			self.labelsIndex = pd.Index(list(self.labelsMap.keys()), dtype = object)
+		found = ((self.labelsIndex.get_indexer(vs) >= 0) & vs.astype(bool).to_numpy()).nonzero()[0]
+		self.register_full_matches([column.cells[i] for i in found], self.t, 100, [self.labelsMap[v] for v in vs.iloc[found]])
 	@timed
 	def match(self, c):
 		v = normalize_or_not(c.value, stopWords = self.stopWords, tokenize = self.tokenize)
@@ -689,6 +1144,7 @@ class SubtypeMatcher(TypeMatcher):
 		if len(subtypes) < 1: raise Error('Invalid subtype matcher setup')
 		logging.info('SET UP subtype matcher for <%s> with subtypes: %s', self.t, ', '.join(subtypes))
 		PARENT_CHILD_RELS[t] |= set(subtypes)
+	def signature(self): return '|'.join(sorted(self.subtypes))
 	def match(self, c):
 		sts = list(self.subtypes & c.non_excluded_types())
 		if len(sts) < 1: return None
@@ -716,6 +1172,7 @@ class CompositeMatcher(TypeMatcher):
 		if len(compTypes) < 1: raise RuntimeError('Invalid composite matcher setup')
 		logging.info('SET UP composite matcher for <%s> with %d types', self.t, len(compTypes))
 		PARENT_CHILD_RELS[t] |= set(compTypes)
+	def signature(self): return '|'.join(self.compTypes)
 	def match(self, c):
 		sts = list(set(self.compTypes) & c.non_excluded_types())
 		if len(sts) < 1: return None
@@ -749,12 +1206,18 @@ class CompositeRegexMatcher(TypeMatcher):
 		self.flags = re.I if ignoreCase else 0
 		self.partial = partial
 		self.validators = validators
+		self.r = re.compile(self.p, self.flags)
+	def signature(self): return '{}|{}|{}'.format(self.p, self.flags, self.partial)
+	def match_value(self, v):
+		return self.r.match(v) if self.scanner is None else self.scanner.match(self, v)
+	def vectorized(self): return is_regex_set_eligible(self)
+	@timed
+	def match_column(self, column):
+		for (c, m) in extracted_matches(self, column): self.register_group_matches(c, m, self.tgs, self.validators)
 	@timed
 	def match(self, c):
 		if self.partial:
-			ms = re.findall(self.p, v, flags = self.flags)
-			if not ms: return
-			for m in ms:
+			for m in self.r.finditer(c.value):
 				for (t, g) in self.tgs.items():
 					try:
 						grp = m.group(g)
@@ -763,18 +1226,110 @@ class CompositeRegexMatcher(TypeMatcher):
 					except IndexError:
 						logging.error('No group %d matched in %s for input %s', g, self.p, c)
 		else:
-			m = re.match(self.p, c.value, flags = self.flags)
-			if not m: return
-			for (t, g) in self.tgs.items():
-				try:
-					grp = m.group(g)
-					if t not in self.validators or self.validators[t](grp):
-						if len(grp) == len(c.value):
-							self.register_full_match(c, t, 100, grp)
-						else:
-							self.register_partial_match(c, t, 100, grp, (0, len(grp)))
-				except IndexError:
-					logging.error('No group %d matched in regex "%s" for input "%s"', g, self.p, c)
+			m = self.match_value(c.value)
+			if m: self.register_group_matches(c, m, self.tgs, self.validators)
+
+# Single-pass evaluation of several regex matchers
+
+class RegexSetMatch(object):
+	''' View on the groups of one pattern within a RegexSet match, with the same group/span interface as a match
+		object obtained from that pattern alone. '''
+	__slots__ = ('m', 'g0', 'groups')
+	def __init__(self, m, g0, groups):
+		self.m = m
+		self.g0 = g0
+		self.groups = groups
+	def group(self, g = 0):
+		if g < 0 or g > self.groups: raise IndexError('no such group')
+		return self.m.group(self.g0 + g)
+	def span(self, g = 0):
+		if g < 0 or g > self.groups: raise IndexError('no such group')
+		return self.m.span(self.g0 + g)
+
+def is_regex_set_eligible(vm):
+	''' Anchored matchers whose groups can be renumbered (no back-references nor named groups) can join a RegexSet. '''
+	return (isinstance(vm, (RegexMatcher, CompositeRegexMatcher)) and not vm.partial
+		and len(vm.r.groupindex) < 1 and not re.search(r'\\[1-9]', vm.p))
+
+class RegexSet(object):
+	''' Combines the patterns of several anchored regex matchers into a single regex, so that each cell value is
+		scanned once for all of them.
+
+		Each pattern is wrapped in an optional lookahead at the start of the value: when it succeeds, it captures
+		exactly what re.match would have with that pattern alone (along with its groups, shifted by a fixed offset).
+		Scan results are computed for all distinct values of a column by prepare(), then looked up by each matcher
+		in turn, so that every matcher keeps its own semantics (groups, validators, negation). '''
+	def __init__(self, matchers):
+		self.matchers = list(matchers)
+		self.offsets = dict()
+		parts = list()
+		g0 = 1
+		for vm in self.matchers:
+			self.offsets[id(vm)] = g0
+			parts.append('(?:(?=({})))?'.format('(?{}:{})'.format('i' if vm.flags & re.I else '', vm.p)))
+			g0 += vm.r.groups + 1
+		self.r = re.compile(''.join(parts))
+		self.hits = dict()
+		for vm in self.matchers: vm.scanner = self
+		logging.info('SET UP regex set with %d patterns (%d groups)', len(self.matchers), self.r.groups)
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['hits'] = dict()
+		# Offsets are keyed by matcher identity, which does not survive pickling
+		state['offsets'] = list([self.offsets[id(vm)] for vm in self.matchers])
+		return state
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.offsets = { id(vm): g0 for (vm, g0) in zip(self.matchers, state['offsets']) }
+	@timed
+	def prepare(self, cells):
+		self.hits = { c.value: self.r.match(c.value) for c in cells }
+	def release(self):
+		self.hits = dict()
+	def scan(self, v):
+		''' Returns the list of (matcher, match) pairs for all the patterns that matched the input value. '''
+		m = self.hits[v] if v in self.hits else self.r.match(v)
+		return list([(vm, RegexSetMatch(m, self.offsets[id(vm)], vm.r.groups)) for vm in self.matchers
+			if m.start(self.offsets[id(vm)]) >= 0])
+	def match(self, vm, v):
+		''' Returns a match object for the matcher's own pattern, or None if it did not match the input value. '''
+		m = self.hits[v] if v in self.hits else self.r.match(v)
+		g0 = self.offsets[id(vm)]
+		return RegexSetMatch(m, g0, vm.r.groups) if m.start(g0) >= 0 else None
+	def extract(self, column):
+		''' Returns a DataFrame holding the groups of the combined regex (group g in column g - 1) for each value of
+			a ColumnValues instance, extracted in a single pass shared by all matchers of the set. '''
+		return column.derive(('regex set', id(self)), lambda values: values.str.extract(self.r.pattern, expand = True))
+
+class ExtractedMatch(object):
+	''' View on a row of groups extracted from a pandas Series, with the same group interface as a match object. '''
+	__slots__ = ('row', 'g0', 'groups')
+	def __init__(self, row, g0, groups):
+		self.row = row
+		self.g0 = g0
+		self.groups = groups
+	def group(self, g = 0):
+		if g < 0 or g > self.groups: raise IndexError('no such group')
+		v = self.row[self.g0 + g - 1]
+		return v if isinstance(v, str) else None
+
+def extracted_matches(vm, column):
+	''' Generates (cell, match) pairs for the cells of a ColumnValues instance on which the pattern of an anchored regex
+		matcher matches, extracting groups through the matcher's RegexSet when it has one. '''
+	if vm.scanner is None:
+		table = column.derive(('regex', vm.p, vm.flags),
+			lambda values: values.str.extract('^({})'.format(vm.p), flags = vm.flags, expand = True))
+		g0 = 1
+	else:
+		table = vm.scanner.extract(column)
+		g0 = vm.scanner.offsets[id(vm)]
+	matched = table[g0 - 1].notna()
+	for (i, row) in zip(matched.to_numpy().nonzero()[0], table[matched].itertuples(index = False, name = None)):
+		yield (column.cells[i], ExtractedMatch(row, g0, vm.r.groups))
+
+def compile_regex_set(vms):
+	eligible = list([vm for vm in vms if is_regex_set_eligible(vm)])
+	return RegexSet(eligible) if len(eligible) > 1 else None
 
 # Object model representing our inference process
 
@@ -783,42 +1338,622 @@ COLUMN_SCORE_THRESHOLD = 10
 # For both supertype and composite-type relationships, switch from parent to child type when:
 #   parent's score < this ratio * child's score
 PARENT_CHILD_RATIO = 2
+# When sampling rows, scores whose confidence intervals span no more than this many points are considered tied
+SAMPLING_TIE_TOLERANCE = 2
 # SUPERTYPE_RATIO = 2 # Switch from parent to child type when: parent's score < this ratio * child's score
 # COMPTYPE_RATIO = 2 # Switch from composite to component type when: composite's score < this ratio * child's score
 
-def parse_fields_from_CSV(fileName, delimiter):
-	''' Takes a CSV filepath and a delimiter as input, returns an instance of the Fields class. '''
-	a = list(file_row_iter(fileName, delimiter, path = None))
-	return Fields({ Cell(h, h): Field([Cell(a[i][k] if len(a[i]) > k else '', h) for i in range(1, len(a))]) for (k, h) in enumerate(a[0]) },
-		len(a) - 1)
+def parse_fields_from_CSV(fileName, delimiter, maxRows = 0):
+	''' Takes a CSV filepath and a delimiter as input, returns an instance of the Fields class.
+
+		Parameters:
+		maxRows if greater than 0, then only the first maxRows rows (after the header) are parsed '''
+	with perfMetrics.stage('load'):
+		rows = file_row_iter(fileName, delimiter, path = None)
+		a = list(itertools.islice(rows, maxRows + 1) if maxRows > 0 else rows)
+		if len(a) < 1: return Fields({ }, 0)
+		return Fields({ Cell(h, h): Field([a[i][k] if len(a[i]) > k else '' for i in range(1, len(a))], h) for (k, h) in enumerate(a[0]) },
+			len(a) - 1)
+
+def parse_fields_from_Panda(df, vectorize = True):
+	''' Takes a DataFrame as input, returns an instance of the Fields class.
 
-def parse_fields_from_Panda(df):
-	''' Takes a DataFrame as input, returns an instance of the Fields class. '''
-	return Fields({ Cell(h, h): Field([Cell(v, h) for v in c]) for (h, c) in df.items() },
-		df.shape[0])
+		Parameters:
+		vectorize if True, then matchers which have a vectorized implementation are run on pandas Series '''
+	with perfMetrics.stage('load'):
+		return Fields({ Cell(h, h): Field(list(c), h) for (h, c) in df.items() },
+			df.shape[0], vectorize = vectorize)
+
+class ColumnValues(object):
+	''' The values of some cells of a column as a pandas Series (in the same order as the cells), along with columns
+		derived from it which are shared by the vectorized matchers (e.g. normalized values, extracted groups). '''
+	def __init__(self, cells):
+		import pandas as pd
+		self.cells = cells
+		self.values = pd.Series([c.value for c in cells], dtype = object)
+		self.derived = dict()
+	def derive(self, key, f):
+		if key not in self.derived: self.derived[key] = f(self.values)
+		return self.derived[key]
+
+def lexicon_digest(entries):
+	''' Returns a short digest of a set of lexicon entries, which does not depend on their order. '''
+	return hashlib.sha1('\n'.join(sorted(entries)).encode('utf-8')).hexdigest()[:12]
+
+def matcher_key(vm):
+	''' Returns the description of a value matcher, followed by a digest of its signature if it has one (computed once
+		per matcher, since it may cover a whole lexicon). '''
+	key = vm.__dict__.get('key')
+	if key is None:
+		signature = vm.signature()
+		key = '{}:{}'.format(vm, hashlib.sha1(signature.encode('utf-8')).hexdigest()[:8]) if signature else str(vm)
+		vm.key = key
+	return key
+
+def matcher_keys(vms):
+	''' Returns a dictionary { id(vm): key } identifying each value matcher by its class, type and signature (as used
+		in scheduler stats and performance metrics), so that keys do not change when other matchers are added or removed.
+		Matchers that cannot be told apart are numbered in order. '''
+	(keys, seen) = (dict(), Counter())
+	for vm in vms:
+		key = matcher_key(vm)
+		seen[key] += 1
+		keys[id(vm)] = key if seen[key] < 2 else '{}#{}'.format(key, seen[key])
+	return keys
+
+def run_value_matcher(vm, cells, column = None, key = None):
+	''' Runs a value matcher on cells, through its vectorized implementation if it has one and column is not None
+		(a ColumnValues instance for the same cells).
+
+		When performance metrics are enabled, each call is recorded under the matcher key (see matcher_keys). '''
+	if perfMetrics.enabled and len(cells) > 0:
+		run_value_matcher_with_metrics(vm, cells, column, perfMetrics.matcher(key if key else str(vm), cells[0].f))
+	elif column is not None and vm.vectorized():
+		vm.match_column(column)
+	else:
+		for c in cells: vm.match(c)
+
+def run_value_matcher_with_metrics(vm, cells, column, mm):
+	store = cells[0].store
+	if column is not None and vm.vectorized():
+		(start, entries) = (time.perf_counter(), len(store))
+		vm.match_column(column)
+		mm.record(len(cells), time.perf_counter() - start, len(store) - entries)
+		return
+	for c in cells:
+		(start, entries) = (time.perf_counter(), len(c.store))
+		vm.match(c)
+		mm.record(1, time.perf_counter() - start, len(c.store) - entries)
+
+def column_scanners(vms, vectorize = False):
+	''' Returns the distinct scanners of the matchers which are run cell by cell. '''
+	return list({ id(vm.scanner): vm.scanner for vm in vms if vm.scanner is not None and not (vectorize and vm.vectorized()) }.values())
+
+class ColumnScanners(object):
+	''' The column scanners of a set of matchers (see column_scanners), each one being prepared on the cells only when
+		the first matcher using it is run, so that matchers skipped on a column (e.g. by a MatcherScheduler) cost no scan. '''
+	def __init__(self, vms, cells, vectorize = False):
+		self.scanners = set([id(scanner) for scanner in column_scanners(vms, vectorize)])
+		self.cells = cells
+		self.prepared = list()
+	def prepare(self, vm):
+		''' Prepares the scanner of a matcher about to be run, unless it is already prepared. '''
+		scanner = vm.scanner
+		if scanner is None or id(scanner) not in self.scanners or any(s is scanner for s in self.prepared): return
+		scanner.prepare(self.cells)
+		self.prepared.append(scanner)
+	def release(self):
+		for scanner in self.prepared: scanner.release()
+		self.prepared = list()
+
+def group_cells_by_value(cells):
+	''' Returns the list of representative cells (the first cell holding each distinct value), along with
+		a list of (duplicate cell, representative cell) pairs. '''
+	reps = dict()
+	dups = list()
+	for c in cells:
+		if c.value in reps: dups.append((c, reps[c.value]))
+		else: reps[c.value] = c
+	return (list(reps.values()), dups)
+
+def match_field_values(fieldName, cells, vms, dedup = True, vectorize = False, scheduler = None, diversions = None):
+	''' Runs value matchers on the cells of a single column, and returns the set of types posited for that column.
+
+		Columns are independent from each other, so this is the unit of work for both the serial and the parallel
+		execution of Fields.match_headers_and_values.
+
+		Parameters:
+		dedup if True, then matchers are only run once per distinct value, and the resulting inferences are shared
+			by all cells holding that value
+		vectorize if True, then matchers which have a vectorized implementation are run on a pandas Series of the values
+		scheduler if not None, a MatcherScheduler which orders the matchers and skips the expensive ones once the
+			column's type is decided
+		diversions if not None, a dictionary filled with the distinct hits of each matcher whose type was not posited
+			(see record_diversion) '''
+	start = time.time()
+	positions = { id(vm): i for (i, vm) in enumerate(vms) }
+	(reps, dups) = group_cells_by_value(cells) if dedup else (cells, [])
+	scanners = ColumnScanners(vms, reps, vectorize)
+	column = ColumnValues(reps) if vectorize else None
+	store = reps[0].store if len(reps) > 0 else None
+	keys = matcher_keys(vms) if perfMetrics.enabled else {}
+	if scheduler is not None:
+		vms = scheduler.order(vms, fieldName)
+		weights = Counter([rep.row for rep in reps]) + Counter([rep.row for (c, rep) in dups])
+		decision = None
+		decisionState = None
+	posited = set()
+	for vm in vms:
+		if isinstance(vm, SubtypeMatcher): continue
+		if isinstance(vm, CompositeMatcher): continue
+		if scheduler is not None and store is not None:
+			if scheduler.is_expensive(vm) and decisionState != (len(store), len(store.posited)):
+				decisionState = (len(store), len(store.posited))
+				decision = scheduler.decided_type(store, weights, len(cells))
+			if scheduler.should_skip(vm, fieldName, decision): continue
+			(vmStart, entries) = (time.perf_counter(), len(store))
+		logging.debug('RUNNING %s on %s values', vm, fieldName)
+		scanners.prepare(vm)
+		run_value_matcher(vm, reps, column, keys.get(id(vm)))
+		if scheduler is not None and store is not None:
+			scheduler.record(vm, len(reps), time.perf_counter() - vmStart, len(store) - entries)
+		if diversions is not None: record_diversion(vm, positions[id(vm)], diversions)
+		if vm.check_diversity(reps): posited.add(vm.t)
+	scanners.release()
+	for (c, rep) in dups: c.share_inferences(rep)
+	if dedup and len(cells) > 0:
+		elapsed = time.time() - start
+		saved = elapsed * len(dups) / len(reps)
+		logging.info('Deduplicated %s values: %d distinct out of %d (%.1f%%), matched in %.3fs, saved %.3fs (est.)',
+			fieldName, len(reps), len(cells), 100. * len(reps) / len(cells), elapsed, saved)
+		dedupInfo['cells'] += len(cells)
+		dedupInfo['distinct'] += len(reps)
+		dedupInfo['saved'] += int(saved * MICROS_PER_SEC)
+	return posited
+
+def record_diversion(vm, i, diversions):
+	''' Keeps the distinct hits of the i-th value matcher on a column if they fall short of its diversity threshold (which
+		bounds their number), so that its type can still be posited once rows are appended to the column. '''
+	if len(vm.diversion) > 0 and len(vm.diversion) < vm.diversity(): diversions[i] = set(vm.diversion)
+	else: diversions.pop(i, None)
+
+def log_dedup_stats():
+	if dedupInfo['cells'] < 1: return
+	logging.info('Deduplication stats: %d distinct values out of %d cells (%.1f%%), saved %.3fs (est.)',
+		dedupInfo['distinct'], dedupInfo['cells'], 100. * dedupInfo['distinct'] / dedupInfo['cells'],
+		dedupInfo['saved'] / MICROS_PER_SEC)
+
+def wilson_interval(k, n, z):
+	''' Returns the Wilson score interval (in percentage points) for a ratio of k successes out of n trials. '''
+	if n <= 0: return (0., 100.)
+	p = k / n
+	d = 1 + z * z / n
+	center = (p + z * z / (2 * n)) / d
+	half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / d
+	return (100. * max(0., center - half), 100. * min(1., center + half))
+
+def is_settled_comparison(b1, b2, tolerance = SAMPLING_TIE_TOLERANCE):
+	''' Returns True if intervals b1 and b2 do not overlap, or if they are close enough to be considered tied. '''
+	return b1[0] > b2[1] or b2[0] > b1[1] or max(b1[1], b2[1]) - min(b1[0], b2[0]) <= tolerance
+
+class ProgressiveSampler(object):
+	''' Evaluates the rows of a column in growing random batches, until the decisions made by Fields.infer_types
+		(column score threshold, ranking of candidate types, parent vs. child type) are settled with the given confidence. '''
+	def __init__(self, sampleSize = 1000, growth = 2, confidence = .95, seed = 0):
+		''' Parameters:
+			sampleSize the number of rows in the first batch
+			growth the size ratio between successive batches
+			confidence the confidence level of the score intervals
+			seed the seed used to shuffle rows (for reproducible results) '''
+		self.sampleSize = max(1, sampleSize)
+		self.growth = max(1., growth)
+		self.confidence = confidence
+		self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+		self.seed = seed
+	def __str__(self):
+		return 'ProgressiveSampler<size={}, growth={}, confidence={}>'.format(self.sampleSize, self.growth, self.confidence)
+	def batches(self, n):
+		''' Generates lists of row indices, in random order and of growing size, that cover range(n).
+			Rows are shuffled lazily (only up to the last batch actually consumed). '''
+		indices = list(range(n))
+		rng = random.Random(self.seed)
+		(i, size) = (0, float(self.sampleSize))
+		while i < n:
+			j = min(n, i + int(size))
+			for k in range(i, j):
+				r = rng.randrange(k, n)
+				indices[k], indices[r] = indices[r], indices[k]
+			yield indices[i:j]
+			(i, size) = (j, size * self.growth)
+	def is_settled(self, hits, pending, n):
+		''' Parameters:
+			hits a dictionary { type: number of evaluated rows on which the (posited) type scores }
+			pending a dictionary { type: number of evaluated rows on which the type would score if posited }
+				for types whose diversity is still growing
+			n the number of evaluated rows '''
+		threshold = (COLUMN_SCORE_THRESHOLD, COLUMN_SCORE_THRESHOLD)
+		for k in pending.values():
+			if wilson_interval(k, n, self.z)[1] >= COLUMN_SCORE_THRESHOLD: return False
+		bounds = { t: wilson_interval(k, n, self.z) for (t, k) in hits.items() }
+		if not all(is_settled_comparison(b, threshold) for b in bounds.values()): return False
+		kept = sorted([(t, b) for (t, b) in bounds.items() if b[1] >= COLUMN_SCORE_THRESHOLD], key = lambda tb: tb[1][0], reverse = True)
+		for ((t1, b1), (t2, b2)) in zip(kept, kept[1:]):
+			if not is_settled_comparison(b1, b2): return False
+		for (t, b) in kept:
+			if t not in PARENT_CHILD_RELS: continue
+			for (child, cb) in kept:
+				if child in PARENT_CHILD_RELS[t] and not is_settled_comparison((cb[0] * PARENT_CHILD_RATIO, cb[1] * PARENT_CHILD_RATIO), b):
+					return False
+		return True
+
+def sampling_params(params):
+	''' Returns a ProgressiveSampler if the params enable sampling, otherwise None. '''
+	if not params or not params.get('sampling', False): return None
+	return ProgressiveSampler(sampleSize = params.get('sample_size', 1000), growth = params.get('sample_growth', 2),
+		confidence = params.get('confidence', .95))
+
+# Matchers which are deemed expensive as long as their cost has not been measured
+EXPENSIVE_MATCHER_CLASSES = ('CustomDateMatcher', 'CustomAddressMatcher', 'FrenchAddressMatcher', 'TokenizedMatcher',
+	'CustomPersonNameMatcher')
+
+def matcher_dependencies(vm):
+	''' Returns the types whose inferences a matcher relies upon, besides its own type. '''
+	deps = set()
+	for m in [vm, getattr(vm, 'matcher', None)]:
+		if getattr(m, 'domainType', None) is not None: deps.add(m.domainType)
+	return deps
+
+class MatcherScheduler(object):
+	''' Orders the value matchers run on each column by cost and selectivity, and skips expensive matchers on a column
+		once its type has been decided with enough margin.
+
+		The cost (seconds per evaluated value) and hit rate (inferences per evaluated value) of each matcher are
+		measured on every column, on top of the stats loaded from a previous (e.g. calibration) run. '''
+	def __init__(self, stats = None, decisionScore = 90, margin = 30, expensiveRatio = 3):
+		''' Parameters:
+			stats a dictionary { matcher key: [values, seconds, hits] } saved by a previous run
+			decisionScore the min column score of the leading type for the column's type to be decided
+			margin the min score difference between the leading type and the next one for the type to be decided
+			expensiveRatio the min ratio between the cost of a matcher which may be skipped and the median cost of the
+				measured matchers '''
+		self.stats = { k: list(v) for (k, v) in stats.items() } if stats else dict()
+		self.observed = dict() # Stats measured during this run only
+		self.decisionScore = decisionScore
+		self.margin = margin
+		self.expensiveRatio = expensiveRatio
+		self.keys = dict()
+		self.decisions = list() # Audit trail of (column, matcher key, decision, reason) tuples
+	def __str__(self):
+		return 'MatcherScheduler<score={}, margin={}, ratio={}>'.format(self.decisionScore, self.margin, self.expensiveRatio)
+	def key(self, vm): return self.keys[id(vm)]
+	def cost(self, vm):
+		''' Returns the measured cost per value of a matcher (None if it has not been measured yet). '''
+		(values, seconds, hits) = self.stats.get(self.key(vm), (0, 0., 0))
+		return seconds / values if values > 0 else None
+	def priority(self, vm):
+		''' Returns the expected cost per hit of a matcher (None if it has not been measured yet). '''
+		(values, seconds, hits) = self.stats.get(self.key(vm), (0, 0., 0))
+		return seconds / (hits + 1) if values > 0 else None
+	def is_expensive(self, vm):
+		cost = self.cost(vm)
+		if cost is None: return vm.__class__.__name__ in EXPENSIVE_MATCHER_CLASSES
+		costs = sorted(seconds / values for (values, seconds, hits) in self.stats.values() if values > 0)
+		return cost >= self.expensiveRatio * costs[len(costs) // 2]
+	def order(self, vms, fieldName):
+		''' Returns the value matchers in the order in which they should run on a column: among the next matcher of
+			each type, the one with the lowest expected cost per hit comes first, and unmeasured matchers keep their
+			original position (so that without any stats the original order is preserved).
+
+			Matchers of the same type keep their relative order, as do matchers relying on the inferences of
+			another type (e.g. a VariantExpander with a domain type) relative to the matchers of that type. '''
+		self.keys.update(matcher_keys(vms))
+		queues = defaultdict(list)
+		for (i, vm) in enumerate(vms): queues[vm.t].append((i, vm))
+		def ready(q):
+			(i, vm) = q[0]
+			deps = set(itertools.chain.from_iterable([[t] + list(PARENT_CHILD_RELS.get(t, ())) for t in matcher_dependencies(vm)]))
+			return not any(q2[0][0] < i for (t, q2) in queues.items() if t in deps and len(q2) > 0)
+		def rank(q):
+			p = self.priority(q[0][1])
+			return (p is None, p or 0, q[0][0])
+		ordered = list()
+		while len(ordered) < len(vms):
+			q = min([q for q in queues.values() if len(q) > 0 and ready(q)], key = rank)
+			ordered.append(q.pop(0)[1])
+		if any(vm is not vm0 for (vm, vm0) in zip(ordered, vms)):
+			logging.info('Scheduled matchers for %s: %s', fieldName, ', '.join(self.key(vm) for vm in ordered))
+		return ordered
+	def decided_type(self, store, weights, n):
+		''' Returns the (type, score, margin) of the leading type of a column if that type is decided, None otherwise.
+
+			Parameters:
+			weights a dictionary { store row: number of cells sharing the row's inferences }
+			n the number of cells in the column '''
+		if n < 1: return None
+		scores = sorted([(100. * sum(weights.get(row, 1) for row in rows) / n, t) for (t, rows) in store.scored_rows().items()],
+			reverse = True)
+		if len(scores) < 1 or scores[0][0] < self.decisionScore: return None
+		margin = scores[0][0] - (scores[1][0] if len(scores) > 1 else 0)
+		return (scores[0][1], scores[0][0], margin) if margin >= self.margin else None
+	def should_skip(self, vm, fieldName, decision):
+		''' Returns True if an expensive matcher can be skipped on a column, since the column's type has been decided
+			(decision being the output of decided_type) and the matcher's type is unrelated to it. '''
+		if decision is None or not self.is_expensive(vm): return False
+		(t, score, margin) = decision
+		if vm.t == t or vm.t in PARENT_CHILD_RELS.get(t, ()) or t in PARENT_CHILD_RELS.get(vm.t, ()): return False
+		cost = self.cost(vm)
+		reason = 'type {} decided with score {:.1f} (margin {:.1f}), matcher cost {}'.format(t, score, margin,
+			'unknown' if cost is None else '{:.1f} us per value'.format(cost * MICROS_PER_SEC))
+		logging.info('Skipping %s on %s: %s', self.key(vm), fieldName, reason)
+		self.decisions.append((fieldName, self.key(vm), 'skipped', reason))
+		return True
+	def record(self, vm, values, seconds, hits):
+		for stats in [self.stats, self.observed]:
+			s = stats.setdefault(self.key(vm), [0, 0., 0])
+			s[0] += values
+			s[1] += seconds
+			s[2] += hits
+	def merge(self, observed, decisions):
+		''' Merges the stats measured and the decisions made by another scheduler (e.g. in a worker process). '''
+		for (k, (values, seconds, hits)) in observed.items():
+			for stats in [self.stats, self.observed]:
+				s = stats.setdefault(k, [0, 0., 0])
+				s[0] += values
+				s[1] += seconds
+				s[2] += hits
+		self.decisions.extend(decisions)
+	def save(self, fileName):
+		with open(fileName, 'w') as f: json.dump(self.stats, f, indent = 1, sort_keys = True)
+		logging.info('Saved stats for %d matchers to %s', len(self.stats), fileName)
+
+def load_scheduler(fileName = None):
+	''' Returns a MatcherScheduler initialized with the stats saved to a file by a previous run (if it exists). '''
+	stats = None
+	if fileName is not None and os.path.isfile(fileName):
+		with open(fileName, 'r') as f: stats = json.load(f)
+		logging.info('Loaded stats for %d matchers from %s', len(stats), fileName)
+	return MatcherScheduler(stats = stats)
+
+def scheduling_params(params):
+	''' Returns a MatcherScheduler if the params enable scheduling, otherwise None. '''
+	if not params or not params.get('scheduling', False): return None
+	return load_scheduler(params.get('scheduler_stats'))
+
+def sample_field_values(fieldName, cells, vms, sampler, dedup = True, vectorize = False, diversions = None):
+	''' Does the same as match_field_values, but on growing random batches of cells, stopping as soon as the sampler
+		considers the type ranking of the column settled.
+
+		Returns the set of types posited for that column, along with the sorted list of evaluated cell indices. '''
+	repsByValue = dict()
+	weights = Counter() # Number of evaluated rows per representative cell
+	dups = list()
+	evaluated = list()
+	keys = matcher_keys(vms) if perfMetrics.enabled else {}
+	positions = { id(vm): i for (i, vm) in enumerate(vms) }
+	vms = list([vm for vm in vms if not isinstance(vm, SubtypeMatcher) and not isinstance(vm, CompositeMatcher)])
+	for batch in sampler.batches(len(cells)):
+		reps = list()
+		for i in batch:
+			c = cells[i]
+			k = c.value if dedup else i
+			if k in repsByValue: dups.append((c, repsByValue[k]))
+			else:
+				repsByValue[k] = c
+				reps.append(c)
+			weights[repsByValue[k].row] += 1
+		evaluated.extend(batch)
+		scanners = ColumnScanners(vms, reps, vectorize)
+		column = ColumnValues(reps) if vectorize else None
+		diversities = { id(vm): len(vm.diversion) for vm in vms }
+		for vm in vms:
+			scanners.prepare(vm)
+			run_value_matcher(vm, reps, column, keys.get(id(vm)))
+		scanners.release()
+		posited = set([vm.t for vm in vms if len(vm.diversion) > 0 and len(vm.diversion) >= vm.diversity()])
+		growing = set([vm.t for vm in vms if len(vm.diversion) > diversities[id(vm)]]) - posited
+		hits = Counter()
+		pending = Counter()
+		for c in repsByValue.values():
+			for t in c.store.matched_types(c.row):
+				if t in posited: hits[t] += weights[c.row]
+				elif t in growing: pending[t] += weights[c.row]
+		if sampler.is_settled(hits, pending, len(evaluated)): break
+	logging.info('Sampled %s values: evaluated %d rows out of %d (%d distinct)', fieldName, len(evaluated), len(cells), len(repsByValue))
+	evaluatedReps = list(repsByValue.values())
+	posited = set()
+	for vm in vms:
+		if diversions is not None: record_diversion(vm, positions[id(vm)], diversions)
+		if vm.check_diversity(evaluatedReps): posited.add(vm.t)
+	for (c, rep) in dups: c.share_inferences(rep)
+	return (posited, sorted(evaluated))
+
+def complete_field_values(fieldName, f, vms, dedup = True, vectorize = False):
+	''' Runs value matchers on the cells left out by sample_field_values, and posits on them the types that were
+		posited on the evaluated cells. '''
+	if f.evaluated is None: return
+	repsByValue = dict()
+	if dedup:
+		for c in f.evaluated: repsByValue.setdefault(c.value, c)
+	evaluated = set([id(c) for c in f.evaluated])
+	(reps, dups) = (list(), list())
+	for c in f.cells:
+		if id(c) in evaluated: continue
+		if dedup and c.value in repsByValue: dups.append((c, repsByValue[c.value]))
+		else:
+			if dedup: repsByValue[c.value] = c
+			reps.append(c)
+	logging.info('Completing %s values: %d remaining rows (%d distinct)', fieldName, len(reps) + len(dups), len(reps))
+	replay_field_values(reps, dups, vms, f.posited, vectorize = vectorize)
+	f.evaluated = None
+	(f.aggregates, f.reps) = (None, None)
+
+def replay_field_values(reps, dups, vms, posited, vectorize = False, diversions = None):
+	''' Runs value matchers on representative cells and shares their inferences with duplicate cells (as in
+		match_field_values), but posits a given set of types instead of checking the diversity of matches.
+
+		This is used to process cells that were not available when the column type was inferred. Returns the types
+		not in the given set whose matches are diverse enough that they would have been posited, the diversity check
+		resuming from the given diversions (which are updated as in extend_field_values) if any. '''
+	unseen = set()
+	scanners = ColumnScanners(vms, reps, vectorize)
+	column = ColumnValues(reps) if vectorize else None
+	keys = matcher_keys(vms) if perfMetrics.enabled else {}
+	for (i, vm) in enumerate(vms):
+		if isinstance(vm, SubtypeMatcher) or isinstance(vm, CompositeMatcher): continue
+		scanners.prepare(vm)
+		run_value_matcher(vm, reps, column, keys.get(id(vm)))
+		if vm.t not in posited:
+			if diversions is not None:
+				vm.diversion |= diversions.get(i, set())
+				record_diversion(vm, i, diversions)
+			if len(vm.diversion) > 0 and len(vm.diversion) >= vm.diversity(): unseen.add(vm.t)
+		vm.diversion.clear()
+	scanners.release()
+	for c in reps:
+		for t in posited: c.posit_type(t)
+	for (c, rep) in dups: c.share_inferences(rep)
+	return unseen
+
+def extend_field_values(fieldName, f, values, vms, dedup = True, vectorize = False):
+	''' Appends cells holding the given values to a field and runs value matchers on them (once per value not seen
+		in the column yet if dedup is True), resuming the diversity check of the matchers whose type was not posited
+		from the field's diversions, so that such a type is posited on the whole column as soon as the appended values
+		make up for the missing diversity. The field's type aggregates are then updated with the appended cells.
+
+		Returns the set of types newly posited on the column. '''
+	if dedup and f.reps is None:
+		f.reps = dict()
+		for c in f.cells if f.evaluated is None else f.evaluated: f.reps.setdefault(c.value, c)
+	cells = f.extend(values, fieldName)
+	(reps, dups) = (list(), list())
+	for c in cells:
+		rep = f.reps.get(c.value) if dedup else None
+		if rep is not None: dups.append((c, rep))
+		else:
+			if dedup: f.reps[c.value] = c
+			reps.append(c)
+	logging.info('Appending %s values: %d rows (%d not seen yet)', fieldName, len(cells), len(reps))
+	scanners = ColumnScanners(vms, reps, vectorize)
+	column = ColumnValues(reps) if vectorize else None
+	keys = matcher_keys(vms) if perfMetrics.enabled else {}
+	posited = set()
+	for (i, vm) in enumerate(vms):
+		if isinstance(vm, SubtypeMatcher) or isinstance(vm, CompositeMatcher): continue
+		scanners.prepare(vm)
+		run_value_matcher(vm, reps, column, keys.get(id(vm)))
+		if vm.t in f.store.posited:
+			vm.diversion.clear()
+			continue
+		vm.diversion |= f.diversions.get(i, set())
+		record_diversion(vm, i, f.diversions)
+		if vm.check_diversity(reps): posited.add(vm.t)
+	scanners.release()
+	for (c, rep) in dups: c.share_inferences(rep)
+	f.posited |= posited
+	f.aggregates.add(cells)
+	return posited
+
+def match_column_unit(unit):
+	''' Worker-side evaluation of a (column, matcher set) unit.
+
+		Returns the field's MatchStore along with the store row of each cell, the posited types, the
+		evaluated cell indices (None if all cells were evaluated), the diversions of the matchers whose type was not
+		posited and the timing and deduplication info accrued in the worker, so that the caller can merge them back into its own
+		Fields instance (as well as the stats measured and decisions made by the scheduler, and the performance
+		metrics, if any). '''
+	(fieldName, values, dedup, sampler, vectorize, scheduler, metricsEnabled) = unit
+	if scheduler is not None: (scheduler.observed, scheduler.decisions) = (dict(), list())
+	metrics = enable_metrics(metricsEnabled)
+	infoBefore = [Counter(timingInfo), Counter(countInfo), Counter(dedupInfo), Counter(dateFormatInfo)]
+	cells = Field(values, fieldName).cells
+	diversions = dict()
+	if sampler is None:
+		(posited, evaluated) = (match_field_values(fieldName, cells, value_matchers(), dedup = dedup, vectorize = vectorize,
+			scheduler = scheduler, diversions = diversions), None)
+	else:
+		(posited, evaluated) = sample_field_values(fieldName, cells, value_matchers(), sampler, dedup = dedup, vectorize = vectorize,
+			diversions = diversions)
+	if metricsEnabled: metrics.collect_caches()
+	return ((cells[0].store if len(cells) > 0 else None, array('i', [c.row for c in cells])), posited, evaluated, diversions,
+		[Counter(info) - before for (info, before) in zip([timingInfo, countInfo, dedupInfo, dateFormatInfo], infoBefore)],
+		(scheduler.observed, scheduler.decisions) if scheduler is not None else None, metrics if metricsEnabled else None)
 
 class Fields(object):
-	def __init__(self, fields, entries):
+	def __init__(self, fields, entries, vectorize = False):
 		self.fields = fields # Mapping from header Cell object to value Field object
 		self.entries = entries
+		self.vectorize = vectorize # Whether vectorized matchers are run on pandas Series of the column values
 		self.modifiedByColumn = { }
 		self.outputFieldsByColumn = { }
+		self.evaluatedRows = { } # Number of rows on which value matchers have been run, per column
+		self.types = None # Types returned by the last call to infer_types or append_values
 	@timed
-	def match_headers_and_values(self):
+	def match_headers_and_values(self, workers = 1, dedup = True, sampler = None, scheduler = None):
+		''' Parameters:
+			workers if greater than 1, then value matchers are run in a pool of that many worker processes,
+				one column at a time per worker (the results are identical to the serial execution)
+			dedup if True, then value matchers are run once per distinct value in each column
+			sampler if not None, a ProgressiveSampler used to evaluate only as many rows per column as needed
+			scheduler if not None, a MatcherScheduler used to order the value matchers and skip the expensive ones
+				on the columns whose type is decided (not applied when sampling) '''
 		logging.info('RUNNING all header matchers')
-		for hm in header_matchers():
-			for hc in self.fields.keys():
-				logging.debug('RUNNING %s on %s header', hm, hc.value)
-				hm.match(hc)
+		with perfMetrics.stage('header_match'):
+			for hm in header_matchers():
+				for hc in self.fields.keys():
+					logging.debug('RUNNING %s on %s header', hm, hc.value)
+					hm.match(hc)
+				hm.diversion.clear()
 		logging.info('RUNNING all value matchers')
-		for vm in value_matchers():
-			if isinstance(vm, SubtypeMatcher): continue
-			if isinstance(vm, CompositeMatcher): continue
+		with perfMetrics.stage('value_match'):
+			self.match_values(workers = workers, dedup = dedup, sampler = sampler, scheduler = scheduler)
+	def match_values(self, workers = 1, dedup = True, sampler = None, scheduler = None):
+		''' Runs value matchers on all columns (see match_headers_and_values for the parameters). '''
+		self.evaluatedRows.clear()
+		dedupInfo.clear() # The deduplication stats logged below cover this pass only
+		vms = value_matchers()
+		workers = min(workers, len(self.fields))
+		if sampler is not None and scheduler is not None:
+			logging.warning('Matcher scheduling is not applied when sampling')
+			scheduler = None
+		for f in self.fields.values(): (f.diversions, f.aggregates, f.reps) = (dict(), None, None)
+		if workers <= 1:
 			for (hc, f) in self.fields.items():
-				logging.debug('RUNNING %s on %s values', vm, hc.value)
-				for vc in f.cells:
-					vm.match(vc)
-				vm.check_diversity(f.cells)
+				if sampler is None:
+					f.posited = match_field_values(hc.value, f.cells, vms, dedup = dedup, vectorize = self.vectorize,
+						scheduler = scheduler, diversions = f.diversions)
+				else:
+					(f.posited, evaluated) = sample_field_values(hc.value, f.cells, vms, sampler, dedup = dedup, vectorize = self.vectorize,
+						diversions = f.diversions)
+					f.evaluated = list([f.cells[i] for i in evaluated])
+				self.evaluatedRows[hc.value] = len(f.cells) if f.evaluated is None else len(f.evaluated)
+			log_dedup_stats()
+			return
+		logging.info('Dispatching %d columns to %d workers', len(self.fields), workers)
+		items = list(self.fields.items())
+		units = [(hc.value, [c.value for c in f.cells], dedup, sampler, self.vectorize, scheduler, perfMetrics.enabled) for (hc, f) in items]
+		with multiprocessing.Pool(workers) as pool:
+			for ((hc, f), ((store, rows), posited, evaluated, diversions, infoDeltas, scheduled, metrics)) in zip(items, pool.imap(match_column_unit, units)):
+				if store is not None: f.store = store
+				for (c, row) in zip(f.cells, rows):
+					c.store, c.row = store, row
+				logging.info('Posited types for %s values: %s', hc.value, ', '.join(posited))
+				f.posited = posited
+				f.diversions = diversions
+				if evaluated is not None: f.evaluated = list([f.cells[i] for i in evaluated])
+				self.evaluatedRows[hc.value] = len(f.cells) if f.evaluated is None else len(f.evaluated)
+				for (info, delta) in zip([timingInfo, countInfo, dedupInfo, dateFormatInfo], infoDeltas): info.update(delta)
+				if scheduled is not None: scheduler.merge(*scheduled)
+				if metrics is not None: perfMetrics.merge(metrics)
+		log_dedup_stats()
+	def complete_matching(self, types, dedup = True):
+		''' Runs value matchers on the rows left out by sampling, for those columns whose type has been inferred
+			(as required prior to normalizing their values). '''
+		vms = None
+		for (h, f) in self.fields.items():
+			if f.evaluated is None or h.value not in types: continue
+			if vms is None: vms = value_matchers()
+			with perfMetrics.stage('value_match'):
+				complete_field_values(h.value, f, vms, dedup = dedup, vectorize = self.vectorize)
 	def likeliest_types(self, h, f, singleType = False):
 		''' Returns None rather than an empty list to signify that not a single type has been inferred.
 
@@ -842,86 +1977,96 @@ class Fields(object):
 		if lvts is None:
 			logging.info('Could not infer type for %s values: %s', h.value, ', '.join(lvt))
 		return lvts
-	def process_values(self, outputFormat, singleType = False):
+	def process_values(self, outputFormat, singleType = False, out = None):
 		''' Parameters:
-			outputFormat either "md" for markdown output, or a separator string for CSV output '''
+			outputFormat "md" for markdown output, a separator string for CSV output, or one of the COLUMNAR_FORMATS
+			out the output file path or text stream (defaults to sys.stdout, see write_normalized_values) '''
 		self.match_headers_and_values()
-		ofs = list()
-		fts = dict()
+		types = dict()
 		for (h, f) in self.fields.items():
 			lvts = self.likeliest_types(h, f, singleType = True)
-			if lvts is None: continue
-			fts[h] = lvts
-			hofs = uniq(list(itertools.chain.from_iterable([f.normalized_fields(h, lvt) for lvt in lvts])))
-			logging.info('Output fields for %s: %s', h, hofs)
-			ofs.extend(hofs)
-		logging.info('Output fields for all: %s', ofs)
-		# Compute new cell values
-		b = list()
-		for i in range(self.entries):
-			l = list()
-			for j in range(len(ofs)): l.append(None)
-			b.append(l)
-		for (h, lvts) in fts.items():
-			for lvt in lvts:
-				for i, nc in enumerate(f.normalized_values(h, lvt)):
-					for (j, of) in enumerate(ofs):
-						if of not in nc: continue
-						ncs = nc[of] if isinstance(nc[of], list) else [nc[of]]
-						b[i][j] = ncs if b[i][j] is None else b[i][j] + ncs
-		if outputFormat == 'md':
+			if lvts is not None: types[h.value] = lvts[0]
+		out = sys.stdout if out is None else out
+		if outputFormat == 'md' and not isinstance(out, str):
 			# Print timing info
-			print('## Temps de traitement')
-			print('')
-			print('|Classe et méthode|Temps total (ms)|')
-			print('|-|-|')
+			print('## Temps de traitement', file = out)
+			print('', file = out)
+			print('|Classe et méthode|Temps total (ms)|', file = out)
+			print('|-|-|', file = out)
 			if len(timingInfo) > 0:
 				for k, v in timingInfo.most_common(20):
-					print('|{}|{}|'.format(k, str(v)))
-			# Print headers
-			print('## Résultats de normalisation')
-			print('')
-			print('|{}|'.format('|'.join(ofs)))
-			print('|{}|'.format('|'.join('-' * len(ofs))))
-		else:
-			print(outputFormat.join(ofs))
-		for i in range(self.entries):
-			ovs = list([flatten_list(b[i][j]) for j in range(len(ofs))])
-			if outputFormat == 'md':
-				print('|{}|'.format('|'.join(ovs)))
-			else:
-				print(outputFormat.join(ovs))
+					print('|{}|{}|'.format(k, str(v)), file = out)
+			print('## Résultats de normalisation', file = out)
+			print('', file = out)
+		ofs = write_normalized_values(self.normalize_values(types), self.entries, out, outputFormat)
+		logging.info('Output fields for all: %s', ofs)
 	# The following two methods do the same thing as the previous one, but with redundant operations
 	# (splitting them is required in order to provide separate API calls prior to deduping)
 	@timed
-	def infer_types(self):
+	def infer_types(self, workers = 1, dedup = True, sampler = None, scheduler = None):
 		''' Returns a dictionary mapping input field name to likeliest type.
-			Fields for which no type has been inferred will be missing from the output dictionary.'''
-		self.match_headers_and_values()
-		types = dict()
-		f2t = defaultdict(list)
-		t2f = defaultdict(list)
-		for (h, f) in self.fields.items():
-			fieldName = h.value
-			lht = h.likeliest_type()
-			logging.info('Likeliest type for %s header: %s', fieldName, lht)
-			if lht is not None: types[fieldName] = lht
-			for (t, s) in f.scored_types().items():
-				if s < COLUMN_SCORE_THRESHOLD: continue
-				f2t[fieldName].append((t, s))
-				t2f[t].append((fieldName, s))
-		for (h, f) in self.fields.items():
-			fieldName = h.value
-			ts = sorted(f2t[fieldName], key = itemgetter(1), reverse = True)
-			logging.info('Sorted types for {}: {}'. format(fieldName, '; '.join(['{} ({}) '.format(t, s) for (t, s) in ts])))
-			for (t, s) in ts:
-				betterField = any((p[1] > s and p[0] not in types) for p in t2f[t])
-				betterChild = t in PARENT_CHILD_RELS and any((p[1] * PARENT_CHILD_RATIO > s and p[0] in PARENT_CHILD_RELS[t]) for p in ts)
-				if not (betterField or betterChild):
-					logging.info('Likeliest type for %s values: %s', fieldName, t)
-					types[fieldName] = t
-					break
-			if fieldName not in types: logging.info('Could not infer type for %s values', fieldName)
+			Fields for which no type has been inferred will be missing from the output dictionary.
+
+			Parameters:
+			workers the number of worker processes used to run value matchers (1 for serial execution)
+			dedup if True, then value matchers are run once per distinct value in each column
+			sampler if not None, a ProgressiveSampler used to infer types from a subset of the rows
+				(call complete_matching before normalizing values)
+			scheduler if not None, a MatcherScheduler used to order and skip value matchers '''
+		self.match_headers_and_values(workers = workers, dedup = dedup, sampler = sampler, scheduler = scheduler)
+		self.types = self.roll_up_types()
+		return self.types
+	@timed
+	def append_values(self, columns, dedup = True):
+		''' Appends rows to the fields, given as a dictionary { field name: list of values } (missing values being
+			empty), runs value matchers on the appended rows only and updates the type scores of each column
+			incrementally (see TypeAggregates), before rolling them up again into column types.
+
+			Returns the types inferred after the append (as infer_types does) along with the set of field names whose
+			type changed: if it is empty, then only the appended rows need normalizing (see normalize_values_in_place). '''
+		entries = max([len(vs) for vs in columns.values()], default = 0)
+		vms = value_matchers()
+		with perfMetrics.stage('value_match'):
+			for (h, f) in self.fields.items():
+				values = list(columns.get(h.value, []))
+				values.extend([''] * (entries - len(values)))
+				posited = extend_field_values(h.value, f, values, vms, dedup = dedup, vectorize = self.vectorize)
+				if len(posited) > 0: logging.info('Posited types for %s values after append: %s', h.value, ', '.join(posited))
+				self.evaluatedRows[h.value] = len(f.cells) if f.evaluated is None else len(f.evaluated)
+		self.entries += entries
+		previous = self.types if self.types is not None else dict()
+		self.types = self.roll_up_types()
+		changed = set([fieldName for fieldName in set(previous) | set(self.types) if previous.get(fieldName) != self.types.get(fieldName)])
+		if len(changed) > 0: logging.info('Types changed after appending %d rows: %s', entries, ', '.join(sorted(changed)))
+		return (self.types, changed)
+	def roll_up_types(self):
+		''' Rolls up the header types and the value type scores of all fields into a dictionary mapping input field name
+			to likeliest type (see infer_types). '''
+		with perfMetrics.stage('roll_up'):
+			types = dict()
+			f2t = defaultdict(list)
+			t2f = defaultdict(list)
+			for (h, f) in self.fields.items():
+				fieldName = h.value
+				lht = h.likeliest_type()
+				logging.info('Likeliest type for %s header: %s', fieldName, lht)
+				if lht is not None: types[fieldName] = lht
+				for (t, s) in f.scored_types().items():
+					if s < COLUMN_SCORE_THRESHOLD: continue
+					f2t[fieldName].append((t, s))
+					t2f[t].append((fieldName, s))
+			for (h, f) in self.fields.items():
+				fieldName = h.value
+				ts = sorted(f2t[fieldName], key = itemgetter(1), reverse = True)
+				logging.info('Sorted types for {}: {}'. format(fieldName, '; '.join(['{} ({}) '.format(t, s) for (t, s) in ts])))
+				for (t, s) in ts:
+					betterField = any((p[1] > s and p[0] not in types) for p in t2f[t])
+					betterChild = t in PARENT_CHILD_RELS and any((p[1] * PARENT_CHILD_RATIO > s and p[0] in PARENT_CHILD_RELS[t]) for p in ts)
+					if not (betterField or betterChild):
+						logging.info('Likeliest type for %s values: %s', fieldName, t)
+						types[fieldName] = t
+						break
+				if fieldName not in types: logging.info('Could not infer type for %s values', fieldName)
 		return types
 	@timed
 	def normalize_values(self, types):
@@ -936,36 +2081,42 @@ class Fields(object):
 				continue
 			logging.info('Normalizing values for {}'.format(fieldName))
 			lvt = types[fieldName]
-			ofs = uniq(list(f.normalized_fields(h, lvt)))
-			logging.info('Output fields for %s: %s', fieldName, ofs)
-			nvs = list(f.normalized_values(h, lvt))
+			with perfMetrics.stage('normalize'):
+				# The original field comes first, followed by the normalized fields in name order
+				ofs = sorted(f.normalized_fields(h, lvt), key = lambda of: (of != fieldName, of))
+				logging.info('Output fields for %s: %s', fieldName, ofs)
+				nvs = list(f.normalized_values(h, lvt))
 			for of in ofs:
-				b = [None] * self.entries
-				for i, nc in enumerate(nvs):
-					if of not in nc or nc[of] is None: continue
-					if b[i] is None:
-						b[i] = nc[of]
-					else:
-						if isinstance(b[i], list):
-							if isinstance(nc[of], list): 
-								b[i].extend(nc[of])
-							else: 
-								b[i].append(nc[of])
+				with perfMetrics.stage('normalize'):
+					b = [None] * self.entries
+					for i, nc in enumerate(nvs):
+						if of not in nc or nc[of] is None: continue
+						if b[i] is None:
+							b[i] = nc[of]
 						else:
-							if isinstance(nc[of], list): 
-								b[i] = [b[i]] + nc[of]
-							else: 
-								b[i] = [b[i], nc[of]]
-					oldValue = fold_for_changes(f.cells[i].value)
-					newValues = list([fold_for_changes(s) for s in (nc[of] if isinstance(nc[of], list) else [nc[of]])])
-					isNewValue = len(newValues) > 0 and oldValue not in newValues
-					if isNewValue: 
-						self.modifiedByColumn[fieldName][i] += 1
+							if isinstance(b[i], list):
+								if isinstance(nc[of], list): 
+									b[i].extend(nc[of])
+								else: 
+									b[i].append(nc[of])
+							else:
+								if isinstance(nc[of], list): 
+									b[i] = [b[i]] + nc[of]
+								else: 
+									b[i] = [b[i], nc[of]]
+						oldValue = fold_for_changes(f.cells[i].value)
+						newValues = list([fold_for_changes(s) for s in (nc[of] if isinstance(nc[of], list) else [nc[of]])])
+						isNewValue = len(newValues) > 0 and oldValue not in newValues
+						if isNewValue: 
+							self.modifiedByColumn[fieldName][i] += 1
 				yield (of, b)
 			self.outputFieldsByColumn[fieldName] = ofs
-	def normalize_values_in_place(self, types):
+	def normalize_values_in_place(self, types, start = 0):
 		''' Generates (original field name, modified field values) pairs for each output field and each cell that is 
-		 actually modified (even just changing a single character's case). '''
+		 actually modified (even just changing a single character's case).
+
+		 Parameters:
+		 start the index of the first row to normalize (e.g. that of the first appended row, see append_values) '''
 		for (h, f) in self.fields.items():
 			fieldName = h.value
 			if fieldName not in types:
@@ -974,30 +2125,56 @@ class Fields(object):
 			logging.info('Normalizing values for {}'.format(fieldName))
 			lvt = types[fieldName]
 			assert self.entries == len(f.cells)
-			newCol = [''] * self.entries
-			for i, c in enumerate(f.cells):
-				nvs = list(c.normalized_values_in_place(lvt))
-				newCol[i] = ', '.join(nvs)
+			with perfMetrics.stage('normalize'):
+				newCol = [''] * (self.entries - start)
+				memo = dict() # Cells holding the same value share their inference state
+				for i, c in enumerate(itertools.islice(f.cells, start, None)):
+					k = c.state_key()
+					if k not in memo: memo[k] = ', '.join(c.normalized_values_in_place(lvt))
+					newCol[i] = memo[k]
 			yield (fieldName, newCol)
 
 @lru_cache(maxsize = 1048576, typed = False)
 def cached_normalized_values(c, t): return c.normalized_values(t)
 
 class Field(object):
-	def __init__(self, cells):
+	def __init__(self, values, fieldName):
+		# Inferences made on the field's cells
+		self.store = MatchStore(len(values))
 		# List of Cell objects
-		self.cells = cells
+		self.cells = [Cell(v, fieldName, self.store, i) for (i, v) in enumerate(values)]
+		# Cells on which value matchers have been run when sampling (None if all of them)
+		self.evaluated = None
+		# Types posited on the column (or on the evaluated cells when sampling)
+		self.posited = set()
+		# Distinct hits of the matchers whose type was not posited, by matcher index (see record_diversion)
+		self.diversions = dict()
+		# Running type scores maintained once rows have been appended (None until then)
+		self.aggregates = None
+		# Representative cell of each value, maintained once rows have been appended when deduplicating
+		self.reps = None
+	def extend(self, values, fieldName):
+		''' Appends cells holding the given values on new rows of the store and returns them (the type aggregates
+			being initialized beforehand from the existing cells). '''
+		if self.aggregates is None:
+			self.aggregates = TypeAggregates()
+			self.aggregates.add(self.cells if self.evaluated is None else self.evaluated)
+		row = self.store.extend(len(values))
+		cells = [Cell(v, fieldName, self.store, row + i) for (i, v) in enumerate(values)]
+		self.cells.extend(cells)
+		if self.evaluated is not None: self.evaluated.extend(cells)
+		return cells
 	def scored_types(self):
-		candidateTypes = reduce(set.union, [set(c.tis.keys()) for c in self.cells])
-		# Map from type to a list of individual scores
-		typeScores = { t: [0] * len(self.cells) for t in candidateTypes }
-		for (i, c) in enumerate(self.cells):
-			nets = c.non_excluded_types()
-			for (t, tis) in c.tis.items():
-				if t not in nets: continue
-				s = max(ti.ms for ti in tis)
-				if s > 0: typeScores[t][i] = s
-		return { t: non_zero_ratio_score(scores) for (t, scores) in typeScores.items() }
+		cells = self.cells if self.evaluated is None else self.evaluated
+		if len(cells) < 1: return dict()
+		if self.aggregates is not None: return self.aggregates.scores(self.store.posited)
+		# Number of cells sharing each inference state
+		weights = Counter([c.state_key() for c in cells])
+		scores = { t: 0 for t in self.store.all_inferred_types() }
+		for (t, rows) in self.store.scored_rows().items():
+			r = 100. * sum(weights[(id(self.store), row)] for row in rows) / len(cells)
+			scores[t] = r if r >= COLUMN_SCORE_MIN_RATIO else 0
+		return scores
 	def likeliest_types(self):
 		matchingTypes = self.scored_types()
 		return sorted(matchingTypes.keys(), key = lambda t: matchingTypes[t], reverse = True) if len(matchingTypes) > 0 else []
@@ -1007,22 +2184,57 @@ class Field(object):
 			for (i, lt) in enumerate(lts):
 				if lt not in PARENT_CHILD_RELS or len(PARENT_CHILD_RELS[lt] & set(lts[i + 1:])) < 1: return lt
 		return None
+	def distinct_normalized_values(self, t):
+		''' Generates (cell, normalized values) pairs, computing normalized values only once for cells that share
+			their inference state (see Cell.share_inferences). '''
+		memo = dict()
+		for c in self.cells:
+			k = c.state_key()
+			if k not in memo: memo[k] = c.normalized_values(t)
+			yield (c, memo[k])
 	def normalized_fields(self, h, t):
 		# return reduce(set.union, [set(cached_normalized_values(c, t).keys()) for c in self.cells], set([h.value]))
-		return reduce(set.union, [set(c.normalized_values(t).keys()) for c in self.cells], set([h.value]))
+		return reduce(set.union, [set(nvs.keys()) for (c, nvs) in self.distinct_normalized_values(t)], set([h.value]))
 	def normalized_values(self, h, t):
 		''' Casts this field with header h into type t and returns its values as a list of augmented
 			(field name, field value) dictionaries (not including the original field with its header). '''
-		for c in self.cells:
+		for (c, nvs) in self.distinct_normalized_values(t):
 			# Normalized/augmented fields
-			nc = c.normalized_values(t)
+			nc = dict(nvs)
 			# Original field value
 			nc[h.value] = c.value
 			yield nc
 
+class TypeAggregates(object):
+	''' Running counts from which the type scores of a field are computed, so that they can be updated as cells are
+		appended instead of scanning the whole MatchStore (see Field.scored_types). '''
+	def __init__(self):
+		self.cells = 0
+		self.matched = Counter() # Number of cells on which each type is matched with a positive score and not negated
+		self.inferred = set()
+	def add(self, cells):
+		memo = dict()
+		for c in cells:
+			k = c.state_key()
+			if k not in memo:
+				memo[k] = c.store.matched_types(c.row)
+				self.inferred |= c.store.inferred_types(c.row)
+			self.matched.update(memo[k])
+		self.cells += len(cells)
+	def scores(self, posited):
+		scores = { t: 0 for t in self.inferred }
+		if self.cells < 1: return scores
+		for (t, n) in self.matched.items():
+			if t not in posited: continue
+			r = 100. * n / self.cells
+			scores[t] = r if r >= COLUMN_SCORE_MIN_RATIO else 0
+		return scores
+
 PARTIAL_MATCH = 0
 FULL_MATCH = 1
+NEGATION = -1 # Only used within a MatchStore
 class TypeInference(object):
+	__slots__ = ('t', 'mm', 'ms', 'hit', 'span')
 	def __init__(self, t, mm, ms, hit, i1, i2):
 		self.t = t
 		self.mm = mm # Match mode (partial or full, as an integer enum)
@@ -1032,6 +2244,111 @@ class TypeInference(object):
 	def __repr__(self): return 'TI<{}>: {} <-- {}'.format(self.t, self.ms, self.hit)
 	def __str__(self): return '<{}>'.format(self.t)
 
+class MatchStore(object):
+	''' Columnar storage of the type inferences of a Field's cells.
+
+		Each inference (or type negation) is an entry spread over parallel arrays: row, type, output type (i.e. the
+		normalized field name), match mode, score, hit and span, where types and hits are interned in a symbol table.
+		Entries of the same row are chained together, and posited types are shared by all rows of the column. '''
+	def __init__(self, size):
+		self.heads = array('i', [-1]) * size # Last entry of each row
+		self.nexts = array('i') # Previous entry of the same row
+		self.rows = array('i')
+		self.types = array('i')
+		self.outTypes = array('i')
+		self.modes = array('b')
+		self.scores = array('d')
+		self.hits = array('i')
+		self.starts = array('i')
+		self.ends = array('i')
+		self.symbols = list()
+		self.symbolIds = dict()
+		self.posited = set()
+	def __len__(self): return len(self.rows)
+	def extend(self, size):
+		''' Adds rows to the store and returns the index of the first one. '''
+		row = len(self.heads)
+		self.heads.extend(array('i', [-1]) * size)
+		return row
+	def intern(self, v):
+		k = (list, tuple(v)) if isinstance(v, list) else (type(v), v)
+		i = self.symbolIds.get(k)
+		if i is None:
+			i = len(self.symbols)
+			self.symbolIds[k] = i
+			self.symbols.append(v)
+		return i
+	def add(self, row, t, outType, mode, ms, hit, i1, i2):
+		self.nexts.append(self.heads[row])
+		self.heads[row] = len(self.rows)
+		self.rows.append(row)
+		self.types.append(self.intern(t))
+		self.outTypes.append(self.intern(outType))
+		self.modes.append(mode)
+		self.scores.append(ms)
+		self.hits.append(self.intern(hit))
+		self.starts.append(i1)
+		self.ends.append(i2)
+	def add_many(self, rows, t, outType, mode, ms, hits, starts, ends):
+		''' Adds entries with the same type, output type, mode and score to several distinct rows at once. '''
+		n = len(self.rows)
+		for (k, row) in enumerate(rows):
+			self.nexts.append(self.heads[row])
+			self.heads[row] = n + k
+		self.rows.extend(rows)
+		self.types.extend(array('i', [self.intern(t)]) * len(rows))
+		self.outTypes.extend(array('i', [self.intern(outType)]) * len(rows))
+		self.modes.extend(array('b', [mode]) * len(rows))
+		self.scores.extend(array('d', [ms]) * len(rows))
+		self.hits.extend([self.intern(hit) for hit in hits])
+		self.starts.extend(starts)
+		self.ends.extend(ends)
+	def entries(self, row):
+		''' Returns the indices of a row's entries, in insertion order. '''
+		es = list()
+		e = self.heads[row]
+		while e >= 0:
+			es.append(e)
+			e = self.nexts[e]
+		es.reverse()
+		return es
+	def inference(self, e):
+		return TypeInference(self.symbols[self.outTypes[e]], self.modes[e], self.scores[e], self.symbols[self.hits[e]],
+			self.starts[e], self.ends[e])
+	def negated_types(self, row):
+		return set([self.symbols[self.types[e]] for e in self.entries(row) if self.modes[e] == NEGATION])
+	def matched_types(self, row):
+		''' Returns the types matched with a positive score on this row and not negated. '''
+		es = self.entries(row)
+		nts = set([self.types[e] for e in es if self.modes[e] == NEGATION])
+		return set([self.symbols[self.types[e]] for e in es if self.modes[e] != NEGATION and self.scores[e] > 0 and self.types[e] not in nts])
+	def inferred_types(self, row):
+		return set([self.symbols[self.types[e]] for e in self.entries(row) if self.modes[e] != NEGATION])
+	def type_inferences(self, row, t):
+		return [self.inference(e) for e in self.entries(row) if self.modes[e] != NEGATION and self.symbols[self.types[e]] == t]
+	def type_scores(self, row):
+		''' Returns a dictionary { type: max score } for the types inferred on this row (regardless of negations). '''
+		scores = dict()
+		for e in self.entries(row):
+			if self.modes[e] == NEGATION: continue
+			t = self.symbols[self.types[e]]
+			scores[t] = max(scores.get(t, self.scores[e]), self.scores[e])
+		return scores
+	def all_inferred_types(self):
+		return set([self.symbols[ti] for ti in set(self.types[e] for e in range(len(self.rows)) if self.modes[e] != NEGATION)])
+	def scored_rows(self):
+		''' Returns a dictionary { type: set of rows } on which each posited type has a positive score and is not negated,
+			computed by scanning entries column-wise. '''
+		negated = set([(self.rows[e], self.types[e]) for e in range(len(self.rows)) if self.modes[e] == NEGATION])
+		posited = set([self.symbolIds[(type(t), t)] for t in self.posited if (type(t), t) in self.symbolIds])
+		typeRows = defaultdict(set)
+		for e in range(len(self.rows)):
+			ti = self.types[e]
+			if self.modes[e] == NEGATION or ti not in posited or self.scores[e] <= 0: continue
+			if (self.rows[e], ti) in negated: continue
+			typeRows[self.symbols[ti]].add(self.rows[e])
+		return typeRows
+
 def cmp_hits(h1, h2):
 	if h1.span and h2.span:
 		c = h1.span[0] - h2.span[0] # Match beginning first
@@ -1045,35 +2362,38 @@ def checkSpan(hit, span):
 		logging.warning('Invalid span for hit=%s: %s', hit, span)
 
 class Cell(object):
-	def __init__(self, value, fieldName):
+	''' A view over the row of a MatchStore holding the inferences made on a given value (standalone cells, e.g. header
+		cells, get a single-row store of their own). '''
+	__slots__ = ('value', 'f', 'store', 'row')
+	def __init__(self, value, fieldName, store = None, row = 0):
 		# Original value, of type string
 		self.value = value
-		if self.value is np.nan:
+		if isinstance(self.value, float) and math.isnan(self.value):
 			logging.warning('Converting nan value to ""')
 			self.value = ''
 		self.f = fieldName
-		# Map from type to a list of TypeInferences
-		self.tis = defaultdict(list)
-		# Negated types
-		self.nts = set()
-		# Posited (i.e. sufficiently diversified) types
-		self.pts = set()
-		# Mapping from normalized, augmented, or otherwise enriched field name to list of values for that field
-		self.values = dict()
+		self.store = MatchStore(1) if store is None else store
+		self.row = row
 	def __str__(self): return '{}: {}'.format(self.f, self.value)
+	def share_inferences(self, c):
+		''' Makes this cell share the inference state of another cell holding the same value. '''
+		self.store, self.row = c.store, c.row
+	def state_key(self):
+		''' Returns a key that is the same for all cells sharing their inference state. '''
+		return (id(self.store), self.row)
 	def negate_type(self, t):
 		logging.debug('Negated type {} for "{}"'.format(t, self.value))
-		self.nts.add(t)
+		self.store.add(self.row, t, t, NEGATION, 0, None, -1, -1)
 	def posit_type(self, t):
 		''' Does the opposite of negating this type: more precisely, it indicates that there is enough diversity
 			across the entire value set, so that *if* any matcher for the type has enough recall, the field-wide
-			match will be accepted. '''
+			match will be accepted (posited types are shared by all cells of the field). '''
 		logging.debug('Posited type {} for "{}"'.format(t, self.value))
-		self.pts.add(t)
+		self.store.posited.add(t)
 	def non_excluded_types(self):
-		return set(self.tis.keys()) & self.pts - self.nts
+		return self.store.inferred_types(self.row) & self.store.posited - self.store.negated_types(self.row)
 	def matches(self, t, mm):
-		return [] if t not in self.non_excluded_types() else filter(lambda ti: ti.mm == mm, self.tis[t])
+		return [] if t not in self.non_excluded_types() else [ti for ti in self.store.type_inferences(self.row, t) if ti.mm == mm]
 	def normalized_type(self, t, outputFieldPrefix):
 		return '++{}++'.format(self.f if outputFieldPrefix is None else outputFieldPrefix + '.' + self.f)
 	def register_full_match(self, t, outputFieldPrefix, ms, hit = None):
@@ -1083,14 +2403,14 @@ class Cell(object):
 		if ms <= 0: return
 		t0 = self.normalized_type(t, outputFieldPrefix)
 		logging.debug('FULL MATCH of type <%s> for %s (p=%d): %s', t, self, ms, self.value if hit is None else hit)
-		self.tis[t].append(TypeInference(t0, FULL_MATCH, ms, self.value if hit is None else hit, 0, len(self.value)))
+		self.store.add(self.row, t, t0, FULL_MATCH, ms, self.value if hit is None else hit, 0, len(self.value))
 	def register_partial_match(self, t, outputFieldPrefix, ms, hit, span):
 		# TODO accept span = None and fetch start/end indices on-the-fly
 		if ms <= 0: return
 		checkSpan(hit, span)
 		t0 = self.normalized_type(t, outputFieldPrefix)
 		logging.debug('PARTIAL MATCH of type <%s> for %s (p=%d): %s', t, self, ms, hit)
-		self.tis[t].append(TypeInference(t0, PARTIAL_MATCH, ms, hit, span[0] if span else -1, span[1] if span else -1))
+		self.store.add(self.row, t, t0, PARTIAL_MATCH, ms, hit, span[0] if span else -1, span[1] if span else -1)
 	def register_cover_match(self, t, ms, tis):
 		if any(ti.mm == FULL_MATCH for ti in tis):
 			self.register_full_match(t, False, ms)
@@ -1104,13 +2424,13 @@ class Cell(object):
 				k = stis[j].span[1]
 			self.register_partial_match(t, False, ms, hit, (stis[0].span[0], stis[-1].span[1]))
 	def likeliest_type(self):
-		if len(self.tis) < 1: return None
-		scores = { t: max([ti.ms for ti in tis]) for (t, tis) in self.tis.items() }
+		scores = self.store.type_scores(self.row)
+		if len(scores) < 1: return None
 		return sorted(scores.keys(), key = lambda t: scores[t], reverse = True)[0]
 	def normalized_values(self, t):
 		res = defaultdict(set)
-		if t in self.tis and t not in self.nts:
-			for ti in self.tis[t]:
+		if t not in self.store.negated_types(self.row):
+			for ti in self.store.type_inferences(self.row, t):
 				if isinstance(ti.hit, list): res[ti.t] |= set(ti.hit)
 				else: res[ti.t].add(str(ti.hit))
 		nvs = dict()
@@ -1123,8 +2443,8 @@ class Cell(object):
 	def normalized_values_in_place(self, t):
 		res = defaultdict(set)
 		s = set()
-		if t in self.tis and t not in self.nts:
-			for ti in self.tis[t]:
+		if t not in self.store.negated_types(self.row):
+			for ti in self.store.type_inferences(self.row, t):
 				if isinstance(ti.hit, list): res[ti.t] |= set(ti.hit)
 				else: res[ti.t].add(str(ti.hit))
 			for (k, v) in res.items():
@@ -1155,84 +2475,289 @@ def unique_cell_values(vs, maxListLength = 3):
 		em[merger_by_token_list(v)].add(v)
 	return list([select_best_value(vs) for vs in em.values()])[:maxListLength]
 
-# TODO improve this custom date matcher if necessary by doing a first pass on all values at type inference time:
-# - matcher 1 with languages = ['fr', 'en'],
-#     settings = { 'DATE_ORDER': 'MDY', 'PREFER_LANGUAGE_DATE_ORDER': False } (the more likely one)
-# - matcher 2 with languages = ['fr', 'en'],
-#    settings = { 'DATE_ORDER': 'DMY', 'PREFER_LANGUAGE_DATE_ORDER': False }
-# - then retain the majority matcher for the subsequent type inference pass (and the normalization step as well)
-DDP = DateDataParser(languages = ['fr', 'en'], settings = { 'PREFER_LANGUAGE_DATE_ORDER': True })
+@lazy_resource
+def date_data_parser():
+	from dateparser import DateDataParser
+	return DateDataParser(languages = ['fr', 'en'], settings = { 'PREFER_LANGUAGE_DATE_ORDER': True })
+
+MONTH_NAMES = {
+	'janvier': 1, 'janv': 1, 'january': 1, 'jan': 1,
+	'février': 2, 'fevrier': 2, 'févr': 2, 'fevr': 2, 'fév': 2, 'fev': 2, 'february': 2, 'feb': 2,
+	'mars': 3, 'march': 3, 'mar': 3,
+	'avril': 4, 'avr': 4, 'april': 4, 'apr': 4,
+	'mai': 5, 'may': 5,
+	'juin': 6, 'june': 6, 'jun': 6,
+	'juillet': 7, 'juil': 7, 'july': 7, 'jul': 7,
+	'août': 8, 'aout': 8, 'august': 8, 'aug': 8,
+	'septembre': 9, 'sept': 9, 'september': 9, 'sep': 9,
+	'octobre': 10, 'october': 10, 'oct': 10,
+	'novembre': 11, 'november': 11, 'nov': 11,
+	'décembre': 12, 'decembre': 12, 'déc': 12, 'dec': 12, 'december': 12 }
+
+# Optional time of day following a full date (e.g. ISO 8601 timestamps)
+DATE_TIME_SUFFIX = r'(?:[ T]\d{1,2}[:h]\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?'
+
+DATE_DIRECTIVES = {
+	'%d': r'(?P<d>\d{1,2})(?:er)?',
+	'%m': r'(?P<m>\d{1,2})',
+	'%Y': r'(?P<y>\d{4})',
+	'%B': r'(?P<b>{})\.?'.format('|'.join(sorted(MONTH_NAMES.keys(), key = len, reverse = True))) }
+
+class DateFormat(object):
+	''' A concrete date format (described with strptime directives, e.g. %d/%m/%Y) compiled into an anchored regex,
+		along with the period it denotes (day, month or year). '''
+	def __init__(self, name):
+		self.name = name
+		self.period = 'day' if '%d' in name else 'month' if '%m' in name or '%B' in name else 'year'
+		parts = re.split(r'(%[dmYB])', name)
+		p = ''.join([DATE_DIRECTIVES.get(part, re.escape(part)) for part in parts])
+		self.r = re.compile('^' + p + (DATE_TIME_SUFFIX if self.period == 'day' else '') + '$', re.I)
+	def __str__(self): return self.name
+	def parse(self, v):
+		''' Returns the (year, month, day) triple of a value in this format (day is 1 for a month period), or None
+			if the value does not fit the format or is not a valid date. '''
+		m = self.r.match(v.strip())
+		if m is None: return None
+		gs = m.groupdict()
+		month = int(gs['m']) if 'm' in gs else MONTH_NAMES.get(gs['b'].lower())
+		(y, d) = (int(gs['y']), int(gs['d']) if 'd' in gs else 1)
+		try:
+			datetime.date(y, month, d)
+		except (TypeError, ValueError):
+			return None
+		return (y, month, d)
+
+@lazy_resource
+def date_formats():
+	''' Returns the candidate formats (compiled on first use), in order of preference when a value fits several of
+		them with the same support (in particular, day-first comes before month-first for ambiguous numeric dates). '''
+	return list([DateFormat(fmt.format(s)) for s in '/-. ' for fmt in ['%d{0}%m{0}%Y', '%m{0}%d{0}%Y', '%Y{0}%m{0}%d', '%m{0}%Y']]
+		+ [DateFormat(fmt) for fmt in ['%Y-%m', '%Y/%m', '%d %B %Y', '%B %d, %Y', '%B %Y']])
+
+def date_data(v):
+	''' Returns the (date, period) pair that dateparser finds in a value, or None. '''
+	try:
+		dd = date_data_parser().get_date_data(v)
+		return None if dd['date_obj'] is None else (dd['date_obj'], dd['period'])
+	except TypeError as te:
+		logging.error('Error while parsing value which is not a date %s: %s', v, te)
+	except OverflowError as oe:
+		logging.error('Overflow while parsing date %s: %s', v, oe)
+	return None
+
+class DateFormatLearner(object):
+	''' Column scanner which learns the dominant concrete date formats of a column from a sample of its values, so that
+		CustomDateMatcher parses them with precompiled regexes and only calls dateparser (which costs milliseconds per
+		value) on the values which fit none of them.
+
+		Formats are ranked by the number of sampled values they fit, which settles the day/month order of ambiguous
+		values (e.g. 03/04/2014) from the unambiguous ones. The dateparser fallback is turned off for the column when
+		it parses none of the sampled values which fit no candidate format. '''
+	def __init__(self, sampleSize = 200, minShare = .05, maxProbes = 20, minProbes = 5):
+		self.sampleSize = sampleSize
+		self.minShare = minShare
+		self.maxProbes = maxProbes
+		self.minProbes = minProbes
+		self.release()
+	@timed
+	def prepare(self, cells):
+		values = list(dict.fromkeys([c.value for c in cells if len(c.value) > 0 and not c.value.isdigit()]))
+		if len(values) > self.sampleSize: values = values[::len(values) // self.sampleSize][:self.sampleSize]
+		support = Counter()
+		unmatched = list()
+		for v in values:
+			fits = list([fmt for fmt in date_formats() if fmt.parse(v) is not None])
+			for fmt in fits: support[fmt.name] += 1
+			if len(fits) < 1: unmatched.append(v)
+		minSupport = max(1, math.ceil(self.minShare * len(values)))
+		self.formats = sorted([fmt for fmt in date_formats() if support[fmt.name] >= minSupport], key = lambda fmt: -support[fmt.name])
+		probes = unmatched[:self.maxProbes]
+		parsed = sum(1 for v in probes if date_data(v) is not None) if len(probes) >= self.minProbes else 0
+		self.fallback = len(probes) < self.minProbes or parsed > 0
+		if len(cells) < 1: return
+		fieldName = cells[0].f
+		for fmt in self.formats: dateFormatInfo[(fieldName, fmt.name)] += support[fmt.name]
+		if parsed > 0: dateFormatInfo[(fieldName, 'dateparser')] += parsed
+		if len(self.formats) > 0 or not self.fallback:
+			logging.info('Learned date formats for %s: %s (dateparser fallback %s)', fieldName,
+				', '.join(['{} ({})'.format(fmt, support[fmt.name]) for fmt in self.formats]), 'on' if self.fallback else 'off')
+	def release(self):
+		# Outside of a prepared column, all candidate formats are tried before dateparser
+		(self.formats, self.fallback) = (None, True)
+	def parse(self, v):
+		''' Returns the (year, month, day, period) tuple of a value from the learned formats, or None. '''
+		for fmt in (date_formats() if self.formats is None else self.formats):
+			ymd = fmt.parse(v)
+			if ymd is not None: return ymd + (fmt.period, )
+		return None
+
+def learned_date_formats(info):
+	''' Returns a dictionary mapping field name to the list of date formats learned on that column (most supported
+		first), from a Counter of (field name, format) pairs such as dateFormatInfo. '''
+	formats = defaultdict(list)
+	for ((fieldName, fmt), n) in sorted(info.items(), key = itemgetter(1), reverse = True):
+		if n > 0: formats[fieldName].append(fmt)
+	return dict(formats)
 
 class CustomDateMatcher(TypeMatcher):
 	def __init__(self):
 		super(CustomDateMatcher, self).__init__(F_DATE)
+		self.scanner = DateFormatLearner()
 	@timed
 	def match(self, c):
-		# TODO check prioritization of ambiguous dates: the most complex case would be first encountering some FR date(s),
-		# then an ambiguous date implicitly using US (not UK or AUS) locale (e.g. 03/04/2014 which should resolve to
-		# March 4th and not April 3rd)...
 		if c.value.isdigit():
 			logging.debug('Bailing out of %s for numeric value: %s', self, c)
 			return
-		try:
-			dd = DDP.get_date_data(c.value)
-			do, dp = dd['date_obj'], dd['period']
-			if do is None: return
-			y = do.year
-			if y < 1870 or 2120 < y: return # Safety check for too-loose matching
-			ds = str(y)
-			if dp == 'year':
-				self.register_full_match(c, F_YEAR, 100, ds)
-				return
-			ds = '{}/{}'.format(do.month, ds)
-			if dp == 'month':
-				self.register_full_match(c, F_MONTH, 100, ds)
-			else:
-				self.register_full_match(c, F_DATE, 100, '{}/{}'.format(do.day, ds))
-		except TypeError as te:
-			logging.error('Error while parsing value which is not a date %s: %s', c.value, te)
-		except OverflowError as oe:
-			logging.error('Overflow while parsing date %s: %s', c.value, oe)
-
-def score_phone_number(z): return 100 if phonenumbers.is_valid_number(z) else 75 if phonenumbers.is_possible_number(z) else 5
-
-def normalize_phone_number(z): return phonenumbers.format_number(z, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
+		parsed = self.scanner.parse(c.value)
+		if parsed is None:
+			if not self.scanner.fallback: return
+			dd = date_data(c.value)
+			if dd is None: return
+			(do, dp) = dd
+			parsed = (do.year, do.month, do.day, dp)
+		(y, month, d, dp) = parsed
+		if y < 1870 or 2120 < y: return # Safety check for too-loose matching
+		ds = str(y)
+		if dp == 'year':
+			self.register_full_match(c, F_YEAR, 100, ds)
+			return
+		ds = '{}/{}'.format(month, ds)
+		if dp == 'month':
+			self.register_full_match(c, F_MONTH, 100, ds)
+		else:
+			self.register_full_match(c, F_DATE, 100, '{}/{}'.format(d, ds))
+
+def score_phone_number(z):
+	import phonenumbers
+	return 100 if phonenumbers.is_valid_number(z) else 75 if phonenumbers.is_possible_number(z) else 5
+
+def normalize_phone_number(z):
+	import phonenumbers
+	return phonenumbers.format_number(z, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
+
+DEFAULT_PHONE_REGION = 'FR'
+# Values made of digits and phone number punctuation only, with a plausible number of digits
+PHONE_SHAPE = re.compile(r'^\s*\+?[\d\s().\-/]+$')
+PHONE_MIN_DIGITS = 7
+PHONE_MAX_DIGITS = 17
+# Run of digits (possibly separated by punctuation) long enough to hold a phone number, for partial matching
+PHONE_RUN = re.compile(r'\d(?:[\s().\-/]*\d){6,}')
+# Leading label of a phone number (e.g. "Tél. : ", "Fax "), ignored when checking a value's shape
+PHONE_LABEL = re.compile(r'^\s*[^\W\d_][^\d+]*?[\s:.]+(?=[+\d(])')
+
+def phone_key(v):
+	''' Returns the digit string of a value shaped like a full phone number (with its leading + if any), possibly
+		preceded by a label, or None. '''
+	v = PHONE_LABEL.sub('', v, count = 1)
+	if not PHONE_SHAPE.match(v): return None
+	digits = re.sub(r'\D', '', v)
+	if len(digits) < PHONE_MIN_DIGITS or len(digits) > PHONE_MAX_DIGITS: return None
+	return '+' + digits if v.lstrip().startswith('+') else digits
+
+def is_international_phone_key(key): return key.startswith('+') or key.startswith('00')
+
+@lru_cache(maxsize = 1 << 16)
+def parse_phone_key(key, region):
+	''' Returns the (score, normalized number, region code) triple for a phone key parsed in a given region, or None
+		if it is not a number. Results are cached, since phone columns hold many repeated numbers. '''
+	import phonenumbers
+	try:
+		z = phonenumbers.parse(key, region)
+	except phonenumbers.NumberParseException:
+		return None
+	return (score_phone_number(z), normalize_phone_number(z), phonenumbers.region_code_for_number(z))
+
+def infer_phone_region(keys, default = DEFAULT_PHONE_REGION, maxCandidates = 3):
+	''' Returns the region in which the most national-format phone keys of a column are valid numbers, among the
+		default region and the regions of the column's international-format numbers (the default region wins ties). '''
+	intl = Counter()
+	national = list()
+	for key in keys:
+		if is_international_phone_key(key):
+			parsed = parse_phone_key(key, default)
+			if parsed is not None and parsed[2] is not None: intl[parsed[2]] += 1
+		else: national.append(key)
+	candidates = [default] + list([r for (r, n) in intl.most_common(maxCandidates) if r != default])
+	valid = { r: sum(1 for key in national if (parse_phone_key(key, r) or (0, ))[0] >= 100) for r in candidates }
+	region = max(candidates, key = lambda r: valid[r])
+	return (region, valid[region], len(national), sum(intl.values()))
+
+def parse_phone_numbers(values, region = None, sampleSize = 200):
+	''' Batch phone number parsing: returns the (score, normalized number) pair of each value, or None for values
+		which are not phone numbers. If region is None, it is inferred from a sample of the values. '''
+	keys = list([phone_key(v) for v in values])
+	if region is None:
+		distinct = list(dict.fromkeys([key for key in keys if key is not None]))
+		region = infer_phone_region(distinct[::max(1, len(distinct) // sampleSize)][:sampleSize])[0]
+	results = list()
+	for key in keys:
+		parsed = parse_phone_key(key, region) if key is not None else None
+		results.append(parsed[:2] if parsed is not None else None)
+	return results
+
+class PhoneRegionLearner(object):
+	''' Column scanner which infers the dominant region of the phone numbers of a column from a sample of its
+		values, so that CustomTelephoneMatcher parses national-format numbers in that region. '''
+	def __init__(self, sampleSize = 200, default = DEFAULT_PHONE_REGION):
+		self.sampleSize = sampleSize
+		self.default = default
+		self.region = default
+	@timed
+	def prepare(self, cells):
+		keys = list(dict.fromkeys([key for key in (phone_key(c.value) for c in cells) if key is not None]))
+		if len(keys) < 1: return
+		keys = keys[::max(1, len(keys) // self.sampleSize)][:self.sampleSize]
+		(self.region, valid, national, intl) = infer_phone_region(keys, self.default)
+		logging.info('Inferred phone region for %s: %s (%d valid out of %d national-format numbers, %d international-format numbers)',
+			cells[0].f, self.region, valid, national, intl)
+	def release(self):
+		self.region = self.default
 
 class CustomTelephoneMatcher(TypeMatcher):
 	def __init__(self, partial = False):
 		super(CustomTelephoneMatcher, self).__init__(F_PHONE)
 		self.partial = partial
+		self.scanner = PhoneRegionLearner()
+	def signature(self): return str(self.partial)
+	def vectorized(self): return not self.partial
+	def match_column(self, column):
+		''' Parses the numbers of a whole column at once (see parse_phone_numbers). '''
+		self.scanner.prepare(column.cells)
+		matches = defaultdict(lambda: ([], []))
+		for (c, parsed) in zip(column.cells, parse_phone_numbers([c.value for c in column.cells], self.scanner.region)):
+			if parsed is None or parsed[0] <= 0: continue
+			matches[parsed[0]][0].append(c)
+			matches[parsed[0]][1].append(parsed[1])
+		for (score, (cells, hits)) in matches.items(): self.register_full_matches(cells, self.t, score, hits)
+		self.scanner.release()
 	@timed
 	def match(self, c):
-		if partial:
+		if self.partial:
+			if not PHONE_RUN.search(c.value): return
+			import phonenumbers
 			try:
-				for match in phonenumbers.PhoneNumberMatcher(c.value, 'FR'):
+				for match in phonenumbers.PhoneNumberMatcher(c.value, self.scanner.region):
 					# original string is in match.raw_string
 					self.register_partial_match(c, self.t, 100, normalize_phone_number(match.number), (match.start, match.end))
 			except UnicodeDecodeError as e:
 				logging.error('Unicode error while parsing phone number(s) %s: %s', c.value, e)
 		else:
-			try:
-				z = phonenumbers.parse(c.value, 'FR')
-				score = score_phone_number(z)
-				if score > 0: self.register_full_match(c, self.t, score, normalize_phone_number(z))
-			except:
-				return 0
+			key = phone_key(c.value)
+			parsed = parse_phone_key(key, self.scanner.region) if key is not None else None
+			if parsed is not None and parsed[0] > 0: self.register_full_match(c, self.t, parsed[0], parsed[1])
 
 # Person-name matcher-normalizer code
 
-PRENOM_LEXICON = file_to_set('prenom')
-PATRONYME_LEXICON = file_to_set('patronyme_fr')
+@lazy_resource
+def prenom_lexicon(): return file_to_set('prenom')
+
+@lazy_resource
+def patronyme_lexicon(): return file_to_set('patronyme_fr')
 
-PAT_FIRST_NAME = '(%s)' % '|'.join([p for p in PRENOM_LEXICON])
 PAT_LAST_NAME = '([A-Z][A-Za-z]+\s?)+'
 PAT_LAST_NAME_ALLCAPS = '([A-Z][A-Z]+\s?)+'
 PAT_INITIAL = '([A-Z][\.\-\s]{1,3}){1,3}'
 
-# Ignore case on these two
-PAT_FIRST_LAST_NAME = '\s*%s\s+(%s)\s*' % (PAT_FIRST_NAME, PAT_LAST_NAME)
-PAT_LAST_FIRST_NAME = '\s*(%s)\s+%s\s*' % (PAT_LAST_NAME, PAT_FIRST_NAME)
-
 # Don't ignore case on those two
 PAT_FIRSTINITIAL_LAST_NAME = '\s*(%s)\s+((%s)|(%s))\s*' % (PAT_INITIAL, PAT_LAST_NAME, PAT_LAST_NAME_ALLCAPS)
 PAT_LAST_FIRSTINITIAL_NAME = '\s*((%s)|(%s))\s+(%s)\s*' % (PAT_LAST_NAME, PAT_LAST_NAME_ALLCAPS, PAT_INITIAL)
@@ -1241,21 +2766,158 @@ def pattern_with_word_boundary(p): return '\\b' + p + '\\b'
 
 def regex_with_word_boundary(p, flags = 0): return re.compile(pattern_with_word_boundary(p), flags)
 
-PERSON_NAME_EXTRACTION_PATS = [
-	(regex_with_word_boundary(PAT_FIRST_NAME, re.IGNORECASE), 1, -1),
-	(regex_with_word_boundary('%s\s+(%s)' % (PAT_FIRST_NAME, PAT_LAST_NAME), re.IGNORECASE), 1, 2),
-	(regex_with_word_boundary('(%s)\s+%s' % (PAT_LAST_NAME, PAT_FIRST_NAME), re.IGNORECASE), 3, 1),
-	(regex_with_word_boundary('(%s)\s+((%s)|(%s))' % (PAT_INITIAL, PAT_LAST_NAME, PAT_LAST_NAME_ALLCAPS)), 1, 2),
-	(regex_with_word_boundary('((%s)|(%s))\s+(%s)' % (PAT_LAST_NAME, PAT_LAST_NAME_ALLCAPS, PAT_INITIAL)), 2, 1)
-]
+# Lexicon-based recognition of first names (as a replacement for a regex alternation over the whole lexicon)
+
+def is_word_char(ch): return ch.isalnum() or ch == '_'
+
+def is_word_boundary(s, i):
+	''' Same semantics as \b at index i of string s. '''
+	return (i > 0 and is_word_char(s[i - 1])) != (i < len(s) and is_word_char(s[i]))
+
+class NameLexicon(object):
+	''' Case-insensitive lookup of lexicon entries at a given position of a string, probing one hashed key per
+		distinct entry length. '''
+	def __init__(self, lexicon):
+		self.entries = set([e.lower() for e in lexicon if len(e) > 0])
+		self.lengths = sorted(set([len(e) for e in lexicon if len(e) > 0]), reverse = True)
+	def ends_at(self, s, i, boundary = True):
+		''' Generates the end indices of entries starting at index i of s (longest entry first).
+
+			Parameters:
+			boundary if True, then only entries followed by a word boundary are retained '''
+		for l in self.lengths:
+			j = i + l
+			if j > len(s): continue
+			if s[i:j].lower() in self.entries and (not boundary or is_word_boundary(s, j)): yield j
+
+# Equivalent to PAT_LAST_NAME when ignoring case, but without nested quantifiers (hence no catastrophic backtracking)
+PAT_LAST_NAME_NOCASE = '([A-Za-z]{2,}(?:\s[A-Za-z]{2,})*\s?)'
+LAST_NAME_HEAD_RE = re.compile('%s\s+' % PAT_LAST_NAME_NOCASE, re.I)
+
+PN_FIRST = 0 # <First>
+PN_FIRST_LAST = 1 # <First> <Last>
+PN_LAST_FIRST = 2 # <Last> <First>
+
+class NameMatch(object):
+	''' Minimal match object for PersonNamePattern, where group 1 is the first name and group 2 the last name. '''
+	def __init__(self, s, spans):
+		self.s = s
+		self.spans = [(spans[0][0], spans[-1][1])] + spans
+	def group(self, g = 0):
+		(i1, i2) = self.span(g)
+		return self.s[i1:i2]
+	def span(self, g = 0):
+		if g < 0 or g >= len(self.spans): raise IndexError('no such group')
+		return self.spans[g]
+	def groups(self): return tuple([self.group(g) for g in range(1, len(self.spans))])
+
+class PersonNamePattern(object):
+	''' Recognizes a person name at the start of a string (with the same semantics as re.match and ignoring case),
+		where first names are looked up in a NameLexicon and last names are parsed as in PAT_LAST_NAME.
+
+		Last names are not looked up in the patronyme lexicon: the regex patterns replaced by this class accept any
+		alphabetic last name, including those missing from the lexicon (so a lookup would change the results), while
+		the last name regex is only matched at the positions set by the first name lookup, without nested quantifiers.
+
+		When several lexicon entries could start the name, the longest one that completes a match is retained. This differs
+		from the former regex alternation over the lexicon, which retained the first alternative in set order (e.g. 'F'
+		rather than 'Françoise'). Besides, group 1 is always the first name and group 2 the last name, whereas for
+		<Last> <First> names the former matcher read the first name from the last repetition of the last name group. '''
+	def __init__(self, firstNames, order, boundary = True):
+		''' Parameters:
+			order one of PN_FIRST, PN_FIRST_LAST, PN_LAST_FIRST
+			boundary if True, the name must be delimited by word boundaries (as in PERSON_NAME_EXTRACTION_PATS),
+				otherwise a name prefix suffices and leading whitespace is skipped before full names (as in the value matchers) '''
+		self.firstNames = firstNames
+		self.order = order
+		self.boundary = boundary
+		self.lastNameTail = re.compile('\s+%s%s' % (PAT_LAST_NAME_NOCASE, '\\b' if boundary else ''), re.I)
+	def match(self, s):
+		i0 = 0
+		if not self.boundary and self.order != PN_FIRST:
+			while i0 < len(s) and s[i0].isspace(): i0 += 1
+		if i0 >= len(s) or not is_word_char(s[i0]): return None
+		if self.order == PN_FIRST:
+			for j in self.firstNames.ends_at(s, i0, boundary = self.boundary):
+				return NameMatch(s, [(i0, j)])
+		elif self.order == PN_FIRST_LAST:
+			for j in self.firstNames.ends_at(s, i0, boundary = False):
+				m = self.lastNameTail.match(s, j)
+				if m: return NameMatch(s, [(i0, j), m.span(1)])
+		elif self.order == PN_LAST_FIRST:
+			for i in range(len(s) - 1, i0, -1):
+				if not s[i - 1].isspace() or s[i].isspace(): continue
+				m = LAST_NAME_HEAD_RE.fullmatch(s, i0, i)
+				if not m: continue
+				for j in self.firstNames.ends_at(s, i, boundary = self.boundary):
+					return NameMatch(s, [(i, j), m.span(1)])
+		return None
+
+STREET_TYPE_RE = re.compile('(rue|avenue|av|boulevard|bvd|bd|chemin|route|place|allee) ', re.I)
+
+def first_name_in_street(s, firstNames, maxGap = 10):
+	''' Returns True if a first name occurs within a street name, i.e. the input contains a street type followed by a space,
+		then at most maxGap characters and another space, then a first name, both the street type and the first name
+		being delimited by word boundaries (with the same semantics as searching for the regex
+		\b + street type + ' .{0,maxGap} ' + first name + \b). '''
+	m = STREET_TYPE_RE.search(s)
+	while m:
+		i = m.end()
+		if is_word_boundary(s, m.start()):
+			for j in range(i, min(i + maxGap, len(s) - 1) + 1):
+				if j > i and s[j - 1] == '\n': break
+				if s[j] == ' ' and any(True for k in firstNames.ends_at(s, j + 1, boundary = True)): return True
+		m = STREET_TYPE_RE.search(s, m.start() + 1)
+	return False
+
+class PersonNameMatcher(TypeMatcher):
+	''' Registers the first and last name groups recognized by a PersonNamePattern (in the same way as a
+		CompositeRegexMatcher). '''
+	def __init__(self, t, pattern, tgs, validators = { }):
+		super(PersonNameMatcher, self).__init__(t)
+		self.pattern = pattern
+		self.tgs = tgs
+		self.validators = validators
+	def signature(self): return '{}|{}'.format(self.pattern.order, self.pattern.boundary)
+	@timed
+	def match(self, c):
+		m = self.pattern.match(c.value)
+		if m: self.register_group_matches(c, m, self.tgs, self.validators)
+
+class StreetNameMatcher(TypeMatcher):
+	''' Negates its type (typically person names) for values where a first name occurs within a street name. '''
+	def __init__(self, t, firstNames):
+		super(StreetNameMatcher, self).__init__(t)
+		self.firstNames = firstNames
+	@timed
+	def match(self, c):
+		if first_name_in_street(c.value, self.firstNames): c.negate_type(self.t)
+
+@lazy_resource
+def first_names(): return NameLexicon(prenom_lexicon())
+
+@lazy_resource
+def person_name_extraction_pats():
+	return [
+		(PersonNamePattern(first_names(), PN_FIRST), 1, -1),
+		(PersonNamePattern(first_names(), PN_FIRST_LAST), 1, 2),
+		(PersonNamePattern(first_names(), PN_LAST_FIRST), 1, 2),
+		(regex_with_word_boundary('(%s)\s+((%s)|(%s))' % (PAT_INITIAL, PAT_LAST_NAME, PAT_LAST_NAME_ALLCAPS)), 1, 2),
+		(regex_with_word_boundary('((%s)|(%s))\s+(%s)' % (PAT_LAST_NAME, PAT_LAST_NAME_ALLCAPS, PAT_INITIAL)), 2, 1)
+	]
 
 def validate_first_name(fst): return len(fst) > 1
 
 def validate_last_name(lst): return len(lst) > 2
 
+# Module-level (rather than lambda) validators, so that matchers using them can be pickled
+def validate_stripped_first_name(fst): return validate_first_name(stripped(fst))
+
+def validate_stripped_last_name(lst): return validate_last_name(stripped(lst))
+
 def validate_person_name(s):
 	''' Validator for items of type: full person name '''
-	for i, (r, firstGp, lastGp) in enumerate(PERSON_NAME_EXTRACTION_PATS):
+	for i, (r, firstGp, lastGp) in enumerate(person_name_extraction_pats()):
 		m = r.match(s)
 		if m:
 			logging.debug('Person name pattern #%d matched: %s', i + 1, '; '.join(m.groups()))
@@ -1301,8 +2963,11 @@ def parse_person_name_list(s, itemValidator, i1 = 0, delimiters = ',;\t', stripC
 
 ##### START OF: specific, tailor-made parsing of person name lists
 
-FR_FIRSTNAMES = map(str.lower, PRENOM_LEXICON)
-FR_SURNAMES = map(str.lower, PATRONYME_LEXICON)
+@lazy_resource
+def fr_first_names(): return set(map(str.lower, prenom_lexicon()))
+
+@lazy_resource
+def fr_surnames(): return set(map(str.lower, patronyme_lexicon()))
 F_FIRSTORLAST = F_FIRST + '|' + F_LAST
 PN_STRIP_CHARS = ' <>[](){}"\''
 PN_DELIMITERS = ',;+/'
@@ -1346,10 +3011,10 @@ def extract_person_name(s):
 		if title:
 			d[F_TITLE].add(title)
 			continue
-		if t in FR_FIRSTNAMES:
+		if t in fr_first_names():
 			d[F_FIRST].add(t)
 			d[F_FIRSTORLAST].add(t)
-		elif t in FR_SURNAMES:
+		elif t in fr_surnames():
 			d[F_LAST].add(t)
 			d[F_FIRSTORLAST].add(t)
 	if len(d[F_LAST]) < 1:
@@ -1395,6 +3060,7 @@ class CustomPersonNameMatcher(TypeMatcher):
 # Phone number normalization
 
 def normalize_phone_number(x):
+	import phonenumbers
 	try:
 		return phonenumbers.format_number(x, phonenumbers.PhoneNumberFormat.INTERNATIONAL)
 	except:
@@ -1413,16 +3079,31 @@ BAN_MAPPING = [
 	(F_ZIP, 'postcode'),
 	(F_CITY, 'city') ]
 
+def address_parser():
+	''' Returns the libpostal address parser shared with gridder (see address_parsing), whose cache stats are reported in
+		the performance metrics. '''
+	parser = address_parsing.address_parser()
+	register_cache_stats('address_parser', parser.stats)
+	return parser
+
+class AddressParsingScanner(object):
+	''' Column scanner which parses all the distinct values of a column in one batch (in a pool of ADDRESS_PARSER_WORKERS
+		processes), so that CustomAddressMatcher then finds them in the address parser's cache. '''
+	@timed
+	def prepare(self, cells):
+		address_parser().parse_many([c.value for c in cells if not c.value.isdigit()], workers = ADDRESS_PARSER_WORKERS)
+	def release(self): pass
+
 class CustomAddressMatcher(TypeMatcher):
 	def __init__(self):
 		super(CustomAddressMatcher, self).__init__(F_ADDRESS)
-		from postal.parser import parse_address
+		self.scanner = AddressParsingScanner()
 	@timed
 	def match(self, c):
 		if c.value.isdigit():
 			logging.debug('Bailing out of %s for numeric value: %s', self, c)
 			return
-		parsed = parse_address(c.value)
+		parsed = address_parser().parse(c.value)
 		if not parsed: return
 		ps = {key: value for (value, key) in parsed}
 		v = c.value.lower()
@@ -1447,25 +3128,184 @@ class CustomAddressMatcher(TypeMatcher):
 		if len(comps) > 0:
 			self.register_full_match(c, self.t, 100, ' '.join(comps))
 
-COMMUNE_LEXICON = file_to_set('commune')
+@lazy_resource
+def commune_lexicon(): return file_to_set('commune')
+
+# Address geocoding backends for FrenchAddressMatcher, both returning results in the format of the BAN address API
+# (a dictionary whose 'features' each have 'properties' with a type among housenumber, street, locality and
+# municipality, a label, and whichever of housenumber, street, postcode and city apply)
+
+BAN_API_URL = 'https://api-adresse.data.gouv.fr/search/?q={}'
+
+class BANGeocoder(object):
+	''' Geocoder querying the BAN address API on data.gouv.fr (one blocking request per value). '''
+	def __str__(self): return 'BANGeocoder'
+	def search(self, q, limit = 5):
+		import urllib.request, urllib.parse
+		try:
+			with urllib.request.urlopen(BAN_API_URL.format(urllib.parse.quote(q)) + '&limit={}'.format(limit)) as response:
+				return json.loads(response.read().decode('utf-8'))
+		except (ValueError, OSError) as e:
+			logging.warning('adresse.data.gouv.fr returned unexpected response: {}'.format(e))
+			return None
+
+# Path of the implantations file from which the offline geocoder reads postcodes along with full street addresses
+POSTCODE_RESOURCE = 'fr-esr-implantations_etablissements_d_enseignement_superieur_publics.csv'
+
+def address_tokens(s):
+	return split_and_case(s).split()
+
+def address_feature(kind, label, housenumber = None, street = None, postcode = None, city = None):
+	props = { 'type': kind }
+	for (k, v) in [('label', label), ('housenumber', housenumber), ('street', street), ('postcode', postcode), ('city', city)]:
+		if v: props[k] = ' '.join(v.split())
+	props['name'] = props.get('street', props['label']) if kind in ['housenumber', 'street'] else props['label']
+	return props
+
+def street_feature(street, postcode = None, city = None):
+	''' Returns the properties of a housenumber feature if a street address starts with a number, of a street
+		feature otherwise. '''
+	m = re.match('([0-9]+ *(?:bis|ter|[a-z])?)\\b[ ,]*(.+)', street, re.IGNORECASE)
+	(housenumber, name) = (m.group(1).strip(), m.group(2)) if m else (None, street)
+	label = ' '.join([s for s in [street, postcode, city] if s])
+	return address_feature('housenumber' if housenumber else 'street', label, housenumber = housenumber, street = name,
+		postcode = postcode, city = city)
+
+class OfflineGeocoder(object):
+	''' Geocoder searching a token index of local address features (municipalities, streets, house numbers), as a
+		stand-in for the BAN address API in network-isolated environments.
+
+		Results are ranked by the inverse document frequency of the tokens they share with the query (Dice coefficient
+		of the idf-weighted token sets), candidates being retrieved from the postings of the rarest query tokens. '''
+	def __init__(self, features = ()):
+		self.features = list()
+		self.index = defaultdict(list) # Map from token to the ids of the features whose label has that token
+		self.weights = array('d') # Sum of the idf of the label tokens of each feature
+		self.keys = set()
+		for props in features: self.add(props)
+		self.finalize()
+	def __str__(self): return 'OfflineGeocoder<{} features>'.format(len(self.features))
+	def add(self, props):
+		k = (props['type'], case_token(props['label'], False))
+		if k in self.keys: return
+		self.keys.add(k)
+		fid = len(self.features)
+		self.features.append(props)
+		for token in feature_tokens(props): self.index[token].append(fid)
+	def finalize(self):
+		''' Computes the weight of each feature once all features have been added. '''
+		self.weights = array('d', [sum(self.idf(t) for t in set(address_tokens(props['label']))) for props in self.features])
+	def idf(self, token):
+		return math.log((1. + len(self.features)) / (1. + len(self.index.get(token, ()))))
+	def feature_weight(self, fid, idfs):
+		''' Returns the weight of a feature for a query, its postcode only counting if the query holds it. '''
+		postcode = self.features[fid].get('postcode')
+		return self.weights[fid] + (idfs[postcode] if postcode in idfs and postcode not in address_tokens(self.features[fid]['label']) else 0)
+	def search(self, q, limit = 5, maxPostings = 3):
+		''' Returns the features that best match a query, in the format of the BAN address API. '''
+		tokens = set(address_tokens(q))
+		known = sorted([t for t in tokens if t in self.index], key = lambda t: len(self.index[t]))
+		candidates = set()
+		for t in known[:maxPostings]:
+			# Frequent tokens (e.g. street types) only retrieve candidates when no rarer token did
+			if len(candidates) > 0 and len(self.index[t]) * 100 > len(self.features): break
+			candidates.update(self.index[t])
+		idfs = { t: self.idf(t) for t in tokens }
+		shared = Counter()
+		for t in known:
+			for fid in self.index[t]:
+				if fid in candidates: shared[fid] += idfs[t]
+		qWeight = sum(idfs.values())
+		scored = sorted([(2 * s / (qWeight + self.feature_weight(fid, idfs)), fid) for (fid, s) in shared.items()],
+			key = lambda sf: (-sf[0], sf[1]))
+		features = list()
+		for (score, fid) in scored[:limit]:
+			props = dict(self.features[fid])
+			props['score'] = round(score, 4)
+			features.append({ 'type': 'Feature', 'properties': props })
+		return { 'type': 'FeatureCollection', 'query': q, 'features': features }
+
+def feature_tokens(props):
+	''' Returns the indexed tokens of a feature: those of its label, along with its postcode. '''
+	tokens = set(address_tokens(props['label']))
+	if 'postcode' in props: tokens.add(props['postcode'])
+	return tokens
+
+def build_offline_geocoder(communes, streets, postcodeFile = POSTCODE_RESOURCE, banExtractFile = None):
+	''' Returns an OfflineGeocoder indexing municipalities (with their postcode when it is known), street addresses
+		(with or without a house number) and, if a local BAN extract is given, all its addresses.
+
+		Parameters:
+		communes a list of commune names
+		streets a list of street addresses
+		postcodeFile a resource file holding (address, postcode, commune) rows (None to skip it)
+		banExtractFile the path of a BAN address file (CSV as published on adresse.data.gouv.fr, possibly gzipped) '''
+	features = list()
+	cityPostcodes = dict()
+	if postcodeFile is not None:
+		rows = file_row_iter(postcodeFile, ';')
+		header = next(rows)
+		(ai, pi, ci) = (header.index('Adresse'), header.index('Code postal'), header.index('Commune'))
+		for row in rows:
+			if len(row) <= max(ai, pi, ci) or not row[ci]: continue
+			if row[pi]: cityPostcodes.setdefault(case_token(row[ci], False), row[pi])
+			if row[ai]: features.append(street_feature(row[ai], row[pi], row[ci]))
+	for city in communes:
+		features.append(address_feature('municipality', city, postcode = cityPostcodes.get(case_token(city, False)), city = city))
+	for street in streets:
+		if street: features.append(street_feature(street))
+	if banExtractFile is not None: features.extend(ban_extract_features(banExtractFile))
+	geocoder = OfflineGeocoder(features)
+	logging.info('Built %s', geocoder)
+	return geocoder
+
+def ban_extract_features(fileName):
+	''' Generates the housenumber, street and municipality features of a BAN address file. '''
+	import gzip
+	with (gzip.open(fileName, 'rt', encoding = 'utf-8') if fileName.endswith('.gz') else open(fileName, 'r', encoding = 'utf-8')) as f:
+		for row in csv.DictReader(f, delimiter = ';'):
+			(street, postcode, city) = (row.get('nom_voie'), row.get('code_postal'), row.get('nom_commune'))
+			if not street or not city: continue
+			number = ' '.join([s for s in [row.get('numero'), row.get('rep')] if s])
+			if number: yield address_feature('housenumber', ' '.join([number, street, postcode, city]), housenumber = number,
+				street = street, postcode = postcode, city = city)
+			yield address_feature('street', ' '.join([street, postcode, city]), street = street, postcode = postcode, city = city)
+			yield address_feature('municipality', city, postcode = postcode, city = city)
+
+@lazy_resource
+def offline_geocoder():
+	return build_offline_geocoder(commune_lexicon(), file_to_list('voie.col'), banExtractFile = BAN_EXTRACT_FILE)
+
+# Geocoding backends which can be selected by GEOCODER in CONFIG.py
+GEOCODERS = {
+	'ban': BANGeocoder,
+	'offline': offline_geocoder
+}
+
+@lazy_resource
+def address_geocoder():
+	''' Returns the geocoding backend selected in the configuration. '''
+	if GEOCODER not in GEOCODERS:
+		raise ValueError('Unknown geocoder {} (expected one of {})'.format(GEOCODER, ', '.join(GEOCODERS.keys())))
+	return GEOCODERS[GEOCODER]()
 
 class FrenchAddressMatcher(LabelMatcher):
-	def __init__(self):
-		super(FrenchAddressMatcher, self).__init__(F_ADDRESS, COMMUNE_LEXICON, MATCH_MODE_CLOSE)
+	def __init__(self, geocoder = None, communes = None):
+		''' Parameters:
+			geocoder the geocoding backend (defaults to the one selected by GEOCODER in CONFIG.py)
+			communes the commune names against which municipality results are checked (defaults to the commune lexicon) '''
+		super(FrenchAddressMatcher, self).__init__(F_ADDRESS, commune_lexicon() if communes is None else communes, MATCH_MODE_CLOSE)
+		self.geocoder = geocoder
 	@timed
 	def match(self, c):
-		response = urllib.urlopen("http://api-adresse.data.gouv.fr/search/?q=%s" % c.value)
-		try:
-			data = json.loads(response.read())
-		except ValueError as e:
-			logging.warning('adresse.data.gouv.fr returned unexpected response: {}'.format(e))
-			return
+		data = (address_geocoder() if self.geocoder is None else self.geocoder).search(c.value)
 		if not data or 'features' not in data: return
-		logging.debug('Returned %d results from api-adresse.data.gouv.fr for %s', len(data['features']), c.value)
+		logging.debug('Returned %d results from %s for %s', len(data['features']), self.geocoder or address_geocoder(), c.value)
 		# Quick and dirty way to have two-tier results since based on BAN address matching results, when parsing a
 		# coarse-grained entity (city or equivalent) the results at a finer level (street, etc.) are completely unreliable
 		# as basically they are random, if not made-up, street addresses and districts.
 		hits = [set(), set()]
+		iIdx = dict() # Build inverted index to register partial matches
 		for point in data['features']:
 			if 'properties' not in point: continue
 			props = point['properties']
@@ -1473,34 +3313,33 @@ class FrenchAddressMatcher(LabelMatcher):
 				logging.warning('Properties do not contain any geolocation feature type! %s', data)
 				continue
 			kind = props['type']
-			iIdx = dict() # Build inverted index to register partial matches
 			if kind in ['housenumber', 'street', 'place', 'locality']: # Accurate enough, trust the result
 				l = props['label']
 				if l not in iIdx: iIdx[l] = props
 				hits[1].add(l)
 			elif kind in ['town', 'city', 'municipality']: # Sanity check on the commune name : exclude []
 				v = normalize_and_validate_phrase(c.value)
-				if v is not None and fast_sim_score(self.fss.search(v), len(v)) > 0:
+				if v is not None and fast_sim_score(self.fss.search(v), len(v))[1] > 0:
 					l = props['label']
 					if l not in iIdx: iIdx[l] = props
 					hits[0].add(l)
 			else:
 				logging.warning('Properties unexpected geolocation feature type: %s', kind)
 		scoreFilter = partial(address_filter_score, c.value)
-		prioHits = sorted(hits[0] if len(hits[0]) > 0 else hits[1], key = scoreFilter)
+		prioHits = sorted(hits[0] if len(hits[0]) > 0 else hits[1], key = scoreFilter, reverse = True)
 		for h in prioHits:
 			if scoreFilter(h) > 100:
 				self.register_full_match(c, self.t, 100, prioHits[0])
 				if prioHits[0] in iIdx:
 					props = iIdx[prioHits[0]]
-					for (banField, ourField) in BAN_MAPPING:
+					for (ourField, banField) in BAN_MAPPING:
 						if banField in props:
 							self.register_full_match(c, ourField, 100, props[banField])
-							break
 					self.register_full_match(c, F_COUNTRY, 100, 'France')
 				return
 
 def address_filter_score(src, ref):
+	from fuzzywuzzy import fuzz
 	a1, a2 = split_and_case(src), split_and_case(ref)
 	return fuzz.partial_ratio(a1, a2) + fuzz.ratio(a1, a2)
 
@@ -1511,6 +3350,7 @@ class AcronymMatcher(TypeMatcher):
 		super(AcronymMatcher, self).__init__(F_ACRONYMS)
 		self.minAcroSize = minAcroSize
 		self.maxAcroSize = maxAcroSize
+	def signature(self): return '{}|{}'.format(self.minAcroSize, self.maxAcroSize)
 	@timed
 	def match(self, c):
 		for (acro, i) in self.acronyms_in_phrase(c.value):
@@ -1540,6 +3380,8 @@ class VariantExpander(TypeMatcher):
 		self.tokenIdx = defaultdict(set) # map from alternative variant as joined-normalized-token-list to original alternative variant
 		self.minTokens = 3
 		self.maxTokens = DTC
+		self.stopWords = []
+		self.trie = None
 		# map of alternative variant`s (including main or not!), from normalized string to list of original strings:
 		phrasesMap = validated_lexical_map(self.variantsMap.keys(), tokenize = True)
 		for (phrase, altVariants) in phrasesMap.items():
@@ -1553,34 +3395,38 @@ class VariantExpander(TypeMatcher):
 				self.tokenIdx[matchedVariantPhrase].add(altVariant)
 				if altVariant not in self.variantsMap:
 					raise RuntimeError('Alternative variant {} not found in variants map'.format(altVariant))
+	def signature(self): return '{}|{}|{}'.format(self.domainType, self.keepContext, lexicon_digest(self.variantsMap.keys()))
+	def scan(self, v):
+		''' See TokenizedMatcher.scan. '''
+		if self.scanner is not None: return self.scanner.scan(self, v)
+		if self.trie is None: self.trie = token_index_trie(self.tokenIdx)
+		tokens = normalize_and_validate_tokens(v)
+		return (tokens, self.trie.scan(tokens))
 	@timed
 	def match(self, c):
 		if self.domainType is not None and self.domainType not in c.non_excluded_types():
 			return
-		tokens = normalize_and_validate_tokens(c.value)
-		if tokens is not None:
-			for k2 in range(self.maxTokens, 0, -1):
-				for k1 in range(0, len(tokens) + 1 - k2):
-					matchSrcTokens = tokens[k1:k1 + k2]
-					matchRefPhrase = ' '.join(matchSrcTokens)
-					if matchRefPhrase not in self.tokenIdx: 
-						continue
-					for altVariant in self.tokenIdx[matchRefPhrase]:
-						score = self.scorer(matchSrcTokens, tokens, matchRefPhrase, altVariant)
-						v = split_and_case(c.value)
-						i1 = v.find(tokens[k1])
-						if i1 >= 0: i2 = v.find(tokens[k1 + k2 - 1], i1) if k2 > 1 else i1
-						mainVariant = self.variantsMap[altVariant]
-						logging.debug('%s matched on %s: %s expanded to main variant %s', self, matchRefPhrase, altVariant, mainVariant)
-						normedValue = ''.join([v[:i1], mainVariant, v[i2:]]) if self.keepContext else mainVariant
-						if i1 == 0 and k1 + k2 == len(tokens):
-							self.register_full_match(c, self.t, score, mainVariant) # , normedValue) 							
-						elif i1 < 0 or i2 < 0:
-							logging.warning('%s could not find tokens "%s ... %s" in original "%s"', self, tokens[k1], tokens[k1 + k2 - 1], v)
-							self.register_full_match(c, self.t, score, mainVariant) # , normedValue) 
-						else:
-							span = (i1, i2 + len(tokens[k1 + k2 - 1]))
-							self.register_partial_match(c, self.t, score, mainVariant, span) # , normedValue, span) 
+		(tokens, matches) = self.scan(c.value)
+		v = None
+		for (k1, k2, matchRefPhrase) in matches:
+			k2 -= k1
+			matchSrcTokens = tokens[k1:k1 + k2]
+			if v is None: v = split_and_case(c.value)
+			for altVariant in self.tokenIdx[matchRefPhrase]:
+				score = self.scorer(matchSrcTokens, tokens, matchRefPhrase, altVariant)
+				i1 = v.find(tokens[k1])
+				if i1 >= 0: i2 = v.find(tokens[k1 + k2 - 1], i1) if k2 > 1 else i1
+				mainVariant = self.variantsMap[altVariant]
+				logging.debug('%s matched on %s: %s expanded to main variant %s', self, matchRefPhrase, altVariant, mainVariant)
+				normedValue = ''.join([v[:i1], mainVariant, v[i2:]]) if self.keepContext else mainVariant
+				if i1 == 0 and k1 + k2 == len(tokens):
+					self.register_full_match(c, self.t, score, mainVariant) # , normedValue) 							
+				elif i1 < 0 or i2 < 0:
+					logging.warning('%s could not find tokens "%s ... %s" in original "%s"', self, tokens[k1], tokens[k1 + k2 - 1], v)
+					self.register_full_match(c, self.t, score, mainVariant) # , normedValue) 
+				else:
+					span = (i1, i2 + len(tokens[k1 + k2 - 1]))
+					self.register_partial_match(c, self.t, score, mainVariant, span) # , normedValue, span) 
 
 # Misc utilities related to value normalization
 
@@ -1607,29 +3453,100 @@ def validate_Luhn(s):
 		logging.warning('Non-numeric value passed to Luhn validation: %s', s)
 		return False
 
-def non_zero_ratio_score(scores, minRatio = 10):
+COLUMN_SCORE_MIN_RATIO = 10
+
+def non_zero_ratio_score(scores, minRatio = COLUMN_SCORE_MIN_RATIO):
 	r = sum([(100 if s > 0 else 0) for s in scores]) / len(scores)
 	return r if r >= minRatio else 0
 
+HEADER_MATCHERS = list()
 def header_matchers():
-	''' Generates type matcher objects that can be applied to each column header in order to infer
+	''' Lazy, one-time-only creation of the type matcher objects that can be applied to each column header in order to infer
 		whether that column's type is the matcher's type (or alternatively a parent type or a child type).'''
-	headerSims = defaultdict(set)
-	for row in file_row_iter('header_names', '|'):
-		r = list(map(lambda s: s.strip(), row))
-		if len(r) < 1: continue
-		yield HeaderMatcher(r[0], set(r))
-		logging.info('Registered matcher for <%s> header with %d variants', r[0], len(r))
+	if len(HEADER_MATCHERS) < 1:
+		for row in file_row_iter('header_names', '|'):
+			r = list(map(lambda s: s.strip(), row))
+			if len(r) < 1: continue
+			HEADER_MATCHERS.append(HeaderMatcher(r[0], set(r)))
+			logging.info('Registered matcher for <%s> header with %d variants', r[0], len(r))
+	return HEADER_MATCHERS
 
 VALUE_MATCHERS = list()
 @timed
-def value_matchers():
-	''' Lazy, one-time-only creation of value matchers list. '''
+def value_matchers(useSnapshot = True):
+	''' Lazy, one-time-only creation of value matchers list.
+
+		Parameters:
+		useSnapshot if True, then matchers are loaded from a snapshot (see build_matcher_snapshot) when there is one
+			matching the current resources and code '''
 	if len(VALUE_MATCHERS) < 1:
+		if useSnapshot and load_matcher_snapshot(): return VALUE_MATCHERS
 		for vm in generate_value_matchers():
 			VALUE_MATCHERS.append(vm)
+		compile_regex_set(VALUE_MATCHERS)
+		compile_lexicon_set(VALUE_MATCHERS)
 	return VALUE_MATCHERS
 
+# Warm-start snapshot of the value matchers
+
+SNAPSHOT_FORMAT = 1
+
+def snapshot_key():
+	''' Returns a digest of the snapshot format, the Python version, this module's code and the resource files,
+		which identifies the value matchers snapshot that may be used. '''
+	h = hashlib.sha1('{}|{}.{}'.format(SNAPSHOT_FORMAT, *sys.version_info[:2]).encode('utf-8'))
+	with open(os.path.abspath(__file__), 'rb') as f: h.update(f.read())
+	for fileName in sorted(os.listdir(RESOURCE_PATH)):
+		filePath = os.path.join(RESOURCE_PATH, fileName)
+		if not os.path.isfile(filePath): continue
+		h.update(fileName.encode('utf-8'))
+		with open(filePath, 'rb') as f: h.update(f.read())
+	return h.hexdigest()
+
+def snapshot_path(key): return os.path.join(SNAPSHOT_PATH, 'value_matchers.{}.pickle'.format(key))
+
+class SnapshotUnpickler(pickle.Unpickler):
+	''' Resolves this module's classes and functions whether the snapshot was built from the module run as a script
+		or imported, and whether it is being loaded from either. '''
+	def find_class(self, module, name):
+		if module in ('__main__', 'preprocess_fields_v3'): return getattr(sys.modules[__name__], name)
+		return super(SnapshotUnpickler, self).find_class(module, name)
+
+def build_matcher_snapshot():
+	''' Builds the value matchers and serializes them (along with the parent-child relationships they set up between
+		types) to a versioned snapshot file, whose path is returned. '''
+	del VALUE_MATCHERS[:]
+	value_matchers(useSnapshot = False)
+	key = snapshot_key()
+	path = snapshot_path(key)
+	os.makedirs(SNAPSHOT_PATH, exist_ok = True)
+	state = { 'key': key, 'matchers': VALUE_MATCHERS, 'parent_child_rels': dict(PARENT_CHILD_RELS) }
+	(fd, tmpPath) = tempfile.mkstemp(dir = SNAPSHOT_PATH)
+	with os.fdopen(fd, 'wb') as f: pickle.dump(state, f, protocol = pickle.HIGHEST_PROTOCOL)
+	os.replace(tmpPath, path)
+	logging.info('Saved snapshot of %d value matchers to %s', len(VALUE_MATCHERS), path)
+	return path
+
+@timed
+def load_matcher_snapshot():
+	''' Loads the value matchers from the snapshot matching the current resources and code, if any.
+		Returns True on success. '''
+	path = snapshot_path(snapshot_key())
+	if not os.path.isfile(path):
+		logging.info('No value matchers snapshot found at %s', path)
+		return False
+	try:
+		with open(path, 'rb') as f: state = SnapshotUnpickler(f).load()
+		matchers = list(state['matchers'])
+		rels = { t: set(children) for (t, children) in state['parent_child_rels'].items() }
+	except Exception as e: # Unpickling a corrupt or incompatible snapshot may raise about anything: matchers are built instead
+		logging.warning('Could not load value matchers snapshot %s: %s: %s', path, type(e).__name__, e)
+		return False
+	for (t, children) in rels.items(): PARENT_CHILD_RELS[t] |= children
+	VALUE_MATCHERS[:] = matchers
+	logging.info('Loaded snapshot of %d value matchers from %s', len(VALUE_MATCHERS), path)
+	return True
+
 def generate_value_matchers(lvl = 0):
 	''' Generates type matcher objects that can be applied to each value cell in a column in order to infer
 		whether that column's type is the matcher's type (or alternatively a parent type or a child type).
@@ -1642,31 +3559,30 @@ def generate_value_matchers(lvl = 0):
 	# yield TemplateMatcher('Identifiant', 90) # TODO distinguish unique vs. non-unique
 
 	# Person names
-	if lvl >= 0: yield LabelMatcher(F_FIRST, PRENOM_LEXICON, MATCH_MODE_EXACT)
-	if lvl >= 2: yield TokenizedMatcher(F_FIRST, PRENOM_LEXICON,
+	if lvl >= 0: yield LabelMatcher(F_FIRST, prenom_lexicon(), MATCH_MODE_EXACT)
+	if lvl >= 2: yield TokenizedMatcher(F_FIRST, prenom_lexicon(),
 		# maxTokens set to 2 in order to deal with composite first names
 		maxTokens = 2, scorer = partial(tokenization_based_score, minSrcTokenRatio = 20, minSrcCharRatio = 10))
-	if lvl >= 0: yield LabelMatcher(F_LAST, PATRONYME_LEXICON, MATCH_MODE_EXACT)
+	if lvl >= 0: yield LabelMatcher(F_LAST, patronyme_lexicon(), MATCH_MODE_EXACT)
 	if lvl >= 2:
 		titleLexicon = file_to_set('titre_appel') | file_to_set('titre_academique')
 		yield TokenizedMatcher(F_TITLE, titleLexicon, maxTokens = 1)
 	if lvl >= 2:
 		yield CustomPersonNameMatcher()
-		fullNameValidators = { F_FIRST: lambda v: len(stripped(v)) > 1, F_LAST: lambda v: len(stripped(v)) > 2 }
-		yield CompositeRegexMatcher(F_PERSON, PAT_FIRST_NAME, { F_FIRST: 1},
-			ignoreCase = True, validators = fullNameValidators)
-		yield CompositeRegexMatcher(F_PERSON, PAT_FIRST_LAST_NAME, { F_FIRST: 1, F_LAST: 2 },
-			ignoreCase = True, validators = fullNameValidators)
-		yield CompositeRegexMatcher(F_PERSON, PAT_LAST_FIRST_NAME, { F_FIRST: 2, F_LAST: 1 },
-			ignoreCase = True, validators = fullNameValidators)
+		fullNameValidators = { F_FIRST: validate_stripped_first_name, F_LAST: validate_stripped_last_name }
+		yield PersonNameMatcher(F_PERSON, PersonNamePattern(first_names(), PN_FIRST, boundary = False), { F_FIRST: 1 },
+			validators = fullNameValidators)
+		yield PersonNameMatcher(F_PERSON, PersonNamePattern(first_names(), PN_FIRST_LAST, boundary = False), { F_FIRST: 1, F_LAST: 2 },
+			validators = fullNameValidators)
+		yield PersonNameMatcher(F_PERSON, PersonNamePattern(first_names(), PN_LAST_FIRST, boundary = False), { F_FIRST: 1, F_LAST: 2 },
+			validators = fullNameValidators)
 		yield CompositeRegexMatcher(F_PERSON, PAT_FIRSTINITIAL_LAST_NAME, { F_FIRST: 1, F_LAST: 2 },
 			ignoreCase = False, validators = fullNameValidators)
 		yield CompositeRegexMatcher(F_PERSON, PAT_LAST_FIRSTINITIAL_NAME, { F_FIRST: 2, F_LAST: 1 },
 			ignoreCase = False, validators = fullNameValidators)
 	yield CompositeMatcher(F_PERSON, [F_TITLE, F_FIRST])
 	# Negate person name matches when it's a street name
-	if lvl >= 0: yield RegexMatcher(F_PERSON, "(rue|avenue|av|boulevard|bvd|bd|chemin|route|place|allee) .{0,10} (%s)" % PAT_FIRST_NAME,
-		g = 1, ignoreCase = True, partial = True, neg = True)
+	if lvl >= 0: yield StreetNameMatcher(F_PERSON, first_names())
 
 	# Web stuff: Email, URL
 	PAT_EMAIL = "[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"
@@ -1754,9 +3670,9 @@ def generate_value_matchers(lvl = 0):
 		yield VariantExpander('country_fr_en.syn', targetType = F_COUNTRY, keepContext = True)
 
 	if lvl >= 2: 
-		yield TokenizedMatcher(F_CITY, COMMUNE_LEXICON, maxTokens = 3, stopWords = STOP_WORDS_CITY)
+		yield TokenizedMatcher(F_CITY, commune_lexicon(), maxTokens = 3, stopWords = STOP_WORDS_CITY)
 	elif lvl >= 0: 
-		yield LabelMatcher(F_CITY, COMMUNE_LEXICON, MATCH_MODE_EXACT, stopWords = STOP_WORDS_CITY)
+		yield LabelMatcher(F_CITY, commune_lexicon(), MATCH_MODE_EXACT, stopWords = STOP_WORDS_CITY)
 		yield RegexMatcher(F_CITY, "(commune|ville) +de+ ([A-Za-z /\-]+)", g = 1, ignoreCase = True, partial = True)
 
 	if lvl >= 2:
@@ -1887,10 +3803,44 @@ def post_process_headers(inferences, m):
 ### API method implementations (using Pandas DataFrames as input/output)
 
 def infer_types(tab, params = None):
-	'''  Infers column types for the input array and produces a dictionary of column name to likeliest types. '''
-	fields = parse_fields_from_Panda(tab)
+	'''  Infers column types for the input array and produces a dictionary of column name to likeliest types.
+
+		Supported params:
+		workers the number of worker processes used to run value matchers (defaults to 1)
+		dedup whether value matchers are run once per distinct value in each column (defaults to True)
+		sampling whether types are inferred from growing random batches of rows, until the type ranking
+			is settled (defaults to False)
+		sample_size the number of rows in the first batch (defaults to 1000)
+		sample_growth the size ratio between successive batches (defaults to 2)
+		confidence the confidence level used to decide that the type ranking is settled (defaults to .95)
+		vectorize whether matchers which have a vectorized implementation (regex and exact label matchers) run on
+			the columns as pandas Series rather than cell by cell (defaults to True)
+		scheduling whether value matchers are ordered by cost and selectivity, expensive ones being skipped on the
+			columns whose type is decided (defaults to False, ignored when sampling)
+		scheduler_stats the name of a JSON file holding matcher stats from a previous run, which is updated with
+			the stats of this run (defaults to None)
+		metrics whether performance metrics are collected during this call (defaults to False)
+
+		The output includes the number of rows evaluated per column, the date formats learned per column (see
+		DateFormatLearner), the decisions made by the scheduler and the performance metrics report (None unless
+		requested, see PerformanceMetrics.report). '''
+	workers = params.get('workers', 1) if params else 1
+	dedup = params.get('dedup', True) if params else True
+	metrics = metrics_params(params)
+	try:
+		fields = parse_fields_from_Panda(tab, vectorize = params.get('vectorize', True) if params else True)
+		scheduler = scheduling_params(params)
+		dateFormatsBefore = Counter(dateFormatInfo)
+		columnTypes = fields.infer_types(workers = workers, dedup = dedup, sampler = sampling_params(params), scheduler = scheduler)
+		if scheduler is not None and params.get('scheduler_stats'): scheduler.save(params['scheduler_stats'])
+	finally:
+		report = release_metrics(metrics)
 	return { 
-		'column_types': fields.infer_types(), 
+		'column_types': columnTypes, 
+		'evaluated_rows': dict(fields.evaluatedRows),
+		'date_formats': learned_date_formats(dateFormatInfo - dateFormatsBefore),
+		'scheduler_decisions': list(scheduler.decisions) if scheduler is not None else [],
+		'metrics': report,
 		'all_types': all_data_types(),
 		'type_tags': type_tags() }
 
@@ -1900,22 +3850,371 @@ def normalize_values(tab, params):
 
 		Based on those values, more than one additional column may be added to a given input field:
 		- extracted components for a composite type
-		- variants for a data type within a domain rich in lexical variations like synonyms, etc. '''
-	modified = pd.DataFrame(False, index=tab.index, columns=tab.columns)
-	fields = parse_fields_from_Panda(tab)
-	types = fields.infer_types()
-	for (originalField, newCol) in fields.normalize_values_in_place(types):
-		modified[originalField] = (tab[originalField] == newCol)
-		tab[originalField] = newCol #  = newCol.values
+		- variants for a data type within a domain rich in lexical variations like synonyms, etc.
+
+		Supported params: same as infer_types (when metrics are requested, the performance metrics report is returned
+		by last_metrics_report) '''
+	workers = params.get('workers', 1) if params else 1
+	dedup = params.get('dedup', True) if params else True
+	metrics = metrics_params(params)
+	import pandas as pd
+	try:
+		modified = pd.DataFrame(False, index=tab.index, columns=tab.columns)
+		fields = parse_fields_from_Panda(tab, vectorize = params.get('vectorize', True) if params else True)
+		scheduler = scheduling_params(params)
+		types = fields.infer_types(workers = workers, dedup = dedup, sampler = sampling_params(params), scheduler = scheduler)
+		if scheduler is not None and params.get('scheduler_stats'): scheduler.save(params['scheduler_stats'])
+		fields.complete_matching(types, dedup = dedup)
+		for (originalField, newCol) in fields.normalize_values_in_place(types):
+			modified[originalField] = (tab[originalField] == newCol)
+			tab[originalField] = newCol #  = newCol.values
+	finally:
+		release_metrics(metrics)
 	return tab, modified
 
+def append_rows(fields, tab, params = None):
+	''' Appends the rows of a DataFrame to a Fields instance whose types have been inferred (e.g. using
+		parse_fields_from_Panda then Fields.infer_types on the original table), rescoring column types incrementally.
+
+		Supported params: dedup and metrics (see infer_types)
+
+		Returns a dictionary holding the column types after the append, the sorted list of fields whose type changed,
+		and if there is none, the appended rows normalized in place along with the cells actually modified (as
+		returned by normalize_values). Otherwise both are None and the whole table should be normalized again. '''
+	dedup = params.get('dedup', True) if params else True
+	metrics = metrics_params(params)
+	import pandas as pd
+	start = fields.entries
+	try:
+		(types, changed) = fields.append_values({ h: list(c) for (h, c) in tab.items() }, dedup = dedup)
+		(normalized, modified) = (None, None)
+		if len(changed) < 1:
+			# The appended cells have all been matched, so the rows left out by sampling (if any) need not be completed
+			normalized = tab.copy()
+			modified = pd.DataFrame(False, index = tab.index, columns = tab.columns)
+			for (originalField, newCol) in fields.normalize_values_in_place(types, start = start):
+				if originalField not in tab.columns: continue
+				modified[originalField] = (tab[originalField] == newCol)
+				normalized[originalField] = newCol
+	finally:
+		report = release_metrics(metrics)
+	return {
+		'column_types': types,
+		'types_changed': sorted(changed),
+		'normalized': normalized,
+		'modified': modified,
+		'metrics': report }
+
 def sample_types_ilocs(tab, params, sample_params):
 	num_rows_to_display = sample_params.get('num_rows_to_display', 30)
 	randomize = sample_params.get('randomize', True)
+	import numpy as np
 	idxs = np.random.permutation(range(num_rows_to_display)) if randomize else range(num_rows_to_display)
 	row_idxs = idxs[:num_rows_to_display]
 	return row_idxs
 
+### Streaming normalization (for files that do not fit in memory)
+
+def row_chunks(rows, chunkSize):
+	''' Generates lists of at most chunkSize consecutive rows. '''
+	while True:
+		chunk = list(itertools.islice(rows, chunkSize))
+		if len(chunk) < 1: return
+		yield chunk
+
+def stream_normalize_in_place(fileName, delimiter, out, chunkSize = 10000, inferRows = 100000, workers = 1, dedup = True):
+	''' Produces the same output as the in-place normalization of the main method, while only holding a bounded
+		number of rows in memory:
+		- column types are inferred on the first inferRows rows (which must be positive, since these rows are held
+			in memory),
+		- the whole file is then read again in chunks of chunkSize rows, which are matched (positing the types posited
+			during inference) and normalized, while the output values of each column are spooled to a temporary file.
+
+		Results are identical to the in-memory path whenever the inferred types and posited types are the same,
+		in particular when inferRows covers the whole file. A warning is logged as soon as the values read so far would posit
+		a type which was not posited on the first rows (the diversity check resuming from the diversions of the inference),
+		since the output may then differ. '''
+	if inferRows <= 0: raise ValueError('Streaming normalization requires a positive number of rows to infer types from')
+	fields = parse_fields_from_CSV(fileName, delimiter, maxRows = inferRows)
+	types = fields.infer_types(workers = workers, dedup = dedup)
+	columns = list([(k, h.value, f.posited, f.diversions) for (k, (h, f)) in enumerate(fields.fields.items())])
+	del fields
+	for (k, fieldName, posited, diversions) in columns:
+		if fieldName not in types: logging.warning('No values to normalize for {}'.format(fieldName))
+	columns = list([col for col in columns if col[1] in types])
+	spools = { k: tempfile.TemporaryFile(mode = 'w+', encoding = 'utf-8') for (k, fieldName, posited, diversions) in columns }
+	vms = value_matchers()
+	rows = file_row_iter(fileName, delimiter, path = None)
+	next(rows, None)
+	entries = 0
+	warned = defaultdict(set)
+	for chunk in row_chunks(rows, chunkSize):
+		entries += len(chunk)
+		logging.info('Normalizing rows %d to %d', entries - len(chunk) + 1, entries)
+		for (k, fieldName, posited, diversions) in columns:
+			cells = Field([row[k] if len(row) > k else '' for row in chunk], fieldName).cells
+			(reps, dups) = group_cells_by_value(cells) if dedup else (cells, [])
+			with perfMetrics.stage('value_match'):
+				unseen = replay_field_values(reps, dups, vms, posited, diversions = diversions) - warned[k]
+			warned[k] |= unseen
+			if len(unseen) > 0:
+				logging.warning('Rows 1 to %d of %s posit types not posited on the first %d rows: %s (the output may differ from in-memory normalization)',
+					entries, fieldName, inferRows, ', '.join(sorted(unseen)))
+			memo = dict()
+			with perfMetrics.stage('normalize'):
+				for c in cells:
+					key = c.state_key()
+					if key not in memo: memo[key] = ', '.join(c.normalized_values_in_place(types[fieldName]))
+					print(memo[key], file = spools[k])
+	logging.info('Normalized %d rows in chunks of %d', entries, chunkSize)
+	with perfMetrics.stage('write'):
+		for (k, fieldName, posited, diversions) in columns:
+			print('Normalized', fieldName, file = out)
+			spools[k].seek(0)
+			shutil.copyfileobj(spools[k], out)
+			spools[k].close()
+
+### Output writers (consuming the columns generated by Fields.normalize_values)
+
+ROW_GROUP_SIZE = 65536 # Rows per chunk of spooled columns, i.e. per Parquet row group or Arrow record batch
+DICTIONARY_MAX_RATIO = .5 # Max ratio of distinct values to rows of a dictionary-encoded output column
+DICTIONARY_MAX_SIZE = 1 << 16 # Max number of distinct values of a dictionary-encoded output column
+WRITE_BUFFER_SIZE = 1 << 20
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+TEXT_FORMAT_SEPARATORS = { 'csv': ',', 'tsv': '\t' } # Named CSV output formats (otherwise the format is the separator)
+
+class ColumnSpool(object):
+	''' Spools output columns to temporary files as they are generated, in chunks of a fixed number of rows, so that they
+		can then be written row-wise or one row group at a time while holding a single column in memory.
+
+		The distinct values of each column are kept as long as they are few enough for it to be dictionary-encoded. '''
+	def __init__(self, entries, chunkSize = ROW_GROUP_SIZE):
+		self.entries = entries
+		self.chunkSize = chunkSize
+		self.spools = dict() # Insertion-ordered, from output field name to temporary file
+		self.dictionaries = dict() # Sorted distinct values of the low-cardinality columns
+	def add(self, name, values):
+		''' Spools a column, where each value is None, a string or a list of strings (flattened as in the CLI output). '''
+		if name in self.spools:
+			logging.warning('Replacing output field %s', name)
+			self.spools.pop(name).close()
+		spool = tempfile.TemporaryFile()
+		maxSize = min(DICTIONARY_MAX_SIZE, int(DICTIONARY_MAX_RATIO * self.entries))
+		distinct = set()
+		for i in range(0, self.entries, self.chunkSize):
+			chunk = list([None if v is None else flatten_list(v) for v in values[i:i + self.chunkSize]])
+			if distinct is not None:
+				distinct.update(chunk)
+				if len(distinct) > maxSize + 1: distinct = None
+			pickle.dump(chunk, spool, pickle.HIGHEST_PROTOCOL)
+		self.spools[name] = spool
+		if distinct is not None:
+			distinct.discard(None)
+			if len(distinct) <= maxSize: self.dictionaries[name] = sorted(distinct)
+		else: self.dictionaries.pop(name, None)
+	def names(self): return list(self.spools.keys())
+	def chunks(self):
+		''' Generates the successive chunks of rows, each as a list of column slices. '''
+		for spool in self.spools.values(): spool.seek(0)
+		for i in range(0, self.entries, self.chunkSize):
+			yield list([pickle.load(spool) for spool in self.spools.values()])
+	def close(self):
+		for spool in self.spools.values(): spool.close()
+		self.spools.clear()
+
+def spool_columns(columns, entries, chunkSize = ROW_GROUP_SIZE):
+	''' Returns a ColumnSpool holding the (output field name, values) pairs generated by Fields.normalize_values. '''
+	spool = ColumnSpool(entries, chunkSize)
+	for (of, values) in columns:
+		with perfMetrics.stage('write'): spool.add(of, values)
+	return spool
+
+def write_text_columns(spool, out, outputFormat):
+	''' Writes spooled columns to a text stream, as a markdown table if outputFormat is "md", otherwise as CSV with
+		outputFormat as the separator (or the one named in TEXT_FORMAT_SEPARATORS). '''
+	names = spool.names()
+	if outputFormat == 'md':
+		print('|{}|'.format('|'.join(names)), file = out)
+		print('|{}|'.format('|'.join('-' * len(names))), file = out)
+		for chunk in spool.chunks():
+			out.writelines('|{}|\n'.format('|'.join(['' if v is None else v for v in row])) for row in zip(*chunk))
+	else:
+		writer = csv.writer(out, delimiter = TEXT_FORMAT_SEPARATORS.get(outputFormat, outputFormat), lineterminator = '\n')
+		writer.writerow(names)
+		for chunk in spool.chunks(): writer.writerows(zip(*chunk))
+
+def arrow_schema(spool):
+	import pyarrow as pa
+	return pa.schema([pa.field(name, pa.dictionary(pa.int32(), pa.string()) if name in spool.dictionaries else pa.string())
+		for name in spool.names()])
+
+def arrow_tables(spool, schema):
+	''' Generates a pyarrow Table per chunk of spooled rows, the low-cardinality columns being dictionary-encoded with
+		the same dictionary in all chunks. '''
+	import pyarrow as pa
+	dictionaries = { name: (pa.array(vs, pa.string()), { v: i for (i, v) in enumerate(vs) }) for (name, vs) in spool.dictionaries.items() }
+	for chunk in spool.chunks():
+		arrays = list()
+		for (name, values) in zip(spool.names(), chunk):
+			if name in dictionaries:
+				(dictionary, ids) = dictionaries[name]
+				indices = pa.array([None if v is None else ids[v] for v in values], pa.int32())
+				arrays.append(pa.DictionaryArray.from_arrays(indices, dictionary))
+			else:
+				arrays.append(pa.array(values, pa.string()))
+		yield pa.Table.from_arrays(arrays, schema = schema)
+
+def write_columnar(spool, fileName, outputFormat):
+	''' Writes spooled columns to a Parquet file (one row group per chunk) or an Arrow IPC file (one record batch per
+		chunk), depending on outputFormat. '''
+	schema = arrow_schema(spool)
+	if outputFormat == 'parquet':
+		import pyarrow.parquet as pq
+		with pq.ParquetWriter(fileName, schema, use_dictionary = list(spool.dictionaries.keys())) as writer:
+			for table in arrow_tables(spool, schema): writer.write_table(table)
+	else:
+		import pyarrow as pa
+		with pa.OSFile(fileName, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+			for table in arrow_tables(spool, schema): writer.write_table(table)
+
+def write_normalized_values(columns, entries, out, outputFormat, chunkSize = ROW_GROUP_SIZE):
+	''' Writes the (output field name, values) pairs generated by Fields.normalize_values for a table of that many rows,
+		spooling them column by column before writing them in chunks of rows.
+
+		Parameters:
+		out a file path, or a text stream (e.g. sys.stdout) if outputFormat is not one of the COLUMNAR_FORMATS
+		outputFormat "parquet", "arrow", "md" for a markdown table, "csv", "tsv" or a separator character for CSV output
+
+		Returns the list of output field names. '''
+	spool = spool_columns(columns, entries, chunkSize)
+	try:
+		with perfMetrics.stage('write'):
+			if outputFormat in COLUMNAR_FORMATS:
+				write_columnar(spool, out, outputFormat)
+			elif isinstance(out, str):
+				with open(out, 'w', encoding = 'utf-8', newline = '', buffering = WRITE_BUFFER_SIZE) as f:
+					write_text_columns(spool, f, outputFormat)
+			else:
+				write_text_columns(spool, out, outputFormat)
+		return spool.names()
+	finally:
+		spool.close()
+
+### Batch inference (several files sharing one set of matchers)
+
+BATCH_FILE_EXTENSIONS = ('.csv', '.col')
+BATCH_DELIMITERS = ';,|\t'
+
+def batch_files(source):
+	''' Returns the paths of the CSV and column files to process, given either a directory (whose files with one of the
+		BATCH_FILE_EXTENSIONS are taken in name order) or a manifest listing one path per line (relative to the
+		manifest's directory, empty lines and lines starting with # being ignored). '''
+	if os.path.isdir(source):
+		return list([os.path.join(source, fileName) for fileName in sorted(os.listdir(source))
+			if fileName.endswith(BATCH_FILE_EXTENSIONS) and os.path.isfile(os.path.join(source, fileName))])
+	root = os.path.dirname(source)
+	return list([os.path.join(root, line) for line in file_to_list(source, path = None) if line and not line.startswith('#')])
+
+def guess_delimiter(fileName, candidates = BATCH_DELIMITERS):
+	''' Returns the candidate delimiter occurring most often in the header line of a CSV file (the first one on ties). '''
+	with open(fileName, mode = 'r') as f: header = f.readline()
+	return max(candidates, key = lambda d: (header.count(d), -candidates.index(d)))
+
+def parse_fields_from_column_file(fileName):
+	''' Takes the path of a column file (the header on the first line, then one value per line) as input, returns an
+		instance of the Fields class. '''
+	with perfMetrics.stage('load'):
+		a = file_to_list(fileName, path = None)
+		return Fields({ Cell(a[0], a[0]): Field(a[1:], a[0]) }, len(a) - 1) if len(a) > 0 else Fields({ }, 0)
+
+def infer_file_types(unit):
+	''' Infers the column types of a single file of a batch (in the calling process, with the matchers it holds).
+
+		Returns the file's type report: number of rows and columns, column types, rows evaluated per column and
+		elapsed time (or the error which prevented processing the file). '''
+	(fileName, delimiter, dedup, sampler) = unit
+	start = time.perf_counter()
+	report = { 'file': fileName }
+	try:
+		if fileName.endswith('.col'):
+			fields = parse_fields_from_column_file(fileName)
+		else:
+			report['delimiter'] = delimiter if delimiter else guess_delimiter(fileName)
+			fields = parse_fields_from_CSV(fileName, report['delimiter'])
+		report['column_types'] = fields.infer_types(dedup = dedup, sampler = sampler)
+	except Exception as e: # A single bad file must not abort the batch
+		logging.exception('Could not infer types for %s', fileName)
+		report['error'] = '{}: {}'.format(type(e).__name__, e)
+		fields = Fields({ }, 0)
+	report['rows'] = fields.entries
+	report['columns'] = len(fields.fields)
+	report['evaluated_rows'] = dict(fields.evaluatedRows)
+	report['elapsed'] = time.perf_counter() - start
+	return report
+
+def batch_infer_types(source, reportDir, workers = 1, delimiter = None, dedup = True, sampler = None):
+	''' Infers the column types of a batch of files (see batch_files), writing the type report of each file (see
+		infer_file_types) to reportDir as a JSON file named after it, along with a throughput summary (summary.json).
+
+		The header and value matchers are built once, before processing the files in a pool of at most that many
+		worker processes (which then share the warm matchers when processes are forked).
+
+		Returns the throughput summary. '''
+	start = time.perf_counter()
+	fileNames = batch_files(source)
+	header_matchers()
+	value_matchers()
+	warmup = time.perf_counter() - start
+	logging.info('Warmed up matchers in %.3fs, processing %d files with %d workers', warmup, len(fileNames), workers)
+	os.makedirs(reportDir, exist_ok = True)
+	units = list([(fileName, delimiter, dedup, sampler) for fileName in fileNames])
+	reportNames = set()
+	summary = Counter()
+	def write_report(report):
+		name = os.path.basename(report['file'])
+		while name in reportNames: name = '_' + name
+		reportNames.add(name)
+		with open(os.path.join(reportDir, name + '.json'), 'w') as f: json.dump(report, f, indent = 2, ensure_ascii = False)
+		summary['files'] += 1
+		summary['failed'] += 1 if 'error' in report else 0
+		summary['rows'] += report['rows']
+		summary['cells'] += report['rows'] * report['columns']
+		summary['typed_columns'] += len(report.get('column_types', { }))
+		summary['columns'] += report['columns']
+		summary['file_time'] += report['elapsed']
+		logging.info('Inferred types for %s: %d rows, %d columns in %.3fs', report['file'], report['rows'], report['columns'], report['elapsed'])
+	workers = min(workers, len(units))
+	if workers <= 1:
+		for unit in units: write_report(infer_file_types(unit))
+	else:
+		with multiprocessing.Pool(workers) as pool:
+			for report in pool.imap_unordered(infer_file_types, units): write_report(report)
+	summary = dict(summary)
+	summary['workers'] = max(workers, 1)
+	summary['warmup_time'] = warmup
+	summary['elapsed'] = time.perf_counter() - start
+	processing = summary['elapsed'] - warmup
+	summary['rows_per_sec'] = summary.get('rows', 0) / processing if processing > 0 else 0.
+	summary['cells_per_sec'] = summary.get('cells', 0) / processing if processing > 0 else 0.
+	with open(os.path.join(reportDir, 'summary.json'), 'w') as f: json.dump(summary, f, indent = 2)
+	return summary
+
+# Former module-level names of the lazily loaded resources, resolved on first access from outside this module
+LAZY_RESOURCES = {
+	'FRENCH_LEXICON': french_lexicon,
+	'PRENOM_LEXICON': prenom_lexicon,
+	'PATRONYME_LEXICON': patronyme_lexicon,
+	'COMMUNE_LEXICON': commune_lexicon,
+	'FIRST_NAMES': first_names,
+	'PERSON_NAME_EXTRACTION_PATS': person_name_extraction_pats,
+	'DDP': date_data_parser,
+	'DATE_FORMATS': date_formats
+}
+
+def __getattr__(name):
+	if name in LAZY_RESOURCES: return LAZY_RESOURCES[name]()
+	raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+
 ### Main method
 
 if __name__ == '__main__':
@@ -1927,53 +4226,81 @@ if __name__ == '__main__':
 	parser.add_option("-d", "--delimiter", dest = "delimiter",
 						help = "CSV delimiter")
 	parser.add_option("-f", "--output_format", dest = "of",
-						help = "Output format (md / csv)")
+						help = "Output format (md / csv / tsv / csv separator character / parquet / arrow)")
+	parser.add_option("-o", "--output", dest = "output",
+						help = "file to which the normalized fields are written as new columns (instead of in-place normalization)")
 	parser.add_option("-p", "--in_place", dest = "ip",
 						help = "in-place normalization")
+	parser.add_option("-w", "--workers", dest = "workers", type = "int", default = 1,
+						help = "number of worker processes for value matching")
+	parser.add_option("--build_snapshot", dest = "buildSnapshot", action = "store_true", default = False,
+						help = "build a snapshot of the value matchers for faster startup, then exit")
+	parser.add_option("--stream", dest = "stream", action = "store_true", default = False,
+						help = "streaming in-place normalization with bounded memory")
+	parser.add_option("--chunk_size", dest = "chunkSize", type = "int", default = 10000,
+						help = "number of rows normalized at once in streaming mode")
+	parser.add_option("--infer_rows", dest = "inferRows", type = "int", default = 100000,
+						help = "number of leading rows used to infer types in streaming mode (held in memory, must be positive)")
+	parser.add_option("--schedule", dest = "schedule", action = "store_true", default = False,
+						help = "order value matchers by cost and selectivity, skipping expensive ones once a column's type is decided")
+	parser.add_option("--scheduler_stats", dest = "schedulerStats",
+						help = "JSON file of matcher stats loaded before scheduling and updated afterwards")
+	parser.add_option("--batch", dest = "batch",
+						help = "directory or manifest of CSV and column files whose types are inferred with the same matchers")
+	parser.add_option("--report_dir", dest = "reportDir", default = "log/batch",
+						help = "directory to which the type report of each file and the throughput summary are written in batch mode")
+	parser.add_option("--metrics", dest = "metricsFileName",
+						help = "JSON file to which performance metrics per stage and per (value matcher, column) are written")
 	(options, args) = parser.parse_args()
 	separator = options.delimiter if options.delimiter else '|'
 	outputFormat = options.of if options.of else separator
+	inPlace = options.output is None and outputFormat not in COLUMNAR_FORMATS # options.ip
+	if outputFormat in COLUMNAR_FORMATS and options.output is None: parser.error('{} output requires a file (-o)'.format(outputFormat))
+	if outputFormat not in COLUMNAR_FORMATS + ('md', ) and outputFormat not in TEXT_FORMAT_SEPARATORS and len(outputFormat) != 1:
+		parser.error('Unsupported output format: {} (expected md, csv, tsv, parquet, arrow or a single separator character)'.format(outputFormat))
+
+	if options.buildSnapshot:
+		print('Saved value matchers snapshot to', build_matcher_snapshot())
+		sys.exit()
+
+	if options.metricsFileName: enable_metrics()
+
+	if options.batch:
+		summary = batch_infer_types(options.batch, options.reportDir, workers = options.workers, delimiter = options.delimiter)
+		print(json.dumps(summary, indent = 2))
+		if options.metricsFileName: perfMetrics.save(options.metricsFileName)
+		sys.exit()
+
+	if options.stream:
+		if options.inferRows <= 0: parser.error('--infer_rows must be positive in streaming mode')
+		stream_normalize_in_place(options.srcFileName, separator, sys.stdout, chunkSize = options.chunkSize,
+			inferRows = options.inferRows, workers = options.workers)
+		if options.metricsFileName: perfMetrics.save(options.metricsFileName)
+		sys.exit()
+
 	fields = parse_fields_from_CSV(options.srcFileName, delimiter = separator)
-	inPlace = True # options.ip
+	scheduler = load_scheduler(options.schedulerStats) if options.schedule else None
 
 	# Single-pass method
 	# fields.process_values(outputFormat = outputFormat)
 
 	if inPlace:
 		# In-place normalization
-		types = fields.infer_types()
+		types = fields.infer_types(workers = options.workers, scheduler = scheduler)
+		if scheduler is not None and options.schedulerStats: scheduler.save(options.schedulerStats)
 		for (field, row) in fields.normalize_values_in_place(types):
-			print ('Normalized', field)
-			for value in row: print(value)
+			with perfMetrics.stage('write'):
+				print ('Normalized', field)
+				for value in row: print(value)
+		if options.metricsFileName: perfMetrics.save(options.metricsFileName)
 		sys.exit()
 
 	# With addition of new fields
-	res = list()
-	for i in range(fields.entries): res.append(dict())
-	types = fields.infer_types()
-	hofs = list()
-	for (of, vs) in fields.normalize_values(types):
-		hofs.append(of)
-		for i, v in enumerate(vs):
-			res[i][of] = v
-	# Output normalization results
-	ofs = sorted(uniq(hofs), key = outputFieldKey)
-	if outputFormat == 'md':
-		print('|{}|'.format('|'.join(ofs)))
-		print('|{}|'.format('|'.join('-' * len(ofs))))
-	else:
-		print(outputFormat.join(ofs))
-	for row in res:
-		if outputFormat == 'txt':
-			for k, v in row.items():
-				if not k.startswith('++'): print(k.rjust(60), str(v))
-			for k, v in row.items():
-				if k.startswith('++'): print(k.rjust(60), str(v))
-			print()
-		elif outputFormat == 'md':
-				print('|{}|'.format('|'.join([str(row[f]) if f in row else '' for f in ofs])))
-		else:
-				print(outputFormat.join([str(row[f]) if f in row else '' for f in ofs]))
+	types = fields.infer_types(workers = options.workers, scheduler = scheduler)
+	if scheduler is not None and options.schedulerStats: scheduler.save(options.schedulerStats)
+	# Output normalization results, one column at a time
+	ofs = write_normalized_values(fields.normalize_values(types), fields.entries, options.output, outputFormat)
+	logging.info('Wrote %d output fields to %s', len(ofs), options.output)
 	for key in timingInfo:
 		logging.info('TIMING for {}: {} calls, cumulated {} ms'.format(key, countInfo[key], int(timingInfo[key] / 1000)))
 	# Output run info
@@ -1986,3 +4313,4 @@ if __name__ == '__main__':
 	print('Replaced by columns', columnsReplaced)
 	allReplaced = sum([any([i < len(fields.modifiedByColumn[fieldName]) and fields.modifiedByColumn[fieldName][i] for fieldName in allFields]) for i in range(fields.entries)])
 	print('Total replaced', allReplaced)
+	if options.metricsFileName: perfMetrics.save(options.metricsFileName)
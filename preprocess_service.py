@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# Local HTTP service exposing the infer_types and normalize_values API functions of preprocess_fields_v3: matchers are
+# built once at startup and shared by a pool of forked worker processes, so that requests do not pay the module import
+# and matcher construction (usage: python preprocess_service.py [-p port] [-w workers]).
+#
+# POST /infer_types and /normalize_values take either a CSV body (Content-Type: text/csv, the delimiter and API params
+# being given in the query string) or a JSON body (Content-Type: application/json) of the form
+# { "data": { column: [values] } or [ { column: value } ], "params": { ... } }. GET /health and /metrics report the
+# state of the service.
+
+import csv, io, json, logging, multiprocessing, optparse, threading, time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import preprocess_fields_v3 as pf
+from CONFIG import SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_QUEUE_SIZE, SERVICE_MAX_REQUEST_BYTES, SERVICE_TIMEOUT
+
+ENDPOINTS = ('/infer_types', '/normalize_values')
+
+# API params which callers may set (the others, in particular those naming a file such as scheduler_stats, or workers, are
+# rejected since requests run in worker processes of the service with its own permissions)
+REQUEST_PARAMS = ('dedup', 'vectorize', 'sampling', 'sample_size', 'sample_growth', 'confidence', 'scheduling', 'metrics')
+
+class RequestError(Exception):
+	''' An error answered with the given HTTP status. '''
+	def __init__(self, status, message):
+		super(RequestError, self).__init__(message)
+		self.status = status
+
+def query_value(v):
+	''' Decodes a query string value as JSON when possible (e.g. true, 1000, .95), otherwise keeps it as a string. '''
+	try:
+		return json.loads(v)
+	except ValueError:
+		return v
+
+def parse_table(body, contentType, query):
+	''' Returns the DataFrame and API params of a request. '''
+	import pandas as pd
+	if contentType == 'text/csv':
+		params = { k: query_value(v) for (k, v) in query.items() if k != 'delimiter' }
+		tab = pd.read_csv(io.StringIO(body.decode('utf-8')), sep = query.get('delimiter', ','), dtype = str, keep_default_na = False)
+	elif contentType == 'application/json':
+		payload = json.loads(body.decode('utf-8'))
+		if not isinstance(payload, dict) or 'data' not in payload: raise ValueError('Missing data in JSON payload')
+		params = payload.get('params') or { }
+		tab = pd.DataFrame(payload['data']).fillna('').astype(str)
+	else:
+		raise RequestError(415, 'Unsupported content type: {}'.format(contentType))
+	if not isinstance(params, dict): raise ValueError('Invalid params: {}'.format(params))
+	params = dict(params)
+	rejected = sorted(set(params) - set(REQUEST_PARAMS))
+	if len(rejected) > 0: raise RequestError(400, 'Unsupported params: {}'.format(', '.join(rejected)))
+	return (tab, params)
+
+def run_request(unit):
+	''' Worker-side processing of a request to one of the ENDPOINTS, returning the HTTP status and the JSON response. '''
+	(path, body, contentType, query) = unit
+	try:
+		(tab, params) = parse_table(body, contentType, query)
+	except (ValueError, UnicodeDecodeError, csv.Error) as e:
+		return (400, { 'error': 'Invalid payload: {}'.format(e) })
+	except RequestError as e:
+		return (e.status, { 'error': str(e) })
+	params['workers'] = 1 # Worker processes cannot have children of their own
+	if path == '/infer_types':
+		return (200, pf.infer_types(tab, params))
+	(tab, modified) = pf.normalize_values(tab, params)
+	response = { 'data': tab.to_dict(orient = 'list'), 'modified': modified.to_dict(orient = 'list') }
+	if params.get('metrics'): response['metrics'] = pf.last_metrics_report()
+	return (200, response)
+
+class InferenceService(object):
+	''' Runs requests in a pool of worker processes forked once the matchers are built, admitting at most
+		workers + queueSize requests at once (the others being rejected rather than queued without bounds). '''
+	def __init__(self, workers = SERVICE_WORKERS, queueSize = SERVICE_QUEUE_SIZE, maxRequestBytes = SERVICE_MAX_REQUEST_BYTES,
+		timeout = SERVICE_TIMEOUT):
+		start = time.perf_counter()
+		pf.header_matchers()
+		self.matchers = len(pf.value_matchers())
+		self.warmup = time.perf_counter() - start
+		logging.info('Warmed up %d value matchers in %.3fs', self.matchers, self.warmup)
+		self.workers = workers
+		self.maxRequestBytes = maxRequestBytes
+		self.timeout = timeout
+		self.pool = multiprocessing.Pool(workers)
+		self.slots = threading.BoundedSemaphore(workers + queueSize)
+		self.lock = threading.Lock()
+		self.counts = Counter()
+		self.latencies = defaultdict(pf.LatencyHistogram)
+		self.pending = 0
+		self.started = time.time()
+	def count(self, key, n = 1):
+		with self.lock: self.counts[key] += n
+	def submit(self, unit):
+		''' Runs a request in the pool and returns its status and JSON response, or raises a RequestError if the service
+			is saturated or the request times out (its slot being released only once it has actually completed). '''
+		if not self.slots.acquire(blocking = False): raise RequestError(503, 'Too many pending requests')
+		with self.lock: self.pending += 1
+		def done(result):
+			with self.lock: self.pending -= 1
+			self.slots.release()
+		try:
+			result = self.pool.apply_async(run_request, (unit, ), callback = done, error_callback = done)
+		except Exception:
+			done(None)
+			raise
+		try:
+			return result.get(self.timeout)
+		except multiprocessing.TimeoutError:
+			raise RequestError(504, 'Request timed out after {}s'.format(self.timeout))
+	def record(self, path, status, seconds):
+		with self.lock:
+			self.counts['requests'] += 1
+			self.counts['status_{}'.format(status)] += 1
+			self.latencies[path].add(seconds * pf.MICROS_PER_SEC)
+	def health(self):
+		return { 'status': 'ok', 'workers': self.workers, 'value_matchers': self.matchers,
+			'uptime': time.time() - self.started }
+	def metrics(self):
+		''' Returns the request counters (overall and per HTTP status), the number of requests being processed or
+			waiting for a worker, and the latency percentiles (in milliseconds) per endpoint. '''
+		with self.lock:
+			return { 'counts': dict(self.counts), 'pending': self.pending, 'warmup_time': self.warmup,
+				'uptime': time.time() - self.started,
+				'latencies': { path: { 'requests': h.n, 'p50_ms': h.percentile(50) / 1000., 'p95_ms': h.percentile(95) / 1000.,
+					'p99_ms': h.percentile(99) / 1000. } for (path, h) in self.latencies.items() } }
+	def close(self):
+		self.pool.terminate()
+		self.pool.join()
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+	''' Routes the requests of an HTTP server whose service attribute is an InferenceService. '''
+	def send_json(self, status, response):
+		body = json.dumps(response, ensure_ascii = False, default = str).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json; charset=utf-8')
+		self.send_header('Content-Length', str(len(body)))
+		if status == 503: self.send_header('Retry-After', '1')
+		self.end_headers()
+		self.wfile.write(body)
+	def content_length(self):
+		length = self.headers.get('Content-Length')
+		if length is None: raise RequestError(411, 'Missing Content-Length')
+		try:
+			return int(length)
+		except ValueError:
+			raise RequestError(400, 'Invalid Content-Length: {}'.format(length))
+	def do_GET(self):
+		service = self.server.service
+		path = urlsplit(self.path).path
+		if path == '/health': self.send_json(200, service.health())
+		elif path == '/metrics': self.send_json(200, service.metrics())
+		else: self.send_json(404, { 'error': 'Unknown endpoint: {}'.format(path) })
+	def do_POST(self):
+		service = self.server.service
+		start = time.perf_counter()
+		url = urlsplit(self.path)
+		try:
+			if url.path not in ENDPOINTS: raise RequestError(404, 'Unknown endpoint: {}'.format(url.path))
+			length = self.content_length()
+			if length > service.maxRequestBytes:
+				self.close_connection = True # The body is not read
+				raise RequestError(413, 'Request body exceeds {} bytes'.format(service.maxRequestBytes))
+			body = self.rfile.read(length)
+			service.count('bytes_in', len(body))
+			contentType = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+			(status, response) = service.submit((url.path, body, contentType, dict(parse_qsl(url.query))))
+		except RequestError as e:
+			(status, response) = (e.status, { 'error': str(e) })
+		except Exception as e:
+			logging.exception('Failed processing request to %s', url.path)
+			(status, response) = (500, { 'error': str(e) })
+		self.send_json(status, response)
+		service.record(url.path, status, time.perf_counter() - start)
+	def log_message(self, format, *args):
+		logging.info('%s - %s', self.address_string(), format % args)
+
+def start_service(host = SERVICE_HOST, port = SERVICE_PORT, **kwargs):
+	''' Returns an HTTP server bound to the given address (port 0 picking a free port), whose service holds warm
+		matchers (see InferenceService for the other parameters). Requests are served by calling serve_forever. '''
+	service = InferenceService(**kwargs)
+	server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+	server.daemon_threads = True
+	server.service = service
+	logging.info('Inference service listening on %s:%d', *server.server_address[:2])
+	return server
+
+def stop_service(server):
+	server.shutdown()
+	server.server_close()
+	server.service.close()
+
+if __name__ == '__main__':
+	logging.basicConfig(filename = 'log/preprocess_service.log', level = logging.INFO)
+	parser = optparse.OptionParser()
+	parser.add_option("--host", dest = "host", default = SERVICE_HOST,
+						help = "interface on which the service listens")
+	parser.add_option("-p", "--port", dest = "port", type = "int", default = SERVICE_PORT,
+						help = "port on which the service listens")
+	parser.add_option("-w", "--workers", dest = "workers", type = "int", default = SERVICE_WORKERS,
+						help = "number of worker processes running the requests")
+	parser.add_option("-q", "--queue_size", dest = "queueSize", type = "int", default = SERVICE_QUEUE_SIZE,
+						help = "number of requests waiting for a worker beyond which the service answers 503")
+	parser.add_option("--max_request_bytes", dest = "maxRequestBytes", type = "int", default = SERVICE_MAX_REQUEST_BYTES,
+						help = "largest request body accepted by the service")
+	(options, args) = parser.parse_args()
+	server = start_service(options.host, options.port, workers = options.workers, queueSize = options.queueSize,
+		maxRequestBytes = options.maxRequestBytes)
+	print('Serving on http://{}:{}'.format(*server.server_address[:2]))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		server.service.close()
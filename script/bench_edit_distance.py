@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# Compares the batch edit distance kernel of preprocess_fields_v3 with the former per-pair edit_dist on the candidates
+# returned by a commune lexicon lookup (usage: python script/bench_edit_distance.py [number of lexicon entries])
+
+import sys, os, random, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import preprocess_fields_v3 as pf
+
+MAX_DIST = 2
+
+def perturbed(w, rnd):
+	''' Returns a copy of a word with one or two random character edits. '''
+	for k in range(rnd.randint(1, 2)):
+		i = rnd.randrange(len(w) + 1)
+		op = rnd.choice('ids')
+		if op == 'i': w = w[:i] + rnd.choice('abcdefghijklmnopqrstuvwxyz') + w[i:]
+		elif op == 'd': w = w[:i] + w[i + 1:]
+		else: w = w[:i] + rnd.choice('abcdefghijklmnopqrstuvwxyz') + w[i + 1:]
+	return w
+
+def candidate_batches(size, queries, seed = 0):
+	''' Returns (query, candidates) pairs for perturbed lexicon entries. '''
+	rnd = random.Random(seed)
+	words = sorted(pf.validated_lexical_map(pf.commune_lexicon()).keys())
+	if 0 < size < len(words): words = rnd.sample(words, size)
+	fss = pf.build_fast_sim_struct(words)
+	return list([(q, fss.candidates(q)) for q in (perturbed(rnd.choice(words), rnd) for i in range(queries))])
+
+def bench(batches):
+	start = time.perf_counter()
+	ref = list([[d for d in (pf.edit_dist(w, q) for w in ws)] for (q, ws) in batches])
+	refTime = time.perf_counter() - start
+	start = time.perf_counter()
+	res = list([pf.edit_distances(q, ws, maxDist = MAX_DIST) for (q, ws) in batches])
+	batchTime = time.perf_counter() - start
+	for (r1, r2) in zip(ref, res):
+		assert list([min(d, MAX_DIST + 1) for d in r1]) == r2, 'Distances differ'
+	return (refTime, batchTime)
+
+if __name__ == '__main__':
+	size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+	batches = candidate_batches(size, 1000)
+	pairs = sum(len(ws) for (q, ws) in batches)
+	(refTime, batchTime) = bench(batches)
+	print('{} queries, {} candidate pairs ({:.1f} per query)'.format(len(batches), pairs, pairs / len(batches)))
+	print('edit_dist:       {:8.1f} ms ({:.2f} us per pair)'.format(refTime * 1000, refTime * 1e6 / pairs))
+	print('edit_distances:  {:8.1f} ms ({:.2f} us per pair)'.format(batchTime * 1000, batchTime * 1e6 / pairs))
+	print('Speedup: {:.1f}x'.format(refTime / batchTime))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# Measures the memory held by the inference state of preprocess_fields_v3 after running all value matchers
+# on the test_data/columns files (usage: python script/measure_memory.py [column files])
+
+import sys, os, glob, logging, tracemalloc, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pandas as pd
+import preprocess_fields_v3 as pf
+
+def load_columns(fileNames):
+	''' Returns one single-column DataFrame per file (columns have different lengths). '''
+	dfs = list()
+	for fileName in fileNames:
+		vs = pf.file_to_list(fileName, path = None)
+		dfs.append(pd.DataFrame({ vs[0]: vs[1:] }))
+	return dfs
+
+def measure(fileNames):
+	''' Returns the number of cells, the number of bytes allocated for the inference state (as traced after matching),
+		the peak number of bytes allocated while matching and the elapsed time. '''
+	dfs = load_columns(fileNames)
+	pf.value_matchers()
+	tracemalloc.start()
+	start = time.time()
+	fields = pf.Fields(dict(), 0)
+	for df in dfs: fields.fields.update(pf.parse_fields_from_Panda(df).fields)
+	fields.match_headers_and_values()
+	elapsed = time.time() - start
+	(current, peak) = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return (sum(df.shape[0] for df in dfs), current, peak, elapsed)
+
+if __name__ == '__main__':
+	logging.basicConfig(level = logging.WARNING)
+	fileNames = sys.argv[1:] if len(sys.argv) > 1 else sorted(glob.glob(os.path.join('test_data', 'columns', '*.col')))
+	(cells, current, peak, elapsed) = measure(fileNames)
+	print('Cells: {}'.format(cells))
+	print('Retained after matching: {:.1f} MB ({:.0f} bytes per cell)'.format(current / 1e6, current / cells))
+	print('Peak while matching: {:.1f} MB'.format(peak / 1e6))
+	print('Elapsed: {:.1f} s'.format(elapsed))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# Measures the startup cost of the inference/normalization modules, each scenario being run in a fresh interpreter
+# (usage: python script/measure_startup.py [number of runs per scenario])
+
+import sys, os, subprocess, statistics, json
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Modules which should only be imported by the code paths that actually need them
+HEAVY_MODULES = ['pandas', 'numpy', 'fuzzywuzzy', 'dateparser', 'phonenumbers', 'enchant', 'postal']
+
+# Startup budget in milliseconds per scenario (see the README)
+SCENARIOS = [
+	('import preprocess_fields_v3', 150, 'import preprocess_fields_v3'),
+	('header-only inference', 300, '''
+import preprocess_fields_v3 as pf
+headers = pf.file_row_iter('test_data/frenchtech.csv', ';', path = None).__next__()
+fields = pf.Fields(dict([(pf.Cell(h, None), pf.Field([], h)) for h in headers]), 0)
+for hm in pf.header_matchers():
+	for hc in fields.fields.keys(): hm.match(hc)
+'''),
+	('import gridder', 150, 'import gridder')
+]
+
+PROBE = '''
+import sys, time, json
+start = time.perf_counter()
+exec(compile({!r}, '<scenario>', 'exec'))
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(m for m in {!r} if m in sys.modules)]))
+'''
+
+def run_scenario(code, runs):
+	''' Returns the median elapsed time (in seconds) of a scenario over several fresh interpreters, and the heavy
+		modules it imported. '''
+	timings = list()
+	for i in range(runs):
+		out = subprocess.run([sys.executable, '-c', PROBE.format(code, HEAVY_MODULES)], cwd = ROOT,
+			stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, check = True, universal_newlines = True).stdout
+		(elapsed, modules) = json.loads(out.strip().splitlines()[-1])
+		timings.append(elapsed)
+	return (statistics.median(timings), modules)
+
+if __name__ == '__main__':
+	runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+	overBudget = 0
+	for (name, budget, code) in SCENARIOS:
+		try:
+			(elapsed, modules) = run_scenario(code, runs)
+		except subprocess.CalledProcessError:
+			print('{:<30} FAILED'.format(name))
+			overBudget += 1
+			continue
+		status = 'OK' if elapsed * 1000 <= budget else 'OVER BUDGET'
+		if elapsed * 1000 > budget: overBudget += 1
+		print('{:<30} {:>7.1f} ms (budget {} ms) {:<12} heavy modules: {}'.format(name, elapsed * 1000, budget, status,
+			', '.join(modules) if modules else 'none'))
+	sys.exit(1 if overBudget > 0 else 0)
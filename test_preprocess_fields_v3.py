@@ -2,7 +2,7 @@
 # coding=utf-8
 
 import unittest, logging, functools, sys, re
-from collections import defaultdict
+from collections import defaultdict, Counter
 from preprocess_fields_v3 import *
 
 class TestCustomAddressMatcher(CustomAddressMatcher):
@@ -84,6 +84,24 @@ class TestTokenizedMatcher(TokenizedMatcher):
 
 class ParseValuesTestCase(unittest.TestCase):
 
+	def setUp(self):
+		self.valueMatchers = list(VALUE_MATCHERS)
+
+	def tearDown(self):
+		VALUE_MATCHERS[:] = self.valueMatchers
+
+	def useValueMatchers(self, vms):
+		''' Replaces the value matchers (see value_matchers) until the end of the test. '''
+		VALUE_MATCHERS[:] = vms
+		return vms
+
+	def checkSameRuns(self, run, variants):
+		''' Calls run on each variant, checks that all calls return the same result and returns it. '''
+		results = list([run(v) for v in variants])
+		for (v, res) in zip(variants[1:], results[1:]):
+			self.assertEqual(res, results[0], 'Results for {} differ from those for {}'.format(v, variants[0]))
+		return results[0]
+
 	def checkMatcher(self, tm, pairs):
 		for (value, ref) in pairs:
 			tm.match(value)
@@ -113,6 +131,142 @@ class ParseValuesTestCase(unittest.TestCase):
 			# ('49859345800025', '49859345800025'),
 			('49859345800026', None)])
 
+	def testRegexSet(self):
+		vms = [RegexMatcher(F_SIREN, "[0-9]{9}"), RegexMatcher(F_ZIP, "[0-9]{5}"), RegexMatcher(F_YEAR, "19[0-9]{2}"),
+			RegexMatcher(F_ACADEMIE, "acad.mie", ignoreCase = True),
+			RegexMatcher(F_CITY, "(commune|ville) +de+ ([A-Za-z /\-]+)", g = 1, ignoreCase = True),
+			CompositeRegexMatcher(F_PERSON, PAT_FIRSTINITIAL_LAST_NAME, { F_FIRST: 1, F_LAST: 2 })]
+		rs = compile_regex_set(vms)
+		for v in ['542065479', '75005', '1954', 'Académie de Lyon', 'ACADEMIE', 'Ville de Paris', 'J. Dupont', 'Lyon', '']:
+			for vm in vms:
+				m1, m2 = vm.r.match(v), rs.match(vm, v)
+				self.assertEqual(m1 is None, m2 is None, '{} disagrees with its regex set on "{}"'.format(vm, v))
+				if m1 is None: continue
+				for g in range(vm.r.groups + 1):
+					self.assertEqual((m1.group(g), m1.span(g)), (m2.group(g), m2.span(g)),
+						'{} disagrees with its regex set on group {} of "{}"'.format(vm, g, v))
+
+	def testVectorizedMatchers(self):
+		vms = [RegexMatcher(F_SIREN, "[0-9]{9}"), RegexMatcher(F_ZIP, "[0-9]{5}"),
+			RegexMatcher(F_CITY, "(commune|ville) +de+ ([A-Za-z /\-]+)", g = 1, ignoreCase = True),
+			RegexMatcher(F_YEAR, "19[0-9]{2}", neg = True),
+			CompositeRegexMatcher(F_PERSON, PAT_FIRSTINITIAL_LAST_NAME, { F_FIRST: 1, F_LAST: 2 }),
+			LabelMatcher(F_CITY, ['Paris', 'Lyon', 'Saint-Étienne'], MATCH_MODE_EXACT)]
+		values = ['542065479', '75005', '1954', 'Ville de Paris', 'J. Dupont', 'Lyon', 'SAINT ETIENNE', '', 'Lyon']
+		stores = list()
+		for vectorize in (False, True):
+			for rs in (None, compile_regex_set(vms)):
+				f = Field(values, 'Test')
+				match_field_values('Test', f.cells, vms, vectorize = vectorize)
+				stores.append([list([(e, f.store.symbols[f.store.types[e]], f.store.modes[e], f.store.symbols[f.store.hits[e]])
+					for e in f.store.entries(c.row)]) for c in f.cells])
+				for vm in vms: vm.scanner = None
+		for store in stores[1:]: self.assertEqual(store, stores[0])
+
+	def testMatcherScheduler(self):
+		vms = [RegexMatcher(F_YEAR, "19[0-9]{2}"), TokenizedMatcher(F_APB_MENTION, ['Sciences de la vie', 'Droit']),
+			RegexMatcher(F_ZIP, "[0-9]{5}"), LabelMatcher(F_CITY, ['Paris', 'Lyon', 'Nantes'], MATCH_MODE_EXACT)]
+		scheduler = MatcherScheduler(stats = { matcher_key(vms[3]): [10, 1e-5, 10] })
+		self.assertEqual(scheduler.order(vms, 'Test'), [vms[3], vms[0], vms[1], vms[2]])
+		f = Field(['Paris', 'Lyon', 'Nantes', 'Paris'], 'Test')
+		match_field_values('Test', f.cells, vms, scheduler = scheduler)
+		self.assertEqual([d[1] for d in scheduler.decisions], [matcher_key(vms[1])])
+		self.assertEqual(scheduler.observed[matcher_key(vms[0])][0], 3)
+		# Keys do not depend on the position of the matchers, but tell apart those of the same class and type
+		keys = matcher_keys(vms)
+		self.assertEqual(matcher_keys(vms[::-1]), keys)
+		self.assertEqual([matcher_key(vm) for vm in [RegexMatcher(F_ZIP, "[0-9]{5}"), LabelMatcher(F_CITY, ['Nantes', 'Lyon', 'Paris'], MATCH_MODE_EXACT)]],
+			[keys[id(vms[2])], keys[id(vms[3])]])
+		self.assertNotEqual(matcher_key(RegexMatcher(F_ZIP, "[0-9]{4}")), keys[id(vms[2])])
+		self.assertEqual(list(matcher_keys([vms[2], RegexMatcher(F_ZIP, "[0-9]{5}")]).values()), [keys[id(vms[2])], keys[id(vms[2])] + '#2'])
+		# Signatures leave the match methods timed
+		calls = Counter(countInfo)
+		for vm in [PersonNameMatcher(F_PERSON, PersonNamePattern(first_names(), PN_FIRST_LAST), { F_FIRST: 1, F_LAST: 2 }), AcronymMatcher()]:
+			matcher_key(vm)
+			vm.match(Cell('Marie Durand', 'Test'))
+		self.assertEqual(Counter(countInfo) - calls, Counter(['PersonNameMatcher.match', 'AcronymMatcher.match']))
+
+	def testPerformanceMetrics(self):
+		h = LatencyHistogram()
+		for us in range(1, 101): h.add(us)
+		for (p, ref) in [(50, 50), (95, 95), (99, 99)]:
+			self.assertTrue(ref <= h.percentile(p) <= ref * 2 ** (1 / h.BUCKETS_PER_OCTAVE))
+		vms = [RegexMatcher(F_ZIP, "[0-9]{5}"), LabelMatcher(F_CITY, ['Paris', 'Lyon'], MATCH_MODE_EXACT)]
+		metrics = enable_metrics()
+		try:
+			f = Field(['75005', 'Paris', 'Lyon', 'Paris'], 'Test')
+			match_field_values('Test', f.cells, vms)
+		finally:
+			enable_metrics(False)
+		report = dict([(m['matcher'], m) for m in metrics.report()['matchers']])
+		self.assertEqual(report[matcher_key(vms[1])]['calls'], 3)
+		self.assertEqual(report[matcher_key(vms[1])]['hits'], 2)
+		self.assertEqual(report[matcher_key(vms[0])]['hits'], 1)
+		import pandas as pd, preprocess_fields_v3
+		self.useValueMatchers(vms)
+		def normalize(metrics):
+			res = normalize_values(pd.DataFrame({ 'Ville': ['Paris', 'lyon'] }), { 'metrics': metrics })
+			self.assertEqual(last_metrics_report() is None, not metrics)
+			return list([r.to_dict(orient = 'list') for r in res])
+		self.assertEqual(self.checkSameRuns(normalize, [True, False]), [{ 'Ville': ['Paris', 'Lyon'] }, { 'Ville': [True, False] }])
+		normalize_values(pd.DataFrame({ 'Ville': ['Paris'] }), { 'metrics': True })
+		self.assertIn('value_match', [s['stage'] for s in last_metrics_report()['stages']])
+		self.assertRaises(AttributeError, normalize_values, None, { 'metrics': True })
+		self.assertFalse(preprocess_fields_v3.perfMetrics.enabled)
+
+	def testPersonNamePattern(self):
+		for (order, src, ref) in [(PN_FIRST, 'Marie-Claire', ('Marie-Claire',)),
+									(PN_FIRST_LAST, 'Marie-Claire Durand', ('Marie-Claire', 'Durand')),
+									(PN_LAST_FIRST, 'BADIE Bertrand', ('Bertrand', 'BADIE')),
+									(PN_FIRST_LAST, 'Universite de Lyon', None)]:
+			m = PersonNamePattern(first_names(), order).match(src)
+			self.assertEqual(None if m is None else m.groups(), ref, 'Unexpected person name groups in "{}"'.format(src))
+		# Groups registered by the value matchers (the longest first name being retained)
+		validators = { F_FIRST: validate_stripped_first_name, F_LAST: validate_stripped_last_name }
+		for (order, src, ref) in [(PN_FIRST_LAST, 'Françoise Dupont', ('Françoise', 'Dupont')),
+									(PN_FIRST_LAST, 'Etienne Martin', ('Etienne', 'Martin')),
+									(PN_FIRST_LAST, 'Jean-Pierre Le Goff', ('Jean-Pierre', 'Le Goff')),
+									(PN_LAST_FIRST, 'DUPONT Françoise', ('Françoise', 'DUPONT')),
+									(PN_LAST_FIRST, 'MARTIN Etienne', ('Etienne', 'MARTIN')),
+									(PN_LAST_FIRST, 'LE GOFF Jean-Pierre', ('Jean-Pierre', 'LE GOFF'))]:
+			c = Cell(src, 'Test')
+			PersonNameMatcher(F_PERSON, PersonNamePattern(first_names(), order, boundary = False), { F_FIRST: 1, F_LAST: 2 },
+				validators = validators).match(c)
+			hits = dict([(c.store.symbols[c.store.types[e]], c.store.symbols[c.store.hits[e]]) for e in c.store.entries(c.row)])
+			self.assertEqual((hits.get(F_FIRST), hits.get(F_LAST)), ref, 'Unexpected person name in "{}"'.format(src))
+		self.assertTrue(first_name_in_street('12 rue Victor Hugo', first_names()))
+		self.assertTrue(first_name_in_street('bd du Parc Andre', first_names()))
+		# Street types and first names are delimited by word boundaries
+		for src in ['12 rue de Marcq', 'rue des Paulownias', 'Ecrue du Marc', 'Prue de Marc', 'Laboratoire Charue de Marc Dupont',
+			'bd du Parc Andrex']:
+			self.assertFalse(first_name_in_street(src, first_names()), 'Unexpected street name in "{}"'.format(src))
+
+	def testApproximateLookup(self):
+		fss = build_fast_sim_struct(['marseille', 'paris', 'lyon', 'nancy', 'nantes', 'saint etienne'])
+		self.assertEqual(fss.search('paris'), { 0: ['paris'], 1: [], 2: [] })
+		self.assertEqual(fss.search('marseile'), { 0: [], 1: ['marseille'], 2: [] })
+		self.assertEqual(fss.search('nantse'), { 0: [], 1: [], 2: ['nantes'] })
+		self.assertEqual(fss.search('lyn'), { 0: [], 1: ['lyon'], 2: [] })
+		self.assertEqual(fss.search('toulouse'), { 0: [], 1: [], 2: [] })
+		self.assertEqual(fss.memory_usage()['entries'], len(fss.hashes))
+
+	def testEditDistances(self):
+		words = ['', 'a', 'paris', 'pairs', 'parsi', 'marseille', 'pari', 'parisien']
+		for query in words:
+			for maxDist in (0, 1, 2, 10):
+				self.assertEqual(edit_distances(query, words, maxDist),
+					list([min(edit_dist(w, query), maxDist + 1) for w in words]))
+
+	def testProgressiveSampler(self):
+		sampler = ProgressiveSampler(sampleSize = 100, growth = 2)
+		batches = list(sampler.batches(1000))
+		self.assertEqual([len(b) for b in batches], [100, 200, 400, 300])
+		self.assertEqual(sorted(itertools.chain.from_iterable(batches)), list(range(1000)))
+		self.assertTrue(sampler.is_settled({ F_SIREN: 500 }, { }, 500))
+		self.assertFalse(sampler.is_settled({ F_SIREN: 490, F_ZIP: 480 }, { }, 500))
+		self.assertFalse(sampler.is_settled({ F_SIREN: 500 }, { F_ZIP: 100 }, 500))
+		self.assertFalse(sampler.is_settled({ F_SIREN: 50 }, { }, 500))
+
 	def testVariantExpansion(self):
 		self.checkMatcher(VariantExpander(fileToVariantMap('resource/etab_enssup.syn'), F_MESR, False, targetType = F_ETAB_ENSSUP), [
 			('ESPCI, 10 rue Vauquelin, 75231 Paris cedex 05', 'Ecole Superieure de Physique et Chimie Industrielles [ESPCI]'),
@@ -222,6 +376,301 @@ class ParseValuesTestCase(unittest.TestCase):
 			m = re.search(EMAIL_PATTERN + '$', v, 0)
 			self.assertTrue(m, 'Could not match email %s' % v)
 
+	def testOfflineGeocoder(self):
+		geocoder = build_offline_geocoder(['PARIS', 'LYON', 'NICE'], ['12 Rue de la Paix', 'Avenue Jean Jaurès'], postcodeFile = None)
+		props = geocoder.search('12 rue de la paix')['features'][0]['properties']
+		self.assertEqual((props['type'], props['housenumber'], props['street']), ('housenumber', '12', 'Rue de la Paix'))
+		self.assertEqual(geocoder.search('Lyon')['features'][0]['properties']['type'], 'municipality')
+		matcher = FrenchAddressMatcher(geocoder = geocoder, communes = ['PARIS', 'LYON', 'NICE'])
+		c = Cell('12 rue de la Paix', 'Test')
+		matcher.match(c)
+		self.assertEqual(set(c.store.symbols[c.store.types[e]] for e in c.store.entries(c.row)), set([F_ADDRESS, F_STREET, F_COUNTRY]))
+
+	def testDateFormatLearning(self):
+		matcher = CustomDateMatcher()
+		cells = list([Cell(v, 'Test') for v in ['03/04/2014', '12/25/2014', '01/02/2015', '2016']])
+		matcher.scanner.prepare(cells)
+		self.assertEqual([str(fmt) for fmt in matcher.scanner.formats], ['%m/%d/%Y', '%d/%m/%Y'])
+		for c in cells: matcher.match(c)
+		matcher.scanner.release()
+		self.assertEqual(list([c.store.symbols[c.store.hits[e]] for e in c.store.entries(c.row)] for c in cells[:2]),
+			[['4/3/2014'], ['25/12/2014']])
+		self.assertEqual(DateFormatLearner().parse('1er janvier 2014'), (2014, 1, 1, 'day'))
+		self.assertEqual(DateFormatLearner().parse('2014-04'), (2014, 4, 1, 'month'))
+
+	def testTokenTrie(self):
+		trie = TokenTrie()
+		for phrase in ['saint etienne', 'saint', 'etienne', 'saint etienne du rouvray']: trie.add(phrase.split(' '), phrase)
+		self.assertEqual(trie.scan(['mairie', 'saint', 'etienne', 'du', 'mont']), [(1, 3, 'saint etienne'), (1, 2, 'saint'), (2, 3, 'etienne')])
+		matcher = TokenizedMatcher(F_CITY, ['Saint Étienne', 'Lyon'], maxTokens = 3)
+		c = Cell('SAINT ÉTIENNE', 'Test')
+		matcher.match(c)
+		self.assertEqual([c.store.symbols[c.store.hits[e]] for e in c.store.entries(c.row)], [['Saint Étienne']])
+
+	def testLexiconSet(self):
+		values = ['Saint Étienne', 'Université de Lyon', 'Ville de Lyon', 'Droit', 'Lyon', '']
+		stores = list()
+		for shared in (False, True):
+			vms = [TokenizedMatcher(F_CITY, ['Saint Étienne', 'Lyon'], maxTokens = 3, stopWords = ['ville']),
+				TokenizedMatcher(F_ETAB_ENSSUP, ['Université de Lyon', 'Université Lyon 2'], maxTokens = 4),
+				TokenizedMatcher(F_APB_MENTION, ['Droit', 'Sciences de la vie'], maxTokens = 4)]
+			if shared: self.assertIsNotNone(compile_lexicon_set(vms))
+			f = Field(values, 'Test')
+			match_field_values('Test', f.cells, vms)
+			stores.append([list([(f.store.symbols[f.store.types[e]], f.store.scores[e], f.store.symbols[f.store.hits[e]])
+				for e in f.store.entries(c.row)]) for c in f.cells])
+		self.assertEqual(stores[0], stores[1])
+		self.assertEqual([t for (t, s, h) in stores[1][2]], [F_CITY])
+
+	def testStreamNormalization(self):
+		import io
+		fileName = 'test_data/test_types/asrc-membres-scanr-21juillet2016.csv'
+		self.useValueMatchers([RegexMatcher(F_ZIP, "[0-9]{5}"), RegexMatcher(F_SIREN, "[0-9]{9}"),
+			LabelMatcher(F_CITY, commune_lexicon(), MATCH_MODE_EXACT, stopWords = STOP_WORDS_CITY)])
+		def normalize(streamed):
+			out = io.StringIO()
+			if streamed:
+				stream_normalize_in_place(fileName, ';', out, chunkSize = 7, inferRows = 40)
+				return out.getvalue()
+			fields = parse_fields_from_CSV(fileName, ';')
+			types = fields.infer_types()
+			self.assertEqual((types['VILLE'], types['CP']), (F_CITY, F_ZIP))
+			for (field, values) in fields.normalize_values_in_place(types):
+				print('Normalized', field, file = out)
+				for value in values: print(value, file = out)
+			return out.getvalue()
+		output = self.checkSameRuns(normalize, [False, True])
+		self.assertIn('Normalized VILLE\nECULLY\nECULLY\nParis\nPESSAC\n', output)
+		self.assertIn('Normalized CP\n69130\n69130\n75231\n33608\n', output)
+		with self.assertLogs(level = 'WARNING') as logs:
+			stream_normalize_in_place(fileName, ';', io.StringIO(), chunkSize = 7, inferRows = 5)
+		self.assertTrue(any('VILLE posit types not posited on the first 5 rows: ' + F_CITY in m for m in logs.output))
+		self.assertRaises(ValueError, stream_normalize_in_place, fileName, ';', io.StringIO(), inferRows = 0)
+
+	def testLazyScanners(self):
+		vms = [LabelMatcher(F_CITY, ['Paris', 'Lyon', 'Nantes'], MATCH_MODE_EXACT),
+			TokenizedMatcher(F_ETAB_ENSSUP, ['Université de Lyon', 'Université Lyon 2'], maxTokens = 4),
+			TokenizedMatcher(F_APB_MENTION, ['Droit', 'Sciences de la vie'], maxTokens = 4)]
+		lexicons = compile_lexicon_set(vms)
+		prepared = list()
+		prepare = lexicons.prepare
+		lexicons.prepare = lambda cells: (prepared.append(len(cells)), prepare(cells))
+		scheduler = MatcherScheduler(stats = { matcher_key(vms[0]): [10, 1e-5, 10] })
+		match_field_values('Test', Field(['Paris', 'Lyon', 'Nantes', 'Paris'], 'Test').cells, vms, scheduler = scheduler)
+		self.assertEqual(len(scheduler.decisions), 2)
+		self.assertEqual(prepared, [])
+		match_field_values('Test', Field(['Paris', 'Droit', 'Université de Lyon'], 'Test').cells, vms)
+		self.assertEqual(prepared, [3])
+
+	def testNormalizationCache(self):
+		metrics = enable_metrics()
+		for i in range(3):
+			self.assertEqual(normalize_and_validate_tokens('Université Lyon-2 (Cedex)', stopWords = ['cedex']), [to_ASCII('université'), 'lyon'])
+		caches = dict([(c['cache'], c) for c in metrics.report()['caches']])
+		enable_metrics(False)
+		self.assertGreaterEqual(caches['valid_tokens']['hits'], 2)
+		self.assertLessEqual(caches['valid_tokens']['misses'], 1)
+
+	def testIncrementalAppend(self):
+		vms = self.useValueMatchers([RegexMatcher(F_ZIP, "[0-9]{5}"), LabelMatcher(F_CITY, ['Paris', 'Lyon', 'Nantes'], MATCH_MODE_EXACT)])
+		(values, appended) = (['Paris', '75005', 'Paris', ''], ['Lyon', 'Paris', '69001'])
+		def match(incremental):
+			f = Field(values if incremental else values + appended, 'Test')
+			f.posited = match_field_values('Test', f.cells, vms, diversions = f.diversions)
+			if incremental:
+				self.assertEqual((f.posited, f.diversions), (set([F_ZIP]), { 1: set(['Paris']) }))
+				self.assertEqual(extend_field_values('Test', f, appended, vms), set([F_CITY]))
+				self.assertEqual(f.diversions, { })
+			return (f.scored_types(), list([c.non_excluded_types() for c in f.cells]))
+		(scores, types) = self.checkSameRuns(match, [False, True])
+		self.assertEqual(types[4], set([F_CITY]))
+		import pandas as pd
+		tab = pd.DataFrame({ 'Ville': ['Paris', 'lyon', 'Nantes'] * 100, 'CP': ['75005', '69001', '44000'] * 100 })
+		appended = pd.DataFrame({ 'Ville': ['nantes', 'Paris'], 'CP': ['44000', 'x'] })
+		def normalize(incremental):
+			if not incremental:
+				return normalize_values(pd.concat([tab, appended], ignore_index = True), { })[0].tail(2).reset_index(drop = True).to_dict(orient = 'list')
+			fields = parse_fields_from_Panda(tab.copy())
+			fields.infer_types(sampler = ProgressiveSampler(sampleSize = 50))
+			res = append_rows(fields, appended)
+			self.assertEqual((res['column_types'], res['types_changed']), ({ 'Ville': F_CITY, 'CP': F_ZIP }, []))
+			# The rows left out by sampling are not matched
+			self.assertTrue(all(f.evaluated is not None and len(f.evaluated) < 100 for f in fields.fields.values()))
+			return res['normalized'].to_dict(orient = 'list')
+		self.assertEqual(self.checkSameRuns(normalize, [False, True]), { 'Ville': ['Nantes', 'Paris'], 'CP': ['44000', 'x'] })
+
+	def testParallelInference(self):
+		fileName = 'test_data/test_types/asrc-membres-scanr-21juillet2016.csv'
+		self.useValueMatchers([RegexMatcher(F_ZIP, "[0-9]{5}"), RegexMatcher(F_SIREN, "[0-9]{9}"),
+			LabelMatcher(F_CITY, commune_lexicon(), MATCH_MODE_EXACT, stopWords = STOP_WORDS_CITY)])
+		def infer(workers):
+			(counts, formats) = (Counter(countInfo), Counter(dateFormatInfo))
+			fields = parse_fields_from_CSV(fileName, ';')
+			types = fields.infer_types(workers = workers)
+			columns = dict([(h.value, (f.posited, f.diversions, f.scored_types(), [c.non_excluded_types() for c in f.cells]))
+				for (h, f) in fields.fields.items()])
+			counts = Counter(countInfo) - counts
+			del counts['value_matchers'] # Called once per column by the workers
+			return (types, columns, (counts, Counter(dateFormatInfo) - formats, dedupInfo['cells'], dedupInfo['distinct']))
+		(types, columns, info) = self.checkSameRuns(infer, [1, 2])
+		self.assertEqual((types['VILLE'], types['CP'], types['BP']), (F_CITY, F_ZIP, F_ZIP))
+		self.assertIn(F_CITY, columns['VILLE'][0])
+		self.assertEqual(columns['CP'][3][0], set([F_ZIP]))
+		self.assertGreater(info[2], 0)
+
+	def testMatcherSnapshot(self):
+		import tempfile, pickle, preprocess_fields_v3
+		lexicon = ['Paris', 'Lyon', 'Nantes']
+		(generate, snapshotPath) = (preprocess_fields_v3.generate_value_matchers, preprocess_fields_v3.SNAPSHOT_PATH)
+		def match(loaded):
+			if loaded is not None: # Otherwise the built matchers are used
+				del VALUE_MATCHERS[:]
+				self.assertEqual(load_matcher_snapshot(), loaded)
+			f = Field(['75005', 'Paris', 'Université de Lyon', 'Lille', 'Lyon'], 'Test')
+			match_field_values('Test', f.cells, value_matchers())
+			return [c.non_excluded_types() for c in f.cells]
+		try:
+			with tempfile.TemporaryDirectory() as d:
+				preprocess_fields_v3.SNAPSHOT_PATH = d
+				preprocess_fields_v3.generate_value_matchers = lambda: iter([RegexMatcher(F_ZIP, "[0-9]{5}"),
+					LabelMatcher(F_CITY, lexicon, MATCH_MODE_EXACT), TokenizedMatcher(F_ETAB_ENSSUP, ['Université de Lyon'], maxTokens = 4)])
+				path = build_matcher_snapshot()
+				types = self.checkSameRuns(match, [None, True])
+				with open(path, 'wb') as f: pickle.dump({ 'matchers': [] }, f)
+				lexicon.append('Lille') # Only seen by the matchers built instead of the snapshot
+				rebuilt = match(False)
+		finally:
+			preprocess_fields_v3.generate_value_matchers = generate
+			preprocess_fields_v3.SNAPSHOT_PATH = snapshotPath
+		self.assertIn(F_ZIP, types[0])
+		self.assertIn(F_CITY, types[1])
+		self.assertNotIn(F_CITY, types[3])
+		self.assertIn(F_CITY, rebuilt[3])
+
+	def testBatchInference(self):
+		import tempfile, json, os
+		self.useValueMatchers([RegexMatcher(F_ZIP, "[0-9]{5}"), LabelMatcher(F_CITY, ['Paris', 'Lyon', 'Nantes'], MATCH_MODE_EXACT)])
+		def infer(workers):
+			with tempfile.TemporaryDirectory() as d:
+				with open(os.path.join(d, 'villes.col'), 'w') as f: f.write('Ville\nParis\nLyon\nNantes\n')
+				with open(os.path.join(d, 'adresses.csv'), 'w') as f: f.write('Commune;CP\nParis;75005\nLyon;69001\n')
+				open(os.path.join(d, 'vide.csv'), 'w').close()
+				with open(os.path.join(d, 'binaire.csv'), 'wb') as f: f.write(b'\xff\xfe\x00A')
+				summary = batch_infer_types(d, os.path.join(d, 'report'), workers = workers)
+				reports = dict()
+				for name in ['adresses.csv', 'binaire.csv', 'villes.col', 'vide.csv']:
+					with open(os.path.join(d, 'report', name + '.json')) as f: report = json.load(f)
+					reports[name] = (report.get('delimiter'), report.get('column_types'), report.get('error', '').split(':')[0])
+			return ((summary['files'], summary['failed'], summary['rows'], summary['cells']), reports)
+		(counts, reports) = self.checkSameRuns(infer, [1, 2])
+		self.assertEqual(counts, (4, 1, 5, 7))
+		self.assertEqual(reports['adresses.csv'], (';', { 'Commune': F_CITY, 'CP': F_ZIP }, ''))
+		self.assertEqual(reports['villes.col'][1], { 'Ville': F_CITY })
+		self.assertEqual((reports['vide.csv'][1:], reports['binaire.csv'][2]), (({ }, ''), 'UnicodeDecodeError'))
+
+	def testInferenceService(self):
+		import json, os, tempfile, threading, urllib.request, urllib.error
+		from preprocess_service import start_service, stop_service
+		def post(path, body, contentType):
+			req = urllib.request.Request(base + path, data = body, headers = { 'Content-Type': contentType })
+			try:
+				with urllib.request.urlopen(req) as r: return (r.status, json.loads(r.read()))
+			except urllib.error.HTTPError as e: return (e.code, json.loads(e.read()))
+		self.useValueMatchers([RegexMatcher(F_ZIP, "[0-9]{5}"), LabelMatcher(F_CITY, ['Paris', 'Lyon', 'Nantes'], MATCH_MODE_EXACT)])
+		server = start_service('127.0.0.1', 0, workers = 1, queueSize = 0, maxRequestBytes = 1000)
+		threading.Thread(target = server.serve_forever, daemon = True).start()
+		base = 'http://127.0.0.1:{}'.format(server.server_address[1])
+		try:
+			with urllib.request.urlopen(base + '/health') as r: self.assertEqual(json.loads(r.read())['value_matchers'], 2)
+			bodies = { 'application/json': json.dumps({ 'data': { 'X': ['Paris', 'lyon'], 'Y': ['75005', '69001'] } }),
+				'text/csv': 'X;Y\nParis;75005\nlyon;69001\n' }
+			def request(contentType):
+				query = '?delimiter=;' if contentType == 'text/csv' else ''
+				(status, res) = post('/infer_types' + query, bodies[contentType].encode('utf-8'), contentType)
+				return (status, res['column_types'])
+			self.assertEqual(self.checkSameRuns(request, list(bodies.keys())), (200, { 'X': F_CITY, 'Y': F_ZIP }))
+			(status, res) = post('/normalize_values', bodies['application/json'].encode('utf-8'), 'application/json')
+			self.assertEqual((status, res['data']), (200, { 'X': ['Paris', 'Lyon'], 'Y': ['75005', '69001'] }))
+			self.assertEqual(post('/infer_types', b'X\n' + b'Paris\n' * 500, 'text/csv')[0], 413)
+			self.assertEqual(post('/infer_types', b'X', 'text/plain')[0], 415)
+			with tempfile.TemporaryDirectory() as d:
+				statsFile = os.path.join(d, 'stats.json')
+				self.assertEqual(post('/infer_types', json.dumps({ 'data': { 'X': ['Paris'] },
+					'params': { 'scheduling': True, 'scheduler_stats': statsFile } }).encode('utf-8'), 'application/json')[0], 400)
+				self.assertEqual(post('/infer_types?scheduling=true&scheduler_stats=' + statsFile, b'X\nParis\n', 'text/csv')[0], 400)
+				self.assertFalse(os.path.exists(statsFile))
+			with urllib.request.urlopen(base + '/metrics') as r: metrics = json.loads(r.read())
+			self.assertEqual((metrics['counts']['status_200'], metrics['counts']['status_413'], metrics['counts']['status_400'], metrics['pending']), (3, 1, 2, 0))
+		finally:
+			stop_service(server)
+
+	def testColumnarWriter(self):
+		import tempfile, io, os
+		columns = [('Ville', ['Paris', 'Lyon', 'Paris', 'Lyon']), ('++Ville++', ['PARIS', None, ['PARIS', 'LUTECE'], 'LYON']),
+			('CP', ['75001', '69001', '75002', '69002'])]
+		out = io.StringIO()
+		self.assertEqual(write_normalized_values(iter(columns), 4, out, ';', chunkSize = 3), ['Ville', '++Ville++', 'CP'])
+		self.assertEqual(out.getvalue(), 'Ville;++Ville++;CP\nParis;PARIS;75001\nLyon;;69001\nParis;"PARIS; LUTECE";75002\nLyon;LYON;69002\n')
+		out = io.StringIO()
+		write_normalized_values(iter(columns), 4, out, 'csv')
+		self.assertEqual(out.getvalue().splitlines()[:4], ['Ville,++Ville++,CP', 'Paris,PARIS,75001', 'Lyon,,69001', 'Paris,PARIS; LUTECE,75002'])
+		try:
+			import pyarrow.parquet as pq
+		except ImportError:
+			return
+		with tempfile.TemporaryDirectory() as d:
+			fileName = os.path.join(d, 'out.parquet')
+			write_normalized_values(iter(columns), 4, fileName, 'parquet', chunkSize = 3)
+			self.assertEqual(pq.ParquetFile(fileName).metadata.num_row_groups, 2)
+			table = pq.read_table(fileName)
+		self.assertEqual(str(table.schema.field('Ville').type), 'dictionary<values=string, indices=int32, ordered=0>')
+		self.assertEqual(str(table.schema.field('CP').type), 'string')
+		self.assertEqual(table.column('++Ville++').to_pylist(), ['PARIS', None, 'PARIS; LUTECE', 'LYON'])
+
+	def testAddressParserCache(self):
+		parsed = list()
+		parser = address_parsing.AddressParser(maxSize = 2, cacheFile = None, parser = lambda v: parsed.append(v) or [(v, 'road')])
+		metrics = enable_metrics()
+		register_cache_stats('test_address_parser', parser.stats)
+		self.assertEqual(parser.parse('12  Rue de la Paix'), [('12 rue de la paix', 'road')])
+		self.assertEqual(parser.parse_many(['12 rue de la paix', 'Lyon', 'lyon', 'Nice']), [[('12 rue de la paix', 'road')],
+			[('lyon', 'road')], [('lyon', 'road')], [('nice', 'road')]])
+		report = metrics.report()
+		enable_metrics(False)
+		del CACHE_STATS['test_address_parser']
+		self.assertEqual(parsed, ['12 rue de la paix', 'lyon', 'nice'])
+		self.assertEqual([c for c in report['caches'] if c['cache'] == 'test_address_parser'], [{ 'cache': 'test_address_parser',
+			'evictions': 1, 'hits': 2, 'misses': 3, 'hit_rate': .4 }])
+		import tempfile, os
+		with tempfile.TemporaryDirectory() as d:
+			for i in range(2):
+				parser = address_parsing.AddressParser(cacheFile = os.path.join(d, 'libpostal'), parser = lambda v: parsed.append(v) or [(v, 'city')])
+				self.assertEqual(parser.parse('Paris'), [('paris', 'city')])
+				parser.close()
+		self.assertEqual((parsed[3:], parser.stats['disk_hits']), (['paris'], 1))
+
+	def testPhoneNumberParsing(self):
+		values = ['020 7946 0000', '020 7946 0001', '+44 20 7946 0002', '0161 496 0000', 'Paris', '75005', '020 7946 0000']
+		self.assertEqual([parsed[1] if parsed else None for parsed in parse_phone_numbers(values)],
+			['+44 20 7946 0000', '+44 20 7946 0001', '+44 20 7946 0002', '+44 161 496 0000', None, None, '+44 20 7946 0000'])
+		def match(vectorize):
+			f = Field(values, 'Test')
+			match_field_values('Test', f.cells, [CustomTelephoneMatcher()], vectorize = vectorize)
+			return list([list([f.store.symbols[f.store.hits[e]] for e in f.store.entries(c.row)]) for c in f.cells])
+		hits = self.checkSameRuns(match, [False, True])
+		self.assertEqual((hits[0], hits[3], hits[4]), (['+44 20 7946 0000'], ['+44 161 496 0000'], []))
+		self.assertEqual([parsed[1] if parsed else None for parsed in parse_phone_numbers(['Tél. : 01 23 45 67 89', 'Fax 01 23 45 67 89',
+			'Tél. : Paris'], 'FR')], ['+33 1 23 45 67 89', '+33 1 23 45 67 89', None])
+		labelled = ['Tél. : 01 23 45 67 89', 'Fax 01 23 45 67 89', 'Tél. : Paris']
+		def matchLabelled(vectorize):
+			f = Field(labelled, 'Test')
+			match_field_values('Test', f.cells, [CustomTelephoneMatcher()], vectorize = vectorize)
+			return list([list([(f.store.scores[e], f.store.symbols[f.store.hits[e]]) for e in f.store.entries(c.row)]) for c in f.cells])
+		self.assertEqual(self.checkSameRuns(matchLabelled, [False, True]), [[(100, '+33 1 23 45 67 89')]] * 2 + [[]])
+		c = Cell('Tel: 01 45 67 89 01 ou 06 12 34 56 78', 'Test')
+		CustomTelephoneMatcher(partial = True).match(c)
+		self.assertEqual([c.store.symbols[c.store.hits[e]] for e in c.store.entries(c.row)], ['+33 1 45 67 89 01', '+33 6 12 34 56 78'])
+
 	def testCustomAddressMatcher(self):
 		matcher = TestCustomAddressMatcher()
 		addrList = fileToList('addresses.to_normalize.01', path='test_data')